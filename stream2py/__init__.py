@@ -173,8 +173,15 @@ Here's a bonus helper function to shortcut the SourceReader class.
 
 from stream2py.protocols import *
 from stream2py.buffer_reader import *
+from stream2py.rechunking_reader import *
 from stream2py.stream_buffer import *
+from stream2py.stream_scheduler import *
 from stream2py.source_reader import *
 from stream2py.stream_source import *
+from stream2py.async_source_reader import *
+from stream2py.async_stream_buffer import *
+from stream2py.shared_memory_stream_buffer import *
+from stream2py.merged_reader import *
+from stream2py.asof_join_reader import *
 
 # from stream2py.simply import mk_stream_buffer
@@ -0,0 +1,185 @@
+"""
+An AsOfJoinReader joins each item of a BufferReader, i.e. the samples of a 1 kHz sensor, to the
+item of another BufferReader, i.e. a 10 Hz sensor, with the latest key at or before its own, or
+the nearest one, for sensor fusion.
+
+Both readers are read in a single merge-style pass over their new items: the join costs time
+linear in the number of items of both streams, instead of a lookup with its own lock acquisition
+per item.
+"""
+__all__ = ['AsOfJoinReader']
+
+from collections import deque
+from typing import Optional
+
+from stream2py.buffer_reader import BufferReader, Duration, key_span
+
+DIRECTIONS = ('backward', 'forward', 'nearest')
+
+
+class AsOfJoinReader:
+    """Reads (a, b) tuples: each item a of the left reader with the item b of the right
+    reader matched to its key, or None if there is none.
+
+    The match of direction='backward' is the right item with the latest key at or before
+    the key of a, of 'forward' the one with the earliest key at or after it, and of
+    'nearest' the closest of both, the earlier one on ties. A pair is only returned once
+    the right reader is past the key of a, or is stopped and exhausted, so that its match
+    cannot change anymore.
+
+    >>> from stream2py import StreamBuffer
+    >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+    >>> fast = SimpleSourceReader('abcdefg')  # an item every 10 keys
+    >>> fast.key = lambda data: data[0] * 10
+    >>> slow = SimpleSourceReader('XYZ')  # an item every 25 keys
+    >>> slow.key = lambda data: data[0] * 25
+    >>> with StreamBuffer(fast) as a, StreamBuffer(slow) as b:
+    ...     joined = AsOfJoinReader(a.mk_reader(), b.mk_reader())
+    ...     pairs = [joined.read(blocking=True) for _ in range(5)]
+    >>> [(a[1], b[1]) for a, b in pairs]
+    [('a', 'X'), ('b', 'X'), ('c', 'X'), ('d', 'Y'), ('e', 'Y')]
+    """
+
+    def __init__(
+        self,
+        left: BufferReader,
+        right: BufferReader,
+        *,
+        direction: str = 'backward',
+        tolerance: Optional[Duration] = None,
+    ):
+        """
+        :param left: reader of the items to join, all returned once. Its cursor is moved
+            as items are read.
+        :param right: reader of the items to join them to. Its cursor is moved as items
+            are read.
+        :param direction: 'backward', 'forward' or 'nearest'
+        :param tolerance: max difference of keys of a match, in seconds or as a
+            timedelta, converted to a difference of keys with key_span. None for no max.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f'direction must be one of {DIRECTIONS}: {direction!r}')
+        self.left = left
+        self.right = right
+        self.direction = direction
+        self.tolerance = tolerance
+        self._left_key = left._buffer.key
+        self._right_key = right._buffer.key
+        self._lefts = deque()  # left items read, not returned yet
+        self._rights = deque()  # right items read with keys after the last left key
+        self._prev = None  # last right item with a key at or before the last left key
+        self._right_exhausted = False
+        self._max_span = None  # tolerance as a difference of keys
+
+    @property
+    def is_stopped(self) -> bool:
+        """True once the left reader is stopped and all its items were returned"""
+        return not self._lefts and self.left.is_stopped
+
+    def _fill_right(self) -> bool:
+        """Read the new right items, return True if there were any"""
+        items = self.right.read_new()
+        if items is None:
+            self._right_exhausted = True
+            return False
+        self._rights.extend(items)
+        return bool(items)
+
+    def _advance_right(self, a_key) -> bool:
+        """Move _prev to the last right item with a key at or before a_key. Return True
+        once a right item after a_key was read, or the right reader is exhausted."""
+        rights, key = self._rights, self._right_key
+        while True:
+            while rights and key(rights[0]) <= a_key:
+                self._prev = rights.popleft()
+            if rights or self._right_exhausted:
+                return True
+            if not self._fill_right() and not self._right_exhausted:
+                return False
+
+    def _within_tolerance(self, a_key, b_key) -> bool:
+        if self.tolerance is None:
+            return True
+        if self._max_span is None:
+            self._max_span = key_span(a_key, self.tolerance)
+        return abs(a_key - b_key) <= self._max_span
+
+    def _match(self, a_key):
+        """The right item matched to a_key, or raise LookupError if the right items
+        after a_key are not read yet"""
+        ready = self._advance_right(a_key)
+        key, prev = self._right_key, self._prev
+        prev_key = None if prev is None else key(prev)
+        if prev_key == a_key:
+            return prev  # an exact match, whatever the direction
+        if not ready:
+            raise LookupError('The right items after the left key are not read yet')
+        nxt = self._rights[0] if self._rights else None
+        if self.direction == 'backward':
+            candidates = [prev]
+        elif self.direction == 'forward':
+            candidates = [nxt]
+        else:
+            candidates = [prev, nxt]
+        best, best_distance = None, None
+        for b in candidates:
+            if b is None:
+                continue
+            distance = abs(a_key - key(b))
+            if best is None or distance < best_distance:
+                best, best_distance = b, distance
+        if best is not None and not self._within_tolerance(a_key, key(best)):
+            return None
+        return best
+
+    def _take_pair(self):
+        """Return the next (a, b), None if it is not available yet"""
+        if not self._lefts:
+            self._lefts.extend(self.left.read_available(peek=False))
+            if not self._lefts:
+                return None
+        a = self._lefts[0]
+        try:
+            b = self._match(self._left_key(a))
+        except LookupError:
+            return None
+        self._lefts.popleft()
+        return a, b
+
+    def read(self, *, blocking=False):
+        """Return the next (a, b) pair.
+
+        :param blocking: if True, wait for the next pair if it is not yet available
+        :return: (a, b) tuple, None if not available yet, or, when blocking, if the left
+            reader is stopped and all its items were returned
+        """
+        while True:
+            pair = self._take_pair()
+            if pair is not None or not blocking:
+                return pair
+            if self._lefts:
+                self.right.wait_for_new_data()  # the right reader holds back the pair
+                continue
+            items = self.left.read_new()
+            if items is None:
+                return None  # the left reader is stopped and every pair was returned
+            self._lefts.extend(items)
+            if not items:
+                self.left.wait_for_new_data()
+
+    def read_available(self) -> list:
+        """Return every (a, b) pair available now"""
+        pairs = []
+        pair = self._take_pair()
+        while pair is not None:
+            pairs.append(pair)
+            pair = self._take_pair()
+        return pairs
+
+    def __iter__(self):
+        """Iterate over (a, b) pairs until the left reader is stopped and exhausted"""
+        while True:
+            pair = self.read(blocking=True)
+            if pair is None:
+                return
+            yield pair
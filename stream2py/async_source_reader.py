@@ -0,0 +1,141 @@
+"""
+An AsyncSourceReader is the asyncio counterpart of SourceReader: it defines how to get data
+with the coroutines open(), read(), and close(), and how the data is ordered with the key()
+method. Many of them can be read by AsyncStreamBuffers sharing a single event loop thread,
+which suits network sources that mostly wait.
+"""
+__all__ = ['AsyncSourceReader']
+
+from abc import ABCMeta, abstractmethod
+from typing import Any, Optional, Union
+
+from stream2py.utility.typing_hints import ComparableType
+
+
+class AsyncSourceReader(metaclass=ABCMeta):
+    """Abstract class interface to be used by AsyncStreamBuffer.
+
+    Subclasses that naturally get many items at once can also define an optional
+    ``async read_batch(max_n)`` coroutine, with the semantics of ``BatchSource.read_batch``.
+
+    >>> import asyncio
+    >>> from stream2py import AsyncSourceReader
+    >>>
+    >>> class AsyncCounter(AsyncSourceReader):
+    ...     def __init__(self, stop):
+    ...         self.stop = stop
+    ...         self.count = None
+    ...
+    ...     async def open(self):
+    ...         self.count = 0
+    ...
+    ...     async def read(self):
+    ...         await asyncio.sleep(0)  # i.e. waiting for a socket
+    ...         if self.count < self.stop:
+    ...             self.count += 1
+    ...             return self.count - 1
+    ...
+    ...     async def close(self):
+    ...         self.count = None
+    ...
+    ...     def key(self, data):
+    ...         return data
+    ...
+    >>> async def read_all(source_reader):
+    ...     async with source_reader:
+    ...         return [data async for data in source_reader]
+    >>> asyncio.run(read_all(AsyncCounter(stop=3)))
+    [0, 1, 2]
+    """
+
+    _closed = True  # AsyncSourceReader starts in closed state
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        """Yield read data until read returns None"""
+        while True:
+            _next = await self.read()
+            if _next is None:
+                return
+            yield _next
+
+    @abstractmethod
+    async def open(self) -> None:
+        """Set up source to be read and set some source info affected by open time like the time of
+        open. Will be awaited by AsyncStreamBuffer immediately before first read."""
+
+    @abstractmethod
+    async def read(self) -> Any:
+        """Return the next data item, or None if no data is available yet"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Close and clean up source reader.
+        Will be awaited when AsyncStreamBuffer stops or if an exception is raised during read and
+        append loop.
+        """
+
+    @property
+    def info(self) -> dict:
+        """A dict with important source info. Default can be init_kwargs and open timestamp.
+
+        :return: dict
+        """
+        return {}
+
+    @abstractmethod
+    def key(self, data: Any) -> ComparableType:
+        """
+        Converts data into a comparable value to sort by
+
+        :param data: the return value of the 'read' method
+        :return: ComparableType
+        """
+        raise NotImplementedError(
+            "Implement the 'key' method to convert data into a comparable value to sort by"
+        )
+
+    @property
+    def closed(self) -> bool:
+        """True if the source reader is closed, False if it's open.
+
+        :return: bool indicating whether the source is closed
+        """
+        return self._closed
+
+    @property
+    def sleep_time_on_read_none_s(self) -> Optional[Union[int, float]]:
+        """Sets default time AsyncStreamBuffer waits when it reads None from the
+        AsyncSourceReader. See SourceReader.sleep_time_on_read_none_s.
+
+        :return: Optional[Union[int, float]] number of seconds to sleep
+        """
+        return None
+
+    async def __aenter__(self):
+        await self.open()
+        self._closed = False
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+        self._closed = True
+
+    def stream_buffer(
+        self,
+        maxlen: int,
+        sleep_time_on_read_none_s: Optional[Union[int, float]] = None,
+        auto_drop=True,
+        driver=None,
+    ):
+        from stream2py.async_stream_buffer import AsyncStreamBuffer
+
+        return AsyncStreamBuffer(
+            self,
+            maxlen=maxlen,
+            sleep_time_on_read_none_s=sleep_time_on_read_none_s,
+            auto_drop=auto_drop,
+            driver=driver,
+        )
@@ -0,0 +1,316 @@
+"""
+An AsyncStreamBuffer is a StreamBuffer whose AsyncSourceReader is read by a coroutine instead
+of a dedicated thread. The coroutines of many AsyncStreamBuffers run on the event loop thread
+of a single AsyncSourceDriver, each one feeding its own buffer, so ingesting hundreds of slow
+sources costs one thread instead of hundreds.
+BufferReaders are made and used exactly as with StreamBuffer.
+"""
+from __future__ import annotations
+
+__all__ = ['AsyncSourceDriver', 'AsyncStreamBuffer', 'get_default_driver']
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Callable, Coroutine, Optional, Sequence, Union
+
+from stream2py.async_source_reader import AsyncSourceReader
+from stream2py.stream_buffer import DFLT_STOP_TIMEOUT_S, RestartPolicy, StreamBuffer
+from stream2py.utility.aggregate_pyramid import DFLT_BLOCK_SIZES
+from stream2py.utility.lock_policies import DFLT_LOCK_POLICY, LockPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSourceDriver:
+    """Runs an asyncio event loop in a daemon thread, on which AsyncStreamBuffers read
+    their sources.
+
+    >>> driver = AsyncSourceDriver()
+    >>> driver.is_running
+    False
+    >>> async def add(a, b):
+    ...     return a + b
+    >>> driver.submit(add(1, 2)).result()  # the loop thread starts on first use
+    3
+    >>> driver.is_running
+    True
+    >>> driver.stop()
+    >>> driver.is_running
+    False
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop of the driver, started if it wasn't already"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='AsyncSourceDriver', daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop is not None
+
+    def in_loop_thread(self) -> bool:
+        """True if called from the thread of the event loop"""
+        return self._thread is threading.current_thread()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the event loop from any thread
+
+        :param coro: coroutine to run
+        :return: a concurrent.futures.Future of the result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def start(self):
+        """Start the event loop thread, which is otherwise started on first use"""
+        self.loop
+
+    def stop(self):
+        """Cancel the coroutines still running on the loop, i.e. closing their sources, and
+        stop the loop thread"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(_cancel_all_tasks(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def stream_buffer(self, source_reader: AsyncSourceReader, **kwargs):
+        """Make an AsyncStreamBuffer reading source_reader on this driver
+
+        :param kwargs: keyword arguments of AsyncStreamBuffer
+        """
+        return AsyncStreamBuffer(source_reader, driver=self, **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+async def _cancel_all_tasks():
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_default_driver = None
+_default_driver_lock = threading.Lock()
+
+
+def get_default_driver() -> AsyncSourceDriver:
+    """The AsyncSourceDriver shared by AsyncStreamBuffers made without a driver"""
+    global _default_driver
+    with _default_driver_lock:
+        if _default_driver is None:
+            _default_driver = AsyncSourceDriver()
+        return _default_driver
+
+
+class AsyncStreamBuffer(StreamBuffer):
+    """A StreamBuffer reading an AsyncSourceReader on the event loop of an
+    AsyncSourceDriver instead of a thread of its own.
+
+    >>> import asyncio
+    >>> from stream2py import AsyncSourceReader
+    >>>
+    >>> class AsyncCounter(AsyncSourceReader):
+    ...     async def open(self):
+    ...         self.count = 0
+    ...
+    ...     async def read(self):
+    ...         await asyncio.sleep(0.001)  # i.e. waiting for a socket
+    ...         self.count += 1
+    ...         return self.count
+    ...
+    ...     async def close(self):
+    ...         pass
+    ...
+    ...     def key(self, data):
+    ...         return data
+    ...
+    >>> with AsyncSourceDriver() as driver:
+    ...     buffers = [driver.stream_buffer(AsyncCounter(), maxlen=10) for _ in range(3)]
+    ...     for buffer in buffers:
+    ...         buffer.start()
+    ...     readers = [buffer.mk_reader() for buffer in buffers]
+    ...     print([[reader.read(blocking=True) for _ in range(3)] for reader in readers])
+    ...     for buffer in buffers:
+    ...         buffer.stop()
+    [[1, 2, 3], [1, 2, 3], [1, 2, 3]]
+    """
+
+    def __init__(
+        self,
+        source_reader: AsyncSourceReader,
+        *,
+        maxlen: int = 100,
+        sleep_time_on_read_none_s: Optional[Union[int, float]] = None,
+        auto_drop=True,
+        drop_consumed=False,
+        lock_policy: LockPolicy = DFLT_LOCK_POLICY,
+        optimistic_reads: Optional[bool] = None,
+        restart_policy: Union[RestartPolicy, bool, None] = None,
+        aggregate: Optional[Callable[[Any], float]] = None,
+        aggregate_block_sizes: Sequence[int] = DFLT_BLOCK_SIZES,
+        driver: Optional[AsyncSourceDriver] = None,
+    ):
+        """
+        :param source_reader: instance of an AsyncSourceReader subclass
+        :param driver: the AsyncSourceDriver to read source_reader on. None to share
+            the one of get_default_driver().
+
+        See StreamBuffer for the other parameters.
+        """
+        super().__init__(
+            source_reader,
+            maxlen=maxlen,
+            sleep_time_on_read_none_s=sleep_time_on_read_none_s,
+            auto_drop=auto_drop,
+            drop_consumed=drop_consumed,
+            lock_policy=lock_policy,
+            optimistic_reads=optimistic_reads,
+            restart_policy=restart_policy,
+            aggregate=aggregate,
+            aggregate_block_sizes=aggregate_block_sizes,
+        )
+        self.driver = driver if driver is not None else get_default_driver()
+        self._run_future = None
+        self._run_task = None
+
+    def start(self):
+        """Open and start reading from source_reader into buffer, on the driver loop.
+
+        :raises RuntimeError: if called from the driver loop, which it would block
+        """
+        if self.driver.in_loop_thread():
+            raise RuntimeError(
+                'AsyncStreamBuffer.start() blocks until the source is open: '
+                'it cannot be called from the event loop of its driver'
+            )
+        with self.start_lock:
+            if self._stop_event and not self._stop_event.is_set():
+                self.stop()
+            self.source_buffer = None
+            self._stop_event = threading.Event()
+            self.driver.submit(self._aopen()).result()
+            self._run_future = self.driver.submit(self._arun())
+
+    def stop(self, timeout: Optional[float] = DFLT_STOP_TIMEOUT_S):
+        """Stop reading and close source_reader.
+        Returns as soon as source_reader is closed, or after timeout seconds.
+
+        :param timeout: max seconds to wait for source_reader to close, None for no limit
+        """
+        if self._stop_event is not None and not self._stop_event.is_set():
+            self._set_stop_event()
+            # interrupt the read or sleep the run coroutine is awaiting
+            self.driver.loop.call_soon_threadsafe(self._cancel_run_task)
+        if self._run_future is not None and not self.driver.in_loop_thread():
+            concurrent.futures.wait([self._run_future], timeout=timeout)
+        self._next_reader = None
+
+    @property
+    def join(self):
+        def join(timeout=None):
+            concurrent.futures.wait([self._run_future], timeout=timeout)
+
+        return join
+
+    def _cancel_run_task(self):
+        if self._run_task is not None and not self._run_task.done():
+            self._run_task.cancel()
+
+    async def _aopen(self):
+        await self.source_reader.open()
+        self._source_is_open = True
+        self._n_consecutive_restarts = 0
+        self._last_open_time = time.monotonic()
+        self._set_source_buffer()
+
+    async def _arun(self):
+        """Coroutine counterpart of StreamBuffer._run"""
+        self._run_task = asyncio.current_task()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    if not await self._aread_step():
+                        await asyncio.sleep(self._sleep_time_on_read_none_s)
+                except Exception as e:
+                    await self._arestart_after(e)
+        except asyncio.CancelledError:
+            if not self._stop_event.is_set():
+                raise  # cancelled by the driver, not by stop()
+        except Exception:
+            # nobody may ever look at the result of the run future: report the error
+            # like the thread of a StreamBuffer would
+            logger.exception(f'Stopped reading {self.source_reader!r} after an error')
+            raise
+        finally:
+            self._run_task = None
+            if not self._stop_event.is_set():
+                self._set_stop_event()
+            await self._aclose_source_reader()
+
+    async def _aread_step(self) -> bool:
+        """Coroutine counterpart of StreamBuffer._read_step"""
+        self._make_room()
+        read_batch = getattr(self.source_reader, 'read_batch', None)
+        if read_batch is not None:
+            max_n = self._read_batch_max_n()
+            batch = await read_batch(max_n) if max_n != 0 else None
+            if batch:
+                self.source_buffer.extend(batch)
+                return True
+            return False
+        if self.auto_drop is True or len(self.source_buffer) < self._maxlen:
+            data = await self.source_reader.read()
+        else:
+            data = None
+        if data is not None:
+            self.source_buffer.append(data)
+            return True
+        return False
+
+    async def _arestart_after(self, error: Exception):
+        """Coroutine counterpart of StreamBuffer._restart_after"""
+        while True:
+            delay = self._restart_delay_s(error)
+            if delay is None:
+                raise error
+            await self._aclose_source_reader()
+            await asyncio.sleep(delay)  # cancelled by stop()
+            try:
+                await self.source_reader.open()
+                self._count_restart()
+                return
+            except Exception as e:
+                error = e
+
+    async def _aclose_source_reader(self):
+        if self._source_is_open:
+            self._source_is_open = False
+            try:
+                await self.source_reader.close()
+            except Exception as e:
+                logger.error(e)
@@ -2,14 +2,19 @@
 A BufferReader gives data access to any number of consumers and provides methods to seek data such
 as next(), range(), head(), tail().  Each BufferReader instance has it's own cursor keeping track of
 what data was last seen."""
-__all__ = ['BufferReader']
+__all__ = ['BufferReader', 'Overrun']
 
+import asyncio
+from collections import deque
 from contextlib import suppress
+from datetime import datetime, timedelta
+from numbers import Integral
 import threading
-import time
-from typing import Callable, Union
+from typing import Any, Callable, NamedTuple, Optional, Union
 
+from stream2py.exceptions import ConfigurationError, ReaderOverrunError
 from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+from stream2py.utility.shared_memory_ring import SharedMemoryRing
 
 
 def defaulted_values(source_dict, defaults):
@@ -27,6 +32,42 @@ def defaulted_values(source_dict, defaults):
     }.values()
 
 
+DFLT_MAX_OVERRUNS = 1000
+Duration = Union[int, float, timedelta]
+
+
+def key_span(key, duration: Duration):
+    """Convert a duration, in seconds or as a timedelta, to a difference of keys of the
+    type of key: a timedelta for datetime keys, microseconds for int keys, and seconds
+    for float keys.
+
+    >>> key_span(datetime(2020, 1, 1), 1.5)
+    datetime.timedelta(seconds=1, microseconds=500000)
+    >>> key_span(1_577_836_800_000_000, 1.5)
+    1500000
+    >>> key_span(1_577_836_800.0, timedelta(milliseconds=20))
+    0.02
+    """
+    if isinstance(key, datetime):
+        return duration if isinstance(duration, timedelta) else timedelta(seconds=duration)
+    if isinstance(duration, timedelta):
+        duration = duration.total_seconds()
+    if isinstance(key, Integral):
+        return round(duration * 1_000_000)
+    return duration
+
+
+class Overrun(NamedTuple):
+    """A gap of items that were dropped from the buffer before a reader could read them.
+
+    The keys of the skipped items are between after_key and next_key, both excluded.
+    """
+
+    n_skipped: int  # number of items skipped
+    after_key: Any  # key of the last item read before the gap
+    next_key: Any  # key of the first item available after the gap
+
+
 class BufferReader:
     """Reader that is constructed from StreamBuffer.mk_reader()
 
@@ -85,7 +126,7 @@ class BufferReader:
 
     def __init__(
         self,
-        buffer: RWLockSortedDeque,
+        buffer: Union[RWLockSortedDeque, SharedMemoryRing],
         source_reader_info: dict,
         stop_event: threading.Event,
         *,
@@ -93,6 +134,8 @@ class BufferReader:
         peek=False,
         strict_n=False,
         ignore_no_item_found=False,  # TODO: should this be True to be aligned with iter?
+        on_overrun: Union[str, Callable[[Overrun], Any], None] = None,
+        max_overruns: int = DFLT_MAX_OVERRUNS,
     ):
         """
 
@@ -113,14 +156,29 @@ class BufferReader:
             instead of raising exception during a read
         :param strict_n: if True, by default a ValueError witll be raised if the
             exact number of requested items are not available when reading.
+        :param on_overrun: what to do when items after the cursor were dropped from the
+            buffer before being read, i.e. because the reader fell behind a full buffer.
+            None to only count them in n_skipped and overruns, 'raise' to raise
+            ReaderOverrunError instead of reading, the next read resuming after the gap,
+            or a function called with the Overrun before the read returns.
+        :param max_overruns: number of most recent Overrun gaps kept in overruns
         """
-        assert isinstance(buffer, RWLockSortedDeque)
+        assert isinstance(buffer, (RWLockSortedDeque, SharedMemoryRing))
         assert isinstance(stop_event, threading.Event)
+        if not (on_overrun in (None, 'raise') or callable(on_overrun)):
+            raise ValueError(
+                f"on_overrun must be None, 'raise' or a function: {on_overrun!r}"
+            )
 
         self._source_reader_info = source_reader_info
         self._buffer = buffer
         self._last_item = None
         self._last_key = None
+        self._last_seq = None
+        self.on_overrun = on_overrun
+        self.n_skipped = 0  # number of items dropped before being read
+        self.overruns = deque(maxlen=max_overruns)
+        self._aggregates = None  # AggregatePyramid of the StreamBuffer, if any
         self._stop_event = stop_event
         self._sleep_time_on_iter_none_s = 0.1
         self.read_size = read_size  # read_size used by __next__
@@ -153,7 +211,7 @@ class BufferReader:
             elif self.is_stopped:
                 return
             else:
-                time.sleep(self._sleep_time_on_iter_none_s)
+                self.wait_for_new_data()
 
     def __next__(self):
         """Return the next item from the buffer.
@@ -174,12 +232,83 @@ class BufferReader:
         return result
 
     def set_sleep_time_on_iter_none(self, sleep_time_s: Union[int, float] = 0.1):
-        """Set the sleep time of the iter yield loop when next data item is not yet available.
+        """Set the max time the iter yield loop waits when next data item is not yet
+        available. Waiting readers are woken up as soon as data is appended or the
+        stream is stopped, so this is only a safety net for missed notifications.
 
-        :param sleep_time_s: seconds to sleep
+        :param sleep_time_s: seconds to wait
         """
         self._sleep_time_on_iter_none_s = sleep_time_s
 
+    def _has_new_data_or_is_stopped(self) -> bool:
+        """Lock free hint that reading would not return None"""
+        if self._stop_event.is_set():
+            return True
+        buffer = self._buffer
+        if self._last_seq is None:
+            return len(buffer) > 0
+        # items dropped before being read move next_seq past the cursor too: only the
+        # items still in the buffer, from next_seq - len(buffer) on, can be read
+        return len(buffer) > 0 and buffer.next_seq > self._last_seq + 1
+
+    def wait_for_new_data(self, timeout: Optional[float] = None) -> bool:
+        """Block until the buffer has an item after the cursor or the stream is stopped.
+        The writer notifies the buffer on every append, so readers wake up right away.
+
+        :param timeout: max seconds to wait, the sleep time on iter none by default,
+            after which the caller is expected to check again
+        :return: True if there are items after the cursor or the stream is stopped
+        """
+        if timeout is None:
+            timeout = self._sleep_time_on_iter_none_s
+        return bool(
+            self._buffer.wait_for(self._has_new_data_or_is_stopped, timeout=timeout)
+        )
+
+    async def _await_new_data(self):
+        """Coroutine version of wait_for_new_data: the writer thread resolves a future
+        of the running event loop instead of waking up a thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._buffer.add_async_waiter(loop, future)
+        if self._has_new_data_or_is_stopped():  # notified before being registered
+            future.cancel()
+            # still yield to the event loop, so that a reader woken up without anything
+            # to read cannot starve the other tasks
+            await asyncio.sleep(0)
+            return
+        await future
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Return the next item, or the next read_size items, awaiting them if needed.
+        Raise StopAsyncIteration when the stream is stopped and no more data is
+        available."""
+        result = await self.aread(self.read_size, peek=self.peek, strict_n=self.strict_n)
+        if result is None:
+            raise StopAsyncIteration
+        return result
+
+    async def aread(self, n=None, *, peek=None, strict_n=None):
+        """Coroutine version of read(blocking=True): await the next item, or the next n
+        items, without blocking the event loop nor polling.
+
+        :param n: number of items to return
+        :param peek: if True, last_item cursor will not be updated
+        :param strict_n: if True, raise ValueError if n items are not available
+        :return: next item or list of next items if n > 1, None if the stream is stopped
+            and no more data is available
+        """
+        while True:
+            _read = self.read(n, peek=peek, ignore_no_item_found=True, strict_n=strict_n)
+            if _read is not None:
+                return _read
+            elif self.is_stopped:
+                return None
+            await self._await_new_data()
+
     def is_same_buffer(self, other_buffer_reader):
         """Check if reader is looking at the same buffer"""
         return (
@@ -208,23 +337,105 @@ class BufferReader:
         """key to last seen item cursor"""
         return self._last_key
 
+    @property
+    def last_seq(self):
+        """buffer sequence number of last seen item cursor"""
+        return self._last_seq
+
     def _getlast_item(self):
         return self._last_item
 
     def _setlast_item(self, item):
-        self._last_key = self._buffer.key(item)
-        self._last_item = item
+        self._set_cursor(
+            self._buffer.consistent_read(lambda reader: self._cursor_at(reader, item))
+        )
 
     def _dellast_item(self):
         del self._last_item
         self._last_item = None
         del self._last_key
         self._last_key = None
+        self._last_seq = None
+
+    @staticmethod
+    def _cursor_at(reader, item, index=None):
+        """Return the (item, key, seq) cursor of an item of the reader deque.
+
+        The cursor is the buffer sequence number of the item, so finding the next items
+        is offset arithmetic against reader.head_seq instead of a key search.
+
+        :param reader: the sorted deque of the buffer
+        :param item: the new last seen item
+        :param index: position of item in reader if known, otherwise found by key
+        """
+        if index is None:
+            key = reader.key(item)
+            return item, key, reader.seq_le(key)
+        return item, reader.key_at(index), reader.head_seq + index
+
+    def _set_cursor(self, cursor):
+        self._last_item, self._last_key, self._last_seq = cursor
+
+    def _next_index(self, reader):
+        """Index in reader of the first item after the cursor. Items dropped since the
+        last read are skipped."""
+        if self._last_seq is None:  # first time reading a value from buffer
+            return 0
+        return max(self._last_seq + 1 - reader.head_seq, 0)
+
+    def _overrun(self, reader):
+        """The Overrun of the items dropped from reader between the cursor and the next
+        item to read, if there is such an item, otherwise None. Items are only skipped if
+        the reader fell behind: items dropped after being read are not counted."""
+        if self._last_seq is None or len(reader) == 0:
+            return None
+        n_skipped = reader.head_seq - self._last_seq - 1
+        if n_skipped <= 0:
+            return None
+        return Overrun(n_skipped, self._last_key, reader.key_at(0))
+
+    def _handle_overrun(self, overrun):
+        """Account for the overrun, then move on past the gap. Only raises if
+        on_overrun == 'raise', after moving the cursor to the end of the gap"""
+        self.n_skipped += overrun.n_skipped
+        self.overruns.append(overrun)
+        if self.on_overrun == 'raise':
+            # last_item and last_key are still those of the last item read
+            self._last_seq += overrun.n_skipped
+            raise ReaderOverrunError(
+                f'{overrun.n_skipped} items were dropped before being read, between '
+                f'keys {overrun.after_key!r} and {overrun.next_key!r}',
+                overrun,
+            )
+        elif self.on_overrun is not None:
+            self.on_overrun(overrun)
+
+    def _sync_cursor(self):
+        """Re-derive the sequence cursor from last_key, i.e. after being attached to
+        another buffer whose sequence numbers are unrelated to the previous one"""
+        if self._last_key is not None:
+            self._last_seq = self._buffer.consistent_read(
+                lambda reader: reader.seq_le(self._last_key)
+            )
 
     last_item = property(
         _getlast_item, _setlast_item, _dellast_item, 'last seen item cursor'
     )
 
+    def _read_buffer(self, func, peek):
+        """Call func(reader) -> (result, cursor) or (result, cursor, overrun) on a
+        consistent state of the buffer and move the cursor unless peek or cursor is None.
+
+        func must not have side effects since the buffer may call it again when reading
+        optimistically (see RWLockSortedDeque.consistent_read).
+        """
+        result, cursor, *overrun = self._buffer.consistent_read(func)
+        if not peek and cursor is not None:
+            if overrun and overrun[0] is not None:
+                self._handle_overrun(overrun[0])
+            self._set_cursor(cursor)
+        return result
+
     def range(
         self,
         start,
@@ -258,20 +469,22 @@ class BufferReader:
         """
         if ignore_no_item_found is None:
             ignore_no_item_found = self._read_kwargs.get('ignore_no_item_found', False)
-        with self._buffer.reader_lock() as reader:
-            if only_new_items and self.last_key is not None:
-                _next = self.read(
-                    n=1, peek=True, ignore_no_item_found=ignore_no_item_found
-                )
-                try:
-                    _next_key = reader.key(_next)
-                except TypeError as e:  # TypeError: 'NoneType' object is not subscriptable
+
+        def _range(reader):
+            _start, _stop = start, stop
+            overrun = None
+            if only_new_items and self._last_seq is not None:
+                i = self._next_index(reader)
+                if i >= len(reader):
                     if ignore_no_item_found:
-                        return None
-                    raise e
-                _start = start if start > _next_key else _next_key
-            else:
-                _start = start
+                        return None, None
+                    raise ValueError(
+                        'No item found with key above: %r' % (self.last_key,)
+                    )
+                _next_key = reader.key_at(i)
+                if start <= _next_key:
+                    _start = _next_key
+                    overrun = self._overrun(reader)
             if start_le is True:
                 with suppress(
                     ValueError
@@ -279,22 +492,23 @@ class BufferReader:
                     _start = reader.key(reader.find_le(_start))
             if stop_ge is True:
                 try:
-                    stop = reader.key(reader.find_ge(stop))
+                    _stop = reader.key(reader.find_ge(stop))
                 except ValueError as e:  # ValueError: No item found with key at or above: stop
                     if ignore_no_item_found:
-                        return None
+                        return None, None
                     raise e
 
-            items = reader.range(_start, stop, step)
-
-        if not peek:
+            items = reader.range(_start, _stop, step)
+            if peek:
+                return items, None
             try:
-                self.last_item = items[-1]
+                return items, self._cursor_at(reader, items[-1]), overrun
             except IndexError as e:  # IndexError: list index out of range
                 if ignore_no_item_found:
-                    return None
+                    return None, None
                 raise e
-        return items
+
+        return self._read_buffer(_range, peek)
 
     def tail(self, *, peek=False, ignore_no_item_found=False, only_new_items=False):
         """Finds the last item in buffer. Raise ValueError if no item found.
@@ -306,37 +520,127 @@ class BufferReader:
             or return None if ignore_no_item_found
         :return: tail item
         """
-        with self._buffer.reader_lock() as reader:
-            if only_new_items:
-                try:
-                    item = reader.find_last_gt(self.last_key)
-                except ValueError as e:  # ValueError: No item found with key above: self.last_key
-                    if ignore_no_item_found:
-                        return None
-                    raise e
-                except TypeError as e:
-                    # TypeError: '>' not supported between instances of type(key) and 'NoneType'
-                    if self.last_item is None:  # first time reading a value from buffer
-                        item = reader[-1]
-                    else:
-                        raise e
-            else:
-                try:
-                    item = reader[-1]
-                except IndexError as e:  # IndexError: deque index out of range
-                    if ignore_no_item_found:
-                        return None
-                    raise e
-        if not peek:
-            self.last_item = item
-        return item
+
+        def _tail(reader):
+            i = len(reader) - 1
+            if (
+                only_new_items
+                and self._last_seq is not None
+                and reader.head_seq + i <= self._last_seq
+            ):
+                if ignore_no_item_found:
+                    return None, None
+                raise ValueError('No item found with key above: %r' % (self.last_key,))
+            try:
+                item = reader[-1]
+            except IndexError as e:  # IndexError: deque index out of range
+                if ignore_no_item_found:
+                    return None, None
+                raise e
+            return item, self._cursor_at(reader, item, i)
+
+        return self._read_buffer(_tail, peek)
 
     def head(self, *, peek=False):
-        with self._buffer.reader_lock() as reader:
+        def _head(reader):
             item = reader[0]
-        if not peek:
-            self.last_item = item
-        return item
+            return item, self._cursor_at(reader, item, 0)
+
+        return self._read_buffer(_head, peek)
+
+    def _read_from_index(self, index_of, peek):
+        """Read the items from index_of(reader) to the tail, moving the cursor to the
+        tail unless peek. Return an empty list if there are no such items."""
+
+        def _read_to_tail(reader):
+            size = len(reader)
+            i = index_of(reader) if size else size
+            if i >= size:
+                return [], None
+            items = reader.range_by_index(i, size)
+            return items, self._cursor_at(reader, items[-1], size - 1)
+
+        return self._read_buffer(_read_to_tail, peek)
+
+    def last_n(self, n, *, peek=False):
+        """Return the n most recent items, or all items if there are less than n.
+
+        :param n: number of items
+        :param peek: if True, last_item cursor will not be updated
+        :return: list of items, oldest first, empty if the buffer is empty
+        """
+        return self._read_from_index(lambda reader: max(len(reader) - n, 0), peek)
+
+    def last_duration(self, duration: Duration, *, peek=False):
+        """Return the items of the last duration up to the tail item, i.e. the items
+        whose keys are greater than tail_key - duration. The bound is found with a single
+        bisection under a single lock.
+
+        >>> import threading
+        >>> from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+        >>> buffer = RWLockSortedDeque(
+        ...     ((i * 250_000, f'chunk{i}') for i in range(10)), key=lambda x: x[0]
+        ... )  # int keys are microseconds
+        >>> reader = BufferReader(buffer, {}, threading.Event())
+        >>> [data for key, data in reader.last_duration(1)]
+        ['chunk6', 'chunk7', 'chunk8', 'chunk9']
+
+        :param duration: seconds, or a timedelta, converted to key units with key_span:
+            keys may be datetimes, float seconds or int microseconds
+        :param peek: if True, last_item cursor will not be updated
+        :return: list of items, oldest first, empty if the buffer is empty
+        """
+
+        def index_of(reader):
+            tail_key = reader.key_at(-1)
+            return reader.index_gt(tail_key - key_span(tail_key, duration))
+
+        return self._read_from_index(index_of, peek)
+
+    def since(self, key, *, peek=False):
+        """Return the items with a key greater than or equal to key.
+
+        :param key: key of the first item
+        :param peek: if True, last_item cursor will not be updated
+        :return: list of items, empty if there are none
+        """
+        return self._read_from_index(lambda reader: reader.index_ge(key), peek)
+
+    def summary(self, start, stop, resolution=None):
+        """Summary (count, sum, min, max and mean) of the aggregate values of the items
+        with keys from start to stop, inclusive, computed from the block summaries kept
+        by a StreamBuffer made with an aggregate function. The cursor is not moved.
+
+        >>> from stream2py import StreamBuffer
+        >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+        >>> source = SimpleSourceReader(range(1000))  # reads (index, value) tuples
+        >>> with StreamBuffer(
+        ...     source, maxlen=1000, aggregate=lambda x: x[1], aggregate_block_sizes=[10]
+        ... ) as buffer:
+        ...     reader = buffer.mk_reader()
+        ...     while reader.read(blocking=True)[0] < 999:  # until every item is read
+        ...         pass
+        ...     s = reader.summary(5, 994)  # from 2 blocks of items and 98 block summaries
+        ...     s.count, s.min, s.max, s.mean
+        ...     [s.max for s in reader.summary(0, 99, resolution=10)]
+        (990, 5, 994, 499.5)
+        [9, 19, 29, 39, 49, 59, 69, 79, 89, 99]
+
+        :param start: key of the first item
+        :param stop: key of the last item
+        :param resolution: None for a single Summary, or a number of items, 1 or one of
+            the aggregate_block_sizes, for a list of the summaries of consecutive blocks
+            of that many items
+        :return: Summary or list of Summary
+        """
+        aggregates = self._aggregates
+        if aggregates is None:
+            raise ConfigurationError(
+                'summary needs a StreamBuffer made with an aggregate function'
+            )
+        return self._buffer.consistent_read(
+            lambda reader: aggregates.summary(reader, start, stop, resolution)
+        )
 
     def read(
         self,
@@ -387,24 +691,16 @@ class BufferReader:
                 elif self.is_stopped:
                     return None
                 else:
-                    time.sleep(self._sleep_time_on_iter_none_s)
+                    self.wait_for_new_data()
 
-        with self._buffer.reader_lock() as reader:
-            try:
-                next_item = reader.find_gt(self.last_key)
-            except ValueError as e:  # ValueError: No item found with key above:
-                # self.last_key
+        def _read(reader):
+            i = self._next_index(reader)
+            overrun = self._overrun(reader)
+            if i >= len(reader):
                 if ignore_no_item_found:
-                    return None
-                raise e
-            except TypeError as e:
-                # TypeError: '<' not supported between instances of 'NoneType' and type(key)
-                if self.last_item is None:  # first time reading a value from buffer
-                    next_item = reader[0]
-                else:
-                    raise e
+                    return None, None
+                raise ValueError('No item found with key above: %r' % (self.last_key,))
             if n > 1:
-                i = reader.index(next_item)
                 j = i + n
                 if strict_n and j >= len(reader):
                     raise ValueError(
@@ -412,12 +708,165 @@ class BufferReader:
                     )
 
                 next_items_list = reader.range_by_index(i, j)
-                if not peek:
-                    self.last_item = next_items_list[-1]
-                return next_items_list
-            if not peek:
-                self.last_item = next_item
-            return next_item
+                last_index = i + len(next_items_list) - 1
+                return (
+                    next_items_list,
+                    self._cursor_at(reader, next_items_list[-1], last_index),
+                    overrun,
+                )
+            next_item = reader[i]
+            return next_item, self._cursor_at(reader, next_item, i), overrun
+
+        return self._read_buffer(_read, peek)
+
+    def read_available(self, max_n=None, *, peek=None):
+        """Return all the items after the cursor, at most max_n of them, and move the
+        cursor to the last one. Consumers waking up periodically drain the buffer with a
+        single lock acquisition instead of one read per item.
+
+        >>> import threading
+        >>> from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+        >>> reader = BufferReader(RWLockSortedDeque(range(5)), {}, threading.Event())
+        >>> reader.read_available(max_n=2)
+        [0, 1]
+        >>> reader.read_available()
+        [2, 3, 4]
+        >>> reader.read_available()
+        []
+
+        :param max_n: max number of items to return, None for all of them
+        :param peek: if True, last_item cursor will not be updated
+        :return: list of the items after the cursor, empty if there are none
+        """
+        if peek is None:
+            peek = self._read_kwargs['peek']
+
+        def _read_available(reader):
+            i = self._next_index(reader)
+            j = len(reader) if max_n is None else min(i + max_n, len(reader))
+            if i >= j:
+                return [], None
+            items = reader.range_by_index(i, j)
+            return items, self._cursor_at(reader, items[-1], j - 1), self._overrun(reader)
+
+        return self._read_buffer(_read_available, peek)
+
+    def read_new(self, max_n=None, *, blocking=False) -> Optional[list]:
+        """Return the items after the cursor, at most max_n of them, like
+        read_available, but telling a stream that has no new items yet from a stream
+        that is stopped and exhausted. Consumers of several readers, i.e. merging or
+        joining them, use it to know when a reader is done.
+
+        >>> import threading
+        >>> from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+        >>> stopped = threading.Event()
+        >>> reader = BufferReader(RWLockSortedDeque(range(3)), {}, stopped)
+        >>> reader.read_new(), reader.read_new()
+        ([0, 1, 2], [])
+        >>> stopped.set()
+        >>> reader.read_new() is None
+        True
+
+        :param max_n: max number of items to return, None for all of them
+        :param blocking: if True, wait for items after the cursor if there are none
+        :return: list of the items after the cursor, empty if there are none yet, which
+            only happens if not blocking, or None once the stream is stopped and every
+            item was read
+        """
+        while True:
+            items = self.read_available(max_n, peek=False)
+            if items:
+                return items
+            if self.is_stopped:
+                # the writer may have appended items after the read, before the stop
+                return self.read_available(max_n, peek=False) or None
+            if not blocking:
+                return items
+            self.wait_for_new_data()
+
+    def iter_windows(self, size, hop=None, *, by_key=False, copy=False):
+        """Iterate over sliding windows of size items, or of a size span of keys, every
+        hop items or keys. Each window is yielded once complete, blocking until then, and
+        the iteration stops when the stream is stopped and exhausted, without yielding an
+        incomplete window. New items are read in batches with read_available and the
+        overlap of consecutive windows is kept, not read again, so moving to the next
+        window costs O(hop), not O(size).
+
+        The window yielded is a deque updated in place: it is only valid until the next
+        window is asked for. Copy it, or use copy=True, to keep it.
+
+        >>> import threading
+        >>> from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+        >>> stopped = threading.Event()
+        >>> stopped.set()
+        >>> reader = BufferReader(RWLockSortedDeque(range(10)), {}, stopped)
+        >>> [list(window) for window in reader.iter_windows(4, 2)]
+        [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9]]
+        >>> del reader.last_item
+        >>> list(reader.iter_windows(3, 2, by_key=True, copy=True))  # [key, key + 3)
+        [[0, 1, 2], [2, 3, 4], [4, 5, 6], [6, 7, 8]]
+
+        :param size: number of items of a window, or its span of keys if by_key, i.e. a
+            number of microseconds for int timestamp keys, a timedelta for datetime keys
+        :param hop: items, or keys, from the start of a window to the start of the next,
+            size by default (tumbling windows)
+        :param by_key: if True, size and hop are differences of keys: windows start at
+            the key of the first item read, and are complete once an item past their end
+            is read. Windows of a gap of keys are empty.
+        :param copy: if True, yield a new list of the items of each window, which costs
+            O(size) per window, instead of the deque of the window itself
+        :return: generator of deques of items, or of lists if copy
+        """
+        hop = size if hop is None else hop
+        zero = size - size
+        if size <= zero or hop <= zero:
+            raise ValueError(f'size and hop must be positive: size={size}, hop={hop}')
+        if by_key:
+            return self._iter_windows_by_key(size, hop, copy)
+        return self._iter_windows_by_count(size, hop, copy)
+
+    def _iter_windows_by_count(self, size, hop, copy):
+        window, pending = deque(), deque()
+        to_skip = 0  # items between two windows if hop > size
+        while True:
+            while len(window) < size:
+                if not pending:
+                    pending.extend(self.read_new(blocking=True) or [])
+                    if not pending:
+                        return
+                elif to_skip:
+                    pending.popleft()
+                    to_skip -= 1
+                else:
+                    window.append(pending.popleft())
+            yield list(window) if copy else window
+            n_dropped = min(hop, size)
+            for _ in range(n_dropped):
+                window.popleft()
+            to_skip = hop - n_dropped
+
+    def _iter_windows_by_key(self, size, hop, copy):
+        key = self._buffer.key
+        window, pending = deque(), deque(self.read_new(blocking=True) or [])
+        if not pending:
+            return
+        start = key(pending[0])
+        while True:
+            end = start + size
+            while True:  # the window is complete once an item past its end is read
+                while pending and key(pending[0]) < end:
+                    window.append(pending.popleft())
+                if pending:
+                    break
+                pending.extend(self.read_new(blocking=True) or [])
+                if not pending:
+                    return
+            yield list(window) if copy else window
+            start += hop
+            while window and key(window[0]) < start:
+                window.popleft()
+            while pending and key(pending[0]) < start:
+                pending.popleft()
 
     def next(self, n=1, *, peek=False, ignore_no_item_found=False, strict_n=False):
         from warnings import warn
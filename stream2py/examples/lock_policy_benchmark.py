@@ -0,0 +1,109 @@
+"""Contention benchmark of the buffer lock policies.
+
+One writer thread appends to a buffer as fast as it can while a growing number of
+BufferReaders poll it for new items. For every lock policy and reader count, it
+reports the write throughput, the total read throughput and the p99 latency of a read.
+
+Run it with::
+
+    python -m stream2py.examples.lock_policy_benchmark
+
+"""
+import threading
+import time
+from typing import Iterable, List
+
+from stream2py.buffer_reader import BufferReader
+from stream2py.utility.lock_policies import LOCK_POLICIES
+from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def benchmark_lock_policy(
+    lock_policy, n_readers: int, *, duration_s: float = 1.0, maxlen: int = 10000
+) -> dict:
+    """Measure one lock policy with n_readers polling readers.
+
+    :return: dict of lock_policy, n_readers, writes_per_s, reads_per_s and p99_read_us
+    """
+    buffer = RWLockSortedDeque(maxlen=maxlen, lock_policy=lock_policy)
+    stop_event = threading.Event()
+    # threads only start contending once they are all started
+    start_barrier = threading.Barrier(n_readers + 2)
+    latencies = [[] for _ in range(n_readers)]
+    n_written = [0]
+
+    def write():
+        start_barrier.wait()
+        i = 0
+        while not stop_event.is_set():
+            with buffer.writer_lock() as writer:
+                writer.append(i)
+            i += 1
+        n_written[0] = i
+
+    def read(reader_latencies):
+        reader = BufferReader(buffer, {}, stop_event, ignore_no_item_found=True)
+        perf_counter = time.perf_counter
+        start_barrier.wait()
+        while not stop_event.is_set():
+            tic = perf_counter()
+            reader.read()
+            reader_latencies.append(perf_counter() - tic)
+
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read, args=(lat,)) for lat in latencies]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    time.sleep(duration_s)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    all_latencies = sorted(lat for lats in latencies for lat in lats)
+    return dict(
+        lock_policy=lock_policy,
+        n_readers=n_readers,
+        writes_per_s=n_written[0] / duration_s,
+        reads_per_s=len(all_latencies) / duration_s,
+        p99_read_us=_percentile(all_latencies, 0.99) * 1e6,
+    )
+
+
+def benchmark_lock_policies(
+    lock_policies: Iterable = tuple(LOCK_POLICIES),
+    reader_counts: Iterable[int] = (1, 2, 4, 8, 16),
+    *,
+    duration_s: float = 1.0,
+    maxlen: int = 10000,
+) -> List[dict]:
+    """Run benchmark_lock_policy for every lock policy and reader count"""
+    return [
+        benchmark_lock_policy(
+            lock_policy, n_readers, duration_s=duration_s, maxlen=maxlen
+        )
+        for lock_policy in lock_policies
+        for n_readers in reader_counts
+    ]
+
+
+def print_results(results: List[dict]):
+    print(
+        f"{'lock_policy':>16} {'readers':>8} {'writes/s':>12} {'reads/s':>12} "
+        f"{'p99 read (us)':>14}"
+    )
+    for r in results:
+        print(
+            f"{str(r['lock_policy']):>16} {r['n_readers']:>8} {r['writes_per_s']:>12.0f} "
+            f"{r['reads_per_s']:>12.0f} {r['p99_read_us']:>14.1f}"
+        )
+
+
+if __name__ == '__main__':
+    print_results(benchmark_lock_policies())
@@ -35,3 +35,12 @@ class InvalidDataError(Stream2PyError):
 
 class ConfigurationError(Stream2PyError):
     """Raised when stream2py objects are misconfigured"""
+
+
+class ReaderOverrunError(BufferError):
+    """Raised by a BufferReader with on_overrun='raise' when items were dropped from the
+    buffer before it could read them. The Overrun gap is the second argument."""
+
+    @property
+    def overrun(self):
+        return self.args[1]
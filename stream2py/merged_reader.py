@@ -0,0 +1,223 @@
+"""
+A MergedReader reads the items of several StreamBuffers, i.e. the events of many devices, as a
+single stream ordered by key, with a heap based k-way merge costing O(log k) per item for k
+buffers.
+
+An item is only returned once every buffer still running has reached its key: the watermark of
+the merge is the smallest of the keys last read from each buffer, so no item read afterwards can
+be older than an item already returned. A running buffer without data holds back the merge.
+"""
+__all__ = ['MergedReader', 'merge_stream_buffers']
+
+import heapq
+from collections import deque
+from typing import Iterable, Optional
+
+from stream2py.buffer_reader import BufferReader
+from stream2py.stream_buffer import StreamBuffer
+
+
+class MergedReader:
+    """Reads the items of several BufferReaders, of different StreamBuffers, in the order
+    of their keys.
+
+    >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+    >>> odds = StreamBuffer(SimpleSourceReader([1, 3, 5]))
+    >>> odds.source_reader.key = lambda data: data[1]
+    >>> evens = StreamBuffer(SimpleSourceReader([0, 2, 4, 6]))
+    >>> evens.source_reader.key = lambda data: data[1]
+    >>> with odds, evens:
+    ...     merged = MergedReader([odds.mk_reader(), evens.mk_reader()])
+    ...     [merged.read(blocking=True)[1] for _ in range(6)]
+    [0, 1, 2, 3, 4, 5]
+    >>> merged.read(blocking=True)  # once stopped, the items of every reader are merged
+    (3, 6)
+    >>> merged.read(blocking=True) is None
+    True
+    """
+
+    def __init__(self, readers: Iterable[BufferReader], *, with_index=False):
+        """
+        :param readers: BufferReaders whose items have comparable keys. Their cursors are
+            moved as items are read.
+        :param with_index: if True, return (index of the reader, item) tuples
+        """
+        self.readers = list(readers)
+        self.with_index = with_index
+        self._keys = [reader._buffer.key for reader in self.readers]
+        self._pending = [deque() for _ in self.readers]  # items read, not returned yet
+        self._watermarks = [None] * len(self.readers)  # key last read from each reader
+        self._heap = []  # (key, index) of the first pending item of each reader
+        # readers without pending items, which are not stopped and exhausted
+        self._blocked = set(range(len(self.readers)))
+
+    @property
+    def is_stopped(self) -> bool:
+        """True once every reader is stopped and every item was returned"""
+        return not self._heap and not self._blocked
+
+    def _fill(self, i):
+        """Read the new items of blocked reader i"""
+        items = self.readers[i].read_new()
+        if items is None:
+            self._blocked.discard(i)  # stopped and exhausted
+            return
+        if items:
+            key, pending = self._keys[i], self._pending[i]
+            heapq.heappush(self._heap, (key(items[0]), i))
+            pending.extend(items)
+            self._watermarks[i] = key(items[-1])
+            self._blocked.discard(i)
+
+    def _pop(self):
+        """The next (index, item) if every running reader reached its key, else None"""
+        for i in list(self._blocked):
+            self._fill(i)
+        if not self._heap:
+            return None
+        key, i = self._heap[0]
+        for j in self._blocked:
+            watermark = self._watermarks[j]
+            if watermark is None or watermark < key:
+                return None  # reader j could still have items before key
+        pending = self._pending[i]
+        item = pending.popleft()
+        if pending:
+            heapq.heapreplace(self._heap, (self._keys[i](pending[0]), i))
+        else:
+            heapq.heappop(self._heap)
+            self._blocked.add(i)
+        return i, item
+
+    def wait_for_new_data(self):
+        """Wait for the reader holding back the merge: a blocked reader with the lowest
+        watermark"""
+        if not self._blocked:
+            return
+        never_read = [j for j in self._blocked if self._watermarks[j] is None]
+        if never_read:
+            i = never_read[0]
+        else:
+            i = min(self._blocked, key=self._watermarks.__getitem__)
+        self.readers[i].wait_for_new_data()
+
+    def read(self, *, blocking=False):
+        """Return the next item in key order.
+
+        :param blocking: if True, wait for the next item if it cannot be returned yet
+        :return: the next item, or (index, item) if with_index, None if there is none yet
+            or, when blocking, if every reader is stopped and exhausted
+        """
+        while True:
+            popped = self._pop()
+            if popped is not None:
+                return popped if self.with_index else popped[1]
+            if not blocking or self.is_stopped:
+                return None
+            self.wait_for_new_data()
+
+    def read_available(self, max_n=None) -> list:
+        """Return the items that can be returned now, in key order.
+
+        :param max_n: max number of items, None for all of them. The others are
+            returned by the next reads.
+        """
+        items = []
+        while max_n is None or len(items) < max_n:
+            popped = self._pop()
+            if popped is None:
+                break
+            items.append(popped if self.with_index else popped[1])
+        return items
+
+    def __iter__(self):
+        """Iterate over the merged items until every reader is stopped and exhausted"""
+        while True:
+            item = self.read(blocking=True)
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+class _MergedSource:
+    """Source of the StreamBuffer made by merge_stream_buffers"""
+
+    # read_batch waits for the items of the merged buffers itself
+    sleep_time_on_read_none_s = 0
+
+    def __init__(self, stream_buffers):
+        self.stream_buffers = stream_buffers
+        self._keys = [buffer.source_reader.key for buffer in stream_buffers]
+        self.on_exhausted = None  # called once every merged buffer is stopped and read
+        self._merged = None
+
+    def key(self, data):
+        i, item = data
+        return self._keys[i](item), i
+
+    @property
+    def info(self) -> dict:
+        return dict(merged=[buffer.source_reader_info for buffer in self.stream_buffers])
+
+    def open(self):
+        readers = [buffer.mk_reader() for buffer in self.stream_buffers]
+        self._merged = MergedReader(readers, with_index=True)
+
+    def read_batch(self, max_n=None):
+        merged = self._merged
+        items = merged.read_available(max_n)
+        if not items:
+            if merged.is_stopped:
+                if self.on_exhausted is not None:
+                    self.on_exhausted()
+                return None
+            merged.wait_for_new_data()
+            items = merged.read_available(max_n)
+        return items
+
+    def read(self):
+        return self._merged.read()
+
+    def close(self):
+        if self._merged is not None:
+            for buffer, reader in zip(self.stream_buffers, self._merged.readers):
+                buffer.detach_reader(reader)
+            self._merged = None
+
+
+def merge_stream_buffers(
+    stream_buffers: Iterable[StreamBuffer], *, maxlen: Optional[int] = None, **kwargs
+) -> StreamBuffer:
+    """Make a started StreamBuffer of the items of several StreamBuffers, merged
+    in key order by a single MergedReader, for any number of readers. Its items are
+    (index of the StreamBuffer, item) tuples, with (key, index) keys so that items of
+    different buffers with the same key are all kept. It stops once every merged buffer
+    is stopped and its items are all merged.
+
+    >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+    >>> with StreamBuffer(SimpleSourceReader('ab')) as b1, StreamBuffer(
+    ...     SimpleSourceReader('xyz')
+    ... ) as b2:
+    ...     reader = merge_stream_buffers([b1, b2]).mk_reader()
+    ...     [reader.read(blocking=True) for _ in range(4)]
+    [(0, (0, 'a')), (1, (0, 'x')), (0, (1, 'b')), (1, (1, 'y'))]
+
+    :param stream_buffers: started StreamBuffers whose items have comparable keys
+    :param maxlen: maxlen of the merged buffer, the sum of the maxlens of stream_buffers
+        by default
+    :param kwargs: other keyword arguments of the merged StreamBuffer
+    :return: the merged StreamBuffer, started
+    :raises StreamNotStartedError: if a StreamBuffer hasn't been started yet
+    """
+    stream_buffers = list(stream_buffers)
+    if maxlen is None:
+        maxlen = sum(buffer._maxlen for buffer in stream_buffers)
+    source = _MergedSource(stream_buffers)
+    merged = StreamBuffer(source, maxlen=maxlen, **kwargs)
+    source.on_exhausted = merged._set_stop_event
+    merged.start()
+    return merged
@@ -1,6 +1,6 @@
 """Defines protocols for classes to avoid circular imports"""
 
-from typing import Any, Protocol, runtime_checkable
+from typing import Any, Optional, Protocol, Sequence, runtime_checkable
 
 
 @runtime_checkable
@@ -26,3 +26,23 @@ class Source(Protocol):
 
     def close(self) -> None:
         ...
+
+
+@runtime_checkable
+class BatchSource(Source, Protocol):
+    """A Source that can also deliver many items per call.
+
+    ``read_batch`` is optional for sources: when present, StreamBuffer uses it instead of
+    ``read`` and pushes every returned batch into its buffer under one writer lock.
+    It suits sources that naturally get many records at once (sockets, files, HTTP
+    chunks...).
+    """
+
+    def read_batch(self, max_n: Optional[int] = None) -> Optional[Sequence[Any]]:
+        """Return a sequence of items sorted by key, or None or an empty sequence when
+        no data is ready.
+
+        :param max_n: number of items the buffer can take without losing data, None
+            if unbounded. Returning more items is allowed: the oldest will be dropped.
+        """
+        ...
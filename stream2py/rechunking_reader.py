@@ -0,0 +1,208 @@
+"""
+A RechunkingReader reads the chunks of a BufferReader, i.e. the frames_per_buffer samples of an
+audio source, as frames of another size, i.e. 160 samples for voice activity detection or 4096
+for an FFT, each with a key interpolated from the keys of the chunks.
+
+Frames inside a chunk are slices of it, and only frames straddling a chunk boundary are
+concatenated, so consumers with different frame sizes can each have their own RechunkingReader of
+the same StreamBuffer.
+"""
+__all__ = ['RechunkingReader', 'join_chunks']
+
+from collections import deque
+from numbers import Integral
+from operator import itemgetter
+from typing import Any, Callable, Optional, Sequence
+
+from stream2py.buffer_reader import BufferReader
+
+
+def join_chunks(parts: Sequence):
+    """Concatenate pieces of chunk data: bytes-likes, str, lists, tuples or numpy arrays
+
+    >>> join_chunks([b'ab', bytearray(b'c'), memoryview(b'de')])
+    b'abcde'
+    >>> join_chunks([[1, 2], [3]])
+    [1, 2, 3]
+    """
+    first = parts[0]
+    if isinstance(first, (bytes, bytearray, memoryview)):
+        return b''.join(parts)
+    if isinstance(first, str):
+        return ''.join(parts)
+    if isinstance(first, (list, tuple)):
+        return type(first)(x for part in parts for x in part)
+    if hasattr(first, '__array__'):
+        from numpy import concatenate
+
+        return concatenate(parts)
+    raise TypeError(
+        f"Don't know how to join chunks of type {type(first).__name__}: "
+        f'give RechunkingReader a join function'
+    )
+
+
+class _Chunk:
+    __slots__ = ('key', 'data', 'n_samples')
+
+    def __init__(self, key, data, n_samples):
+        self.key = key
+        self.data = data
+        self.n_samples = n_samples
+
+
+class RechunkingReader:
+    """Reads the chunks of a BufferReader as (key, frame) tuples of frame_size samples.
+
+    The key of a frame is the key of its first sample: the key of the chunk it is in plus
+    its offset in the chunk times the sample period. The sample period is sample_period if
+    given, otherwise it is interpolated between the keys of the chunk and of the next one,
+    so a frame starting inside a chunk is only returned once the next chunk is read.
+
+    >>> from stream2py import StreamBuffer
+    >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+    >>> chunks = [b'abcd', b'efgh', b'ijkl']  # 4 samples every 40 ms
+    >>> source = SimpleSourceReader(chunks)
+    >>> source.key = lambda data: data[0] * 40_000  # microseconds
+    >>> with StreamBuffer(source) as buffer:
+    ...     frames = RechunkingReader(buffer.mk_reader(), 3)
+    ...     [frames.read(blocking=True) for _ in range(3)]
+    [(0, b'abc'), (30000, b'def'), (60000, b'ghi')]
+    """
+
+    def __init__(
+        self,
+        buffer_reader: BufferReader,
+        frame_size: int,
+        *,
+        data: Callable[[Any], Sequence] = itemgetter(1),
+        sample_size: int = 1,
+        sample_period=None,
+        join: Callable[[Sequence], Sequence] = join_chunks,
+    ):
+        """
+        :param buffer_reader: reader of the StreamBuffer of chunks. Its cursor is moved
+            as chunks are read.
+        :param frame_size: number of samples of a frame
+        :param data: function returning the sliceable data of a chunk, i.e. its bytes,
+            by default the second element of (index, data) tuples
+        :param sample_size: number of data elements of a sample, i.e. bytes per sample
+            times number of channels for raw audio bytes
+        :param sample_period: difference of keys between two samples, i.e.
+            1_000_000 / rate for microsecond keys. If None, it is interpolated from the
+            keys of consecutive chunks.
+        :param join: function concatenating a list of pieces of chunk data
+        """
+        if frame_size < 1 or sample_size < 1:
+            raise ValueError(
+                f'frame_size and sample_size must be positive: '
+                f'frame_size={frame_size}, sample_size={sample_size}'
+            )
+        self.buffer_reader = buffer_reader
+        self.frame_size = frame_size
+        self.data = data
+        self.sample_size = sample_size
+        self.sample_period = sample_period
+        self.join = join
+        self._key = buffer_reader._buffer.key
+        self._chunks = deque()
+        self._offset = 0  # samples of the first chunk already read
+        self._n_samples = 0  # samples available from the offset on
+        self._period = None  # sample period of the last two chunks read
+
+    @property
+    def is_stopped(self) -> bool:
+        return self.buffer_reader.is_stopped
+
+    def _add_chunks(self, items):
+        for item in items:
+            key, data = self._key(item), self.data(item)
+            chunk = _Chunk(key, data, len(data) // self.sample_size)
+            if self._chunks and self._chunks[-1].n_samples:
+                last = self._chunks[-1]
+                self._period = (key - last.key) / last.n_samples
+            self._chunks.append(chunk)
+            self._n_samples += chunk.n_samples
+
+    def _first_chunk_period(self, final: bool):
+        """Sample period in the first chunk, None if not known yet. Once the stream is
+        stopped (final), the last chunk gets the period of the previous one."""
+        if self.sample_period is not None:
+            return self.sample_period
+        if len(self._chunks) > 1:
+            first, second = self._chunks[0], self._chunks[1]
+            return (second.key - first.key) / first.n_samples
+        if final:
+            return self._period
+        return None
+
+    def _frame_key(self, final: bool):
+        """Key of the next frame, or raise LookupError if it cannot be interpolated yet"""
+        key = self._chunks[0].key
+        if self._offset == 0:
+            return key
+        period = self._first_chunk_period(final)
+        if period is None:
+            if not final:
+                raise LookupError('The next chunk is needed to interpolate the key')
+            return key  # a single chunk: there is nothing to interpolate from
+        key_offset = self._offset * period
+        if isinstance(key, Integral):
+            key_offset = round(key_offset)
+        return key + key_offset
+
+    def _take_frame(self, final: bool = False):
+        """Return the next (key, frame), None if it is not complete or keyed yet"""
+        if self._n_samples < self.frame_size:
+            return None
+        try:
+            key = self._frame_key(final)
+        except LookupError:
+            return None
+        size = self.sample_size
+        start, n_left = self._offset * size, self.frame_size * size
+        first = self._chunks[0].data
+        if start + n_left <= len(first):  # inside the first chunk: no copy but a slice
+            frame = first[start : start + n_left]
+        else:
+            parts, i = [], 0
+            while n_left > 0:
+                part = self._chunks[i].data[start : start + n_left]
+                parts.append(part)
+                n_left -= len(part)
+                start, i = 0, i + 1
+            frame = self.join(parts)
+        self._advance(self.frame_size)
+        return key, frame
+
+    def _advance(self, n_samples):
+        self._n_samples -= n_samples
+        self._offset += n_samples
+        while self._chunks and self._offset >= self._chunks[0].n_samples:
+            self._offset -= self._chunks.popleft().n_samples
+
+    def read(self, *, blocking=False):
+        """Return the next (key, frame).
+
+        :param blocking: if True, wait for the next frame if it is not yet available
+        :return: (key, frame) tuple, None if not available yet, or, when blocking, if the
+            stream is stopped and there are not enough samples left for a frame
+        """
+        reader = self.buffer_reader
+        while True:
+            chunks = reader.read_new()
+            final = chunks is None  # the stream is stopped and every chunk was read
+            if chunks:
+                self._add_chunks(chunks)
+            frame = self._take_frame(final)
+            if frame is not None or final or not blocking:
+                return frame
+            reader.wait_for_new_data()
+
+    def __iter__(self):
+        """Iterate over (key, frame) tuples until the stream is stopped"""
+        while True:
+            frame = self.read(blocking=True)
+            if frame is None:
+                return
+            yield frame
@@ -0,0 +1,231 @@
+"""
+A SharedMemoryStreamBuffer is a StreamBuffer that keeps its data in a shared memory ring of
+keyed byte records, so that consumers of other processes, i.e. CPU heavy feature extraction or
+inference, can read it with BufferReaders that do not fight over the GIL of the producer.
+
+Readers of other processes are made with mk_shared_memory_reader and the name of the shared
+memory segment. They slice the payload bytes out of shared memory: nothing is pickled.
+"""
+from __future__ import annotations
+
+__all__ = ['SharedMemoryStreamBuffer', 'mk_shared_memory_reader']
+
+import threading
+from typing import Any, Callable, Optional, Type, Union
+
+from stream2py.buffer_reader import BufferReader
+from stream2py.protocols import Source
+from stream2py.stream_buffer import RestartPolicy, StreamBuffer, _SourceBuffer
+from stream2py.utility.shared_memory_ring import DFLT_INFO_SIZE, SharedMemoryRing
+
+ToBytes = Callable[[Any], Any]  # data item -> bytes-like payload
+FromBytes = Callable[[bytes], Any]  # payload bytes -> object
+
+
+class _SharedMemorySourceBuffer(_SourceBuffer):
+    """_SourceBuffer writing (key, payload) records to a SharedMemoryRing"""
+
+    def __init__(
+        self,
+        source_reader_info: dict,
+        stop_event: threading.Event,
+        *,
+        key: Callable,
+        maxlen: int,
+        record_size: int,
+        key_format: str = 'q',
+        to_bytes: Optional[ToBytes] = None,
+        from_bytes: Optional[FromBytes] = None,
+        info_size: int = DFLT_INFO_SIZE,
+        name: Optional[str] = None,
+        buffer_reader_class: Type[BufferReader] = BufferReader,
+    ):
+        self._source_key = key
+        self._to_bytes = to_bytes
+        self._ring_kwargs = dict(
+            record_size=record_size,
+            key_format=key_format,
+            info_size=info_size,
+            name=name,
+            from_bytes=from_bytes,
+        )
+        super().__init__(
+            source_reader_info,
+            stop_event,
+            key=key,
+            maxlen=maxlen,
+            buffer_reader_class=buffer_reader_class,
+        )
+        self.publish_info()
+
+    def _mk_buffer(self, *, maxlen, **buffer_kwargs):
+        return SharedMemoryRing.create(maxlen, **self._ring_kwargs)
+
+    @property
+    def name(self) -> str:
+        return self._buffer.name
+
+    def _record(self, item):
+        payload = item if self._to_bytes is None else self._to_bytes(item)
+        return self._source_key(item), payload
+
+    def append(self, item):
+        self._buffer.append(self._record(item))
+
+    def extend(self, items):
+        self._buffer.extend(list(map(self._record, items)))
+
+    def notify_readers(self):
+        """Readers poll the ring, but readers of other processes only see the stop
+        through the stop flag of the ring"""
+        if self._stop_event.is_set():
+            self._buffer.stop_event.set()
+
+    def drop(self, n=1):
+        self._buffer.drop(n)
+
+    def drop_until(self, key):
+        return self._buffer.drop_until(key)
+
+    def publish_info(self):
+        """Share source_reader_info with the readers of other processes"""
+        self._buffer.set_info(self._source_reader_info)
+
+    def unlink(self):
+        self._buffer.unlink()
+
+
+class SharedMemoryStreamBuffer(StreamBuffer):
+    """A StreamBuffer whose buffer is in shared memory, readable from other processes.
+
+    Each data item read from source_reader is stored as a record: its key, which must be
+    an int (key_format='q'), i.e. a timestamp in microseconds, or a float
+    (key_format='d'), and a payload of at most record_size bytes given by to_bytes.
+    BufferReaders, of this process or of others, read (key, payload) tuples.
+
+    >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+    >>> source = SimpleSourceReader([b'abc', b'de', b'f'])  # reads (index, bytes) tuples
+    >>> with SharedMemoryStreamBuffer(
+    ...     source, maxlen=10, record_size=4, to_bytes=lambda data: data[1]
+    ... ) as buffer:
+    ...     # in another process, with the name of the segment:
+    ...     reader = mk_shared_memory_reader(buffer.shared_memory_name)
+    ...     [reader.read(blocking=True) for _ in range(3)]
+    ...     reader.close()
+    [(0, b'abc'), (1, b'de'), (2, b'f')]
+    """
+
+    # rolling stats live in the memory of the writing process, not in the ring
+    _supports_rolling_stats = False
+
+    def __init__(
+        self,
+        source_reader: Source,
+        *,
+        record_size: int,
+        maxlen: int = 100,
+        key_format: str = 'q',
+        to_bytes: Optional[ToBytes] = None,
+        from_bytes: Optional[FromBytes] = None,
+        info_size: int = DFLT_INFO_SIZE,
+        name: Optional[str] = None,
+        sleep_time_on_read_none_s: Optional[Union[int, float]] = None,
+        auto_drop=True,
+        scheduler=None,
+        restart_policy: Union[RestartPolicy, bool, None] = None,
+    ):
+        """
+        :param source_reader: instance of a SourceReader subclass
+        :param record_size: max number of bytes of the payload of a data item
+        :param maxlen: number of records of the ring
+        :param key_format: 'q' for int keys or 'd' for float keys
+        :param to_bytes: function returning the bytes-like payload of a data item, None if
+            data items are bytes-like themselves
+        :param from_bytes: function applied to payload bytes by the BufferReaders of this
+            process. Readers of other processes get theirs with mk_shared_memory_reader.
+        :param info_size: max number of bytes of source_reader_info as JSON
+        :param name: name of the shared memory segment, None for a random one
+
+        See StreamBuffer for the other parameters.
+        """
+        super().__init__(
+            source_reader,
+            maxlen=maxlen,
+            sleep_time_on_read_none_s=sleep_time_on_read_none_s,
+            auto_drop=auto_drop,
+            scheduler=scheduler,
+            restart_policy=restart_policy,
+        )
+        self.record_size = record_size
+        self.key_format = key_format
+        self.to_bytes = to_bytes
+        self.from_bytes = from_bytes
+        self.info_size = info_size
+        self.name = name
+
+    @property
+    def shared_memory_name(self) -> Optional[str]:
+        """Name of the shared memory segment of the running session, to give to
+        mk_shared_memory_reader"""
+        if self.source_buffer is not None:
+            return self.source_buffer.name
+        return None
+
+    def _set_source_buffer(self):
+        self.source_buffer = _SharedMemorySourceBuffer(
+            source_reader_info=self.source_reader.info,
+            stop_event=self._stop_event,
+            key=self.source_reader.key,
+            maxlen=self._maxlen,
+            record_size=self.record_size,
+            key_format=self.key_format,
+            to_bytes=self.to_bytes,
+            from_bytes=self.from_bytes,
+            info_size=self.info_size,
+            name=self.name,
+            buffer_reader_class=getattr(
+                self.source_reader, 'buffer_reader_class', BufferReader
+            ),
+        )
+        if self.restart_policy is not None:
+            self.source_buffer.source_reader_info['restart_count'] = 0
+            self.source_buffer.publish_info()
+
+    def _count_restart(self):
+        super()._count_restart()
+        self.source_buffer.publish_info()
+
+    def _close_source(self):
+        """Close the source, and unlink the segment: attached readers can still read what
+        is left, but no new reader can attach"""
+        try:
+            super()._close_source()
+        finally:
+            self.source_buffer.unlink()
+
+
+def mk_shared_memory_reader(
+    name: str,
+    *,
+    from_bytes: Optional[FromBytes] = None,
+    buffer_reader_class: Type[BufferReader] = BufferReader,
+    **read_kwargs,
+) -> BufferReader:
+    """Make a BufferReader of the SharedMemoryStreamBuffer whose segment is called name,
+    from any process.
+
+    :param name: SharedMemoryStreamBuffer.shared_memory_name
+    :param from_bytes: function applied to payload bytes, i.e. numpy.frombuffer
+    :param read_kwargs: keyword arguments of BufferReader
+    :return: BufferReader reading (key, payload) records. Call its close method once done
+        to release the shared memory.
+    """
+    ring = SharedMemoryRing.attach(name, from_bytes=from_bytes)
+    reader = buffer_reader_class(
+        buffer=ring,
+        source_reader_info=ring.info,
+        stop_event=ring.stop_event,
+        **read_kwargs,
+    )
+    reader.onclose = ring.close
+    return reader
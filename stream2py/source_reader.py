@@ -15,6 +15,10 @@ from stream2py.utility.typing_hints import ComparableType
 class SourceReader(Source, metaclass=ABCMeta):
     """(deprecated) Abstract class interface to be used by StreamBuffer.
 
+    Subclasses that naturally get many items at once can also define the optional
+    ``read_batch(max_n)`` method of the ``BatchSource`` protocol. StreamBuffer will then
+    use it instead of ``read`` and buffer each batch under a single lock.
+
     >>> from stream2py import SourceReader
     >>>
     >>> class SimpleCounterString(SourceReader):
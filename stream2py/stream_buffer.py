@@ -5,22 +5,82 @@ Second, it is a factory of BufferReaders instances for multiple consumers.
 """
 from __future__ import annotations
 
-__all__ = ['StreamBuffer']
+__all__ = ['StreamBuffer', 'RestartPolicy']
 
+import concurrent.futures
 import logging
+import os
 import threading
 import time
-from typing import Optional, Union, Type
+import weakref
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Optional, Sequence, Tuple, Union, Type
 
 from stream2py.protocols import Source
 from stream2py import BufferReader
+from stream2py.utility.aggregate_pyramid import DFLT_BLOCK_SIZES, AggregatePyramid
+from stream2py.utility.lock_policies import DFLT_LOCK_POLICY, LockPolicy
 from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
-from stream2py.exceptions import StreamNotStartedError
+from stream2py.utility.rolling_stats import RollingStats
+from stream2py.exceptions import ConfigurationError, StreamNotStartedError
+
+if TYPE_CHECKING:
+    from stream2py.stream_scheduler import StreamScheduler
 
 logger = logging.getLogger(__name__)
 
 DFLT_SLEEP_TIME_ON_READ_NONE_S = 0.3
 DFLT_MAX_LEN = 10000
+DFLT_STOP_TIMEOUT_S = 1
+DFLT_DERIVE_BATCH_SIZE = 64
+# twice the number of workers of a default ProcessPoolExecutor
+DFLT_DERIVE_MAX_IN_FLIGHT = 2 * (os.cpu_count() or 1)
+
+
+class RestartPolicy:
+    """How a StreamBuffer reopens its source after an exception is raised while reading it,
+    instead of stopping. The n-th consecutive restart waits for
+    ``min(initial_backoff_s * backoff_factor ** n, max_backoff_s)`` seconds.
+
+    >>> policy = RestartPolicy(initial_backoff_s=0.5, max_backoff_s=3)
+    >>> [policy.backoff_s(n) for n in range(5)]
+    [0.5, 1.0, 2.0, 3, 3]
+    """
+
+    def __init__(
+        self,
+        *,
+        max_restarts: Optional[int] = None,
+        initial_backoff_s: float = 0.1,
+        backoff_factor: float = 2.0,
+        max_backoff_s: float = 30.0,
+        reset_after_s: float = 60.0,
+        exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    ):
+        """
+        :param max_restarts: number of consecutive restarts after which an exception stops
+            the StreamBuffer. None to always restart.
+        :param initial_backoff_s: seconds to wait before the first restart
+        :param backoff_factor: factor of the wait time of each consecutive restart
+        :param max_backoff_s: max seconds to wait before a restart
+        :param reset_after_s: seconds of reading without exception after which restarts are
+            not consecutive anymore, i.e. the wait time is initial_backoff_s again
+        :param exceptions: exception types triggering a restart, others stop the StreamBuffer
+        """
+        self.max_restarts = max_restarts
+        self.initial_backoff_s = initial_backoff_s
+        self.backoff_factor = backoff_factor
+        self.max_backoff_s = max_backoff_s
+        self.reset_after_s = reset_after_s
+        self.exceptions = exceptions
+
+    def backoff_s(self, n_consecutive_restarts: int) -> float:
+        """Seconds to wait before reopening a source that already restarted
+        n_consecutive_restarts times in a row"""
+        return min(
+            self.initial_backoff_s * self.backoff_factor ** n_consecutive_restarts,
+            self.max_backoff_s,
+        )
 
 
 class _SourceBuffer:
@@ -32,6 +92,9 @@ class _SourceBuffer:
         key=None,
         maxlen: int = 10000,
         buffer_reader_class: Type[BufferReader] = BufferReader,
+        lock_policy: LockPolicy = DFLT_LOCK_POLICY,
+        optimistic_reads: Optional[bool] = None,
+        aggregates: Optional[AggregatePyramid] = None,
     ):
         """StreamBuffer helper class
         Thread safe buffer for reading and writing data items
@@ -42,9 +105,30 @@ class _SourceBuffer:
         reader should get both source_name and source_info
         """
         self._stop_event = stop_event
-        self._buffer = RWLockSortedDeque([], key=key, maxlen=maxlen)
+        self._buffer = self._mk_buffer(
+            key=key,
+            maxlen=maxlen,
+            lock_policy=lock_policy,
+            optimistic_reads=optimistic_reads,
+        )
         self._source_reader_info = source_reader_info
         self.buffer_reader_class = buffer_reader_class
+        # block summaries of the items, modified with the buffer under its writer lock
+        self.aggregates = aggregates
+        # rolling stats kept up to date for as long as they are referred to elsewhere
+        self.rolling_stats = weakref.WeakSet()
+        # readers whose cursors drop_consumed waits for
+        self._readers = weakref.WeakSet()
+        self._readers_lock = threading.Lock()
+
+    def _mk_buffer(self, *, key, maxlen, lock_policy, optimistic_reads):
+        return RWLockSortedDeque(
+            [],
+            key=key,
+            maxlen=maxlen,
+            lock_policy=lock_policy,
+            optimistic_reads=optimistic_reads,
+        )
 
     def __len__(self):
         return len(self._buffer)
@@ -57,25 +141,247 @@ class _SourceBuffer:
     def source_reader_info(self):
         return self._source_reader_info
 
+    def _sync_aggregates(self, writer):
+        """Update the aggregates and rolling stats with the appends and drops of the
+        writer lock"""
+        if self.aggregates is not None:
+            self.aggregates.sync(writer)
+        for rolling_stats in self.rolling_stats:
+            rolling_stats.sync(writer)
+
+    def add_rolling_stats(self, rolling_stats: RollingStats):
+        """Keep rolling_stats up to date from now on, starting with the current items"""
+        with self._buffer.writer_lock() as writer:
+            rolling_stats.sync(writer)
+            self.rolling_stats.add(rolling_stats)
+
+    def remove_rolling_stats(self, rolling_stats: RollingStats):
+        """Stop updating rolling_stats"""
+        with self._buffer.writer_lock():
+            self.rolling_stats.discard(rolling_stats)
+
     def append(self, item):
         with self._buffer.writer_lock() as writer:
             writer.append(item)
+            self._sync_aggregates(writer)
+        self._buffer.notify_readers()
+
+    def extend(self, items):
+        with self._buffer.writer_lock() as writer:
+            writer.extend(items)
+            self._sync_aggregates(writer)
+        self._buffer.notify_readers()
+
+    def notify_readers(self):
+        """Wake up readers waiting for data, i.e. once the stop event is set"""
+        self._buffer.notify_readers()
 
     def drop(self, n=1):
         with self._buffer.writer_lock() as writer:
             writer.drop(n)
+            self._sync_aggregates(writer)
+
+    def drop_until(self, key):
+        with self._buffer.writer_lock() as writer:
+            n = writer.drop_until(key)
+            self._sync_aggregates(writer)
+            return n
+
+    def drop_consumed(self) -> int:
+        """Drop the items that every registered reader has read. A reader that has not
+        read anything yet holds back every item.
+
+        :return: number of items dropped
+        """
+        with self._readers_lock:
+            last_seqs = [reader._last_seq for reader in self._readers]
+        if not last_seqs or None in last_seqs:
+            return 0
+        with self._buffer.writer_lock() as writer:
+            n = min(min(last_seqs) + 1 - writer.head_seq, len(writer))
+            if n > 0:
+                writer.drop(n)
+                self._sync_aggregates(writer)
+            return max(n, 0)
 
     def mk_reader(self, **read_kwargs):
-        return self.buffer_reader_class(
+        reader = self.buffer_reader_class(
             buffer=self._buffer,
             source_reader_info=self._source_reader_info,
             stop_event=self._stop_event,
             **read_kwargs,
         )
+        self._register_reader(reader)
+        return reader
 
     def attach_reader(self, reader):
         reader._buffer = self._buffer
         reader._stop_event = self._stop_event
+        reader._sync_cursor()
+        self._register_reader(reader)
+
+    def detach_reader(self, reader):
+        with self._readers_lock:
+            self._readers.discard(reader)
+
+    def _register_reader(self, reader):
+        reader._aggregates = self.aggregates
+        with self._readers_lock:
+            self._readers.add(reader)
+
+
+class _DerivedSource:
+    """Source of a StreamBuffer made by StreamBuffer.derive: reads fn(item) of the items
+    of a parent StreamBuffer that pass filter, with a single reader of the parent.
+
+    If fn raises, the reader is moved back before the items it was applied to, so that
+    once reopened, i.e. by a restart_policy, the source derives them again."""
+
+    # read_batch waits for the items of the parent itself
+    sleep_time_on_read_none_s = 0
+
+    def __init__(self, parent: StreamBuffer, fn, filter, key):
+        self.parent = parent
+        self.fn = fn
+        self.filter = filter
+        self._key = key
+        self.on_exhausted = None  # called once the parent is stopped and fully read
+        self._reader = None
+
+    def key(self, data):
+        return self._key(data)
+
+    @property
+    def info(self) -> dict:
+        return dict(self.parent.source_reader_info or {})
+
+    def open(self):
+        if self._reader is None:
+            self._reader = self.parent.mk_reader()
+        else:  # reopened: carry on from the last item derived
+            self.parent.attach_reader(self._reader)
+
+    @staticmethod
+    def _cursor(reader):
+        return reader._last_item, reader._last_key, reader._last_seq
+
+    def read_batch(self, max_n=None):
+        reader = self._reader
+        cursor = self._cursor(reader)  # before the items read
+        items = reader.read_new(max_n)
+        if items == []:
+            reader.wait_for_new_data()
+            items = reader.read_new(max_n)
+        if items is None:  # the parent is stopped and fully read
+            if self.on_exhausted is not None:
+                self.on_exhausted()
+            return None
+        try:
+            if self.filter is not None:
+                items = [item for item in items if self.filter(item)]
+            if self.fn is not None:
+                items = [self.fn(item) for item in items]
+        except Exception:
+            reader._set_cursor(cursor)
+            raise
+        return items
+
+    def read(self):
+        items = self.read_batch(1)
+        return items[0] if items else None
+
+    def close(self):
+        if self._reader is not None:
+            self.parent.detach_reader(self._reader)
+
+
+def _apply(fn, items):
+    """Apply fn to a batch of items, in a worker of an executor"""
+    return [fn(item) for item in items]
+
+
+class _PoolDerivedSource(_DerivedSource):
+    """_DerivedSource applying fn to batches of items in the workers of an executor, at
+    most max_in_flight batches at a time, and reading the results in submission order"""
+
+    def __init__(
+        self, parent, fn, filter, key, executor, batch_size: int, max_in_flight: int
+    ):
+        super().__init__(parent, fn, filter, key)
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        # (future, number of items, cursor before its items) of the batches, in order
+        self._in_flight = deque()
+        self._n_in_flight = 0  # number of items of the batches in flight
+        self._results = deque()  # results of the finished batches, not returned yet
+        self._exhausted = False  # True once the parent is stopped and fully read
+
+    def _submit_available(self, max_n=None):
+        """Submit batches of the items available in the parent while there is room, and
+        while there would be less than max_n results pending"""
+        while len(self._in_flight) < self.max_in_flight:
+            n = self.batch_size
+            if max_n is not None:
+                n = min(n, max_n - len(self._results) - self._n_in_flight)
+                if n <= 0:
+                    return
+            cursor = self._cursor(self._reader)
+            items = self._reader.read_new(n)
+            if not items:
+                self._exhausted = items is None
+                return
+            if self.filter is not None:
+                try:
+                    items = [item for item in items if self.filter(item)]
+                except Exception:
+                    self._reader._set_cursor(cursor)
+                    raise
+            if items:
+                future = self.executor.submit(_apply, self.fn, items)
+                self._in_flight.append((future, len(items), cursor))
+                self._n_in_flight += len(items)
+
+    def _collect_done(self):
+        """Move the results of the first finished batches to _results, in order"""
+        while self._in_flight and self._in_flight[0][0].done():
+            future, n, _ = self._in_flight[0]
+            results = future.result()  # a failed batch stays in flight, see close
+            self._in_flight.popleft()
+            self._n_in_flight -= n
+            self._results.extend(results)
+
+    def read_batch(self, max_n=None):
+        reader = self._reader
+        self._submit_available(max_n)
+        if not self._in_flight and not self._results:
+            if self._exhausted:
+                if self.on_exhausted is not None:
+                    self.on_exhausted()
+                return None
+            reader.wait_for_new_data()
+            self._submit_available(max_n)
+            if not self._in_flight:
+                return None
+        if not self._results:
+            # results are only read in order: later batches wait for the first one
+            concurrent.futures.wait(
+                [self._in_flight[0][0]], timeout=reader._sleep_time_on_iter_none_s
+            )
+        self._collect_done()
+        n = len(self._results) if max_n is None else min(max_n, len(self._results))
+        return [self._results.popleft() for _ in range(n)]
+
+    def close(self):
+        if self._in_flight:
+            # derive the items of the batches in flight again once reopened. The results
+            # before them are kept, to be read first.
+            self._reader._set_cursor(self._in_flight[0][2])
+        for future, _, _ in self._in_flight:
+            future.cancel()
+        self._in_flight.clear()
+        self._n_in_flight = 0
+        super().close()
 
 
 class StreamBuffer:
@@ -114,6 +420,8 @@ class StreamBuffer:
     {'start': 0, 'stop': 100, 'open_count': 2}
     """
 
+    _supports_rolling_stats = True
+
     def __init__(
         self,
         source_reader: Source,
@@ -121,10 +429,15 @@ class StreamBuffer:
         maxlen: int = 100,
         sleep_time_on_read_none_s: Optional[Union[int, float]] = None,
         auto_drop=True,
+        drop_consumed=False,
+        lock_policy: LockPolicy = DFLT_LOCK_POLICY,
+        optimistic_reads: Optional[bool] = None,
+        scheduler: Optional[StreamScheduler] = None,
+        restart_policy: Union[RestartPolicy, bool, None] = None,
+        aggregate: Optional[Callable[[Any], float]] = None,
+        aggregate_block_sizes: Sequence[int] = DFLT_BLOCK_SIZES,
     ):
         """
-        TODO: option to auto restart source on read exception
-
         :param source_reader: instance of a SourceReader subclass
         :param maxlen: max number of read data points to store in buffer before data starts dropping
             off the queue
@@ -132,6 +445,32 @@ class StreamBuffer:
             None to use defaults.
         :param auto_drop: False to stop reading when buffer is full and use StreamBuffer.drop() to
             manually make space.
+        :param drop_consumed: with auto_drop False, True to make space automatically when
+            the buffer is full, by dropping the items every reader made by mk_reader, or
+            attached, has read. Reading pauses while the slowest reader would lose data,
+            so no reader misses an item. Delete or detach_reader readers that stop reading.
+        :param lock_policy: how the buffer is locked: 'writer_priority' (default),
+            'reader_priority', 'mutex', 'optimistic', or a factory of RWLock-like
+            objects. See stream2py.utility.lock_policies and the benchmark of
+            stream2py.examples.lock_policy_benchmark to choose.
+        :param optimistic_reads: True to have BufferReaders read without taking the
+            reader lock, retrying if the writer modified the buffer meanwhile. Cheaper
+            when many readers poll a buffer that has a single writer, the read thread.
+            None to use the default of lock_policy.
+        :param scheduler: a StreamScheduler polling source_reader on its pool of worker
+            threads, instead of a thread dedicated to this StreamBuffer. Suits many
+            low-rate sources whose read does not block.
+        :param restart_policy: a RestartPolicy to close and reopen source_reader when it
+            raises an exception, True for the default RestartPolicy(), or None to stop.
+            The number of restarts is counted by the 'restart_count' of
+            source_reader_info. Keys read after a restart must still be increasing.
+        :param aggregate: function returning a number of a data item, i.e. a level or a
+            temperature, to keep summaries (count, sum, min, max) of the numbers of
+            blocks of aggregate_block_sizes items, updated as items are appended and
+            dropped. BufferReader.summary then answers queries over long key ranges
+            from a few block summaries, without reading every item.
+        :param aggregate_block_sizes: increasing numbers of items of the blocks of each
+            level of summaries, each a multiple of the previous one
         """
         assert isinstance(
             source_reader, Source
@@ -139,6 +478,17 @@ class StreamBuffer:
         self.source_reader = source_reader
         self._maxlen = maxlen
         self.auto_drop = auto_drop
+        if drop_consumed and auto_drop:
+            raise ConfigurationError('drop_consumed requires auto_drop=False')
+        self.drop_consumed = drop_consumed
+        self.lock_policy = lock_policy
+        self.optimistic_reads = optimistic_reads
+        self.scheduler = scheduler
+        if restart_policy is True:
+            restart_policy = RestartPolicy()
+        self.restart_policy = restart_policy or None
+        self.aggregate = aggregate
+        self.aggregate_block_sizes = aggregate_block_sizes
         if isinstance(sleep_time_on_read_none_s, (int, float)):
             self._sleep_time_on_read_none_s = sleep_time_on_read_none_s
         elif isinstance(source_reader.sleep_time_on_read_none_s, (int, float)):
@@ -152,6 +502,10 @@ class StreamBuffer:
         self.start_lock = threading.Lock()
         self._next_reader = None
         self._read_to_buffer_thread = None
+        self._scheduled = None
+        self._source_is_open = False
+        self._n_consecutive_restarts = 0
+        self._last_open_time = None
 
     def __iter__(self):
         reader = self.mk_reader()
@@ -174,6 +528,16 @@ class StreamBuffer:
             )
         self.source_buffer.drop(n)
 
+    def drop_until(self, key) -> int:
+        """Drop items with a key lower than key from buffer, i.e. key-based retention such
+        as keeping the last 30 seconds of timestamped items.
+        Unlike drop, it can be used whatever the value of auto_drop.
+
+        :param key: key of the first item to keep
+        :return: number of items dropped
+        """
+        return self.source_buffer.drop_until(key)
+
     def start(self):
         """Open and start reading from source_reader into buffer"""
         with self.start_lock:
@@ -181,12 +545,31 @@ class StreamBuffer:
                 self.stop()
             self._set_read_to_buffer_thread_and_source_buffer()
             self._open()
-            self._read_to_buffer_thread.start()
+            if self.scheduler is None:
+                self._read_to_buffer_thread.start()
+            else:
+                self._scheduled = self.scheduler.register(self)
 
-    def stop(self):
-        """Stop reading and close source_reader"""
-        self._stop_event.set()
-        time.sleep(1)
+    def stop(self, timeout: Optional[float] = DFLT_STOP_TIMEOUT_S):
+        """Stop reading and close source_reader.
+        Returns as soon as source_reader is closed, or after timeout seconds if reading
+        does not stop before, i.e. when source_reader.read blocks.
+
+        :param timeout: max seconds to wait for source_reader to close, None for no limit
+        """
+        if self._stop_event is None:
+            return
+        self._set_stop_event()
+        if self._scheduled is not None:
+            # have the scheduler close the source now, rather than at its next poll
+            self.scheduler.notify(self)
+            self._scheduled.done.wait(timeout)
+        elif (
+            self._read_to_buffer_thread is not None
+            and self._read_to_buffer_thread.is_alive()
+            and self._read_to_buffer_thread is not threading.current_thread()
+        ):
+            self._read_to_buffer_thread.join(timeout)
         self._next_reader = None
 
     def mk_reader(self, **read_kwargs) -> BufferReader:
@@ -217,6 +600,124 @@ class StreamBuffer:
                 )
             return self.source_buffer.attach_reader(reader)
 
+    def rolling_stats(self, value, window: Optional[int] = None) -> RollingStats:
+        """Make RollingStats of the values of the last items of the currently running
+        StreamBuffer, updated on every append and drop, so that checking a threshold
+        costs the same whatever the size of the window. They are updated until
+        detach_rolling_stats is called, or nothing refers to them anymore.
+
+        >>> from stream2py.tests.utils_for_testing import SimpleSourceReader
+        >>> with StreamBuffer(SimpleSourceReader(range(100)), maxlen=10) as buffer:
+        ...     rolling = buffer.rolling_stats(lambda item: item[1] % 10, window=5)
+        ...     reader = buffer.mk_reader()
+        ...     while reader.read(blocking=True)[0] < 99:
+        ...         pass
+        ...     rolling.stats()
+        Stats(count=5, sum=35, mean=7.0, var=2.0, min=5, max=9)
+
+        :param value: function returning the number of a data item
+        :param window: number of last items, None for all the items of the buffer
+        :return: RollingStats, whose stats method returns the current Stats
+        :raises ConfigurationError: if this kind of StreamBuffer has no rolling stats
+        :raises StreamNotStartedError: if the StreamBuffer hasn't been started yet
+        """
+        if not self._supports_rolling_stats:
+            raise ConfigurationError(
+                f'{type(self).__name__} does not support rolling stats'
+            )
+        with self.start_lock:
+            if not isinstance(self.source_buffer, _SourceBuffer):
+                raise StreamNotStartedError(
+                    'StreamBuffer must be started before making rolling stats. '
+                    'Call StreamBuffer.start() or use "with StreamBuffer(...) as buffer:"'
+                )
+            rolling_stats = RollingStats(value, window, lock=self.source_buffer._buffer)
+            self.source_buffer.add_rolling_stats(rolling_stats)
+            return rolling_stats
+
+    def derive(
+        self,
+        fn: Optional[Callable[[Any], Any]],
+        *,
+        filter: Optional[Callable[[Any], bool]] = None,
+        key: Optional[Callable[[Any], Any]] = None,
+        maxlen: Optional[int] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+        batch_size: int = DFLT_DERIVE_BATCH_SIZE,
+        max_in_flight: int = DFLT_DERIVE_MAX_IN_FLIGHT,
+        **kwargs,
+    ) -> StreamBuffer:
+        """Make a started StreamBuffer of fn(item) for the items of this running
+        StreamBuffer that pass filter. A single worker reads this buffer and applies fn
+        once per item, so any number of readers of the derived buffer share the work,
+        i.e. of decoding items. The derived buffer stops once this one is stopped and
+        its items are all derived.
+
+        >>> from stream2py.examples.source_reader import SimpleCounterString
+        >>> with StreamBuffer(SimpleCounterString(0, 10)) as buffer:
+        ...     evens = buffer.derive(str.upper, filter=lambda s: int(s[1:]) % 2 == 0)
+        ...     readers = [evens.mk_reader() for _ in range(3)]
+        ...     [reader.read(blocking=True) for reader in readers]
+        ...     reader = readers[0]
+        ...     [reader.read(blocking=True) for _ in range(4)]
+        ['S0', 'S0', 'S0']
+        ['S2', 'S4', 'S6', 'S8']
+
+        :param fn: function of an item returning the item of the derived buffer, None to
+            only filter items
+        :param filter: function of an item returning False for items to leave out
+        :param key: key function of the derived items, the key of the source_reader of
+            this StreamBuffer by default, for fn that keep the key of items unchanged
+        :param maxlen: maxlen of the derived buffer, the one of this buffer by default
+        :param executor: a concurrent.futures thread or process pool to apply fn to
+            batches of items in parallel, for CPU heavy fn like decompression or
+            inference. Derived items are still buffered in the order of the keys. With
+            a process pool, fn and items must be picklable. The executor is not shut
+            down with the derived buffer.
+        :param batch_size: max number of items per task submitted to executor
+        :param max_in_flight: max number of batches submitted to executor and not read
+            yet, which bounds the memory used by results waiting for an earlier batch.
+            Twice the number of CPUs by default: keep it above the number of workers of
+            executor for all of them to be busy.
+        :param kwargs: other keyword arguments of the derived StreamBuffer
+        :return: the derived StreamBuffer, started
+        :raises StreamNotStartedError: if the StreamBuffer hasn't been started yet
+        """
+        with self.start_lock:
+            if not isinstance(self.source_buffer, _SourceBuffer):
+                raise StreamNotStartedError(
+                    'StreamBuffer must be started before deriving buffers. '
+                    'Call StreamBuffer.start() or use "with StreamBuffer(...) as buffer:"'
+                )
+            key = key or self.source_reader.key
+        if executor is None:
+            source = _DerivedSource(self, fn, filter, key)
+        else:
+            if fn is None:
+                raise ValueError('derive needs a fn to apply with an executor')
+            if max_in_flight < 1:
+                raise ValueError(f'max_in_flight must be positive: {max_in_flight}')
+            source = _PoolDerivedSource(
+                self, fn, filter, key, executor, batch_size, max_in_flight
+            )
+        derived = StreamBuffer(
+            source, maxlen=maxlen if maxlen is not None else self._maxlen, **kwargs
+        )
+        source.on_exhausted = derived._set_stop_event
+        derived.start()
+        return derived
+
+    def detach_reader(self, reader):
+        """Stop holding data back for a reader that will not read anymore, when
+        drop_consumed is True"""
+        if isinstance(self.source_buffer, _SourceBuffer):
+            self.source_buffer.detach_reader(reader)
+
+    def detach_rolling_stats(self, rolling_stats: RollingStats):
+        """Stop updating rolling_stats made by rolling_stats"""
+        if isinstance(self.source_buffer, _SourceBuffer):
+            self.source_buffer.remove_rolling_stats(rolling_stats)
+
     @property
     def source_reader_info(self) -> Optional[dict]:
         """A dict with important source info set by SourceReader.
@@ -238,6 +739,8 @@ class StreamBuffer:
 
     @property
     def join(self):
+        if self._scheduled is not None:
+            return self._scheduled.done.wait
         return self._read_to_buffer_thread.join
 
     def __enter__(self):
@@ -252,31 +755,125 @@ class StreamBuffer:
     def _run(self):
         try:
             while not self._stop_event.is_set():
-                # check if buffer is full and skip read or append
-                if self.auto_drop is True or len(self.source_buffer) < self._maxlen:
-                    data = self.source_reader.read()
-                else:
-                    data = None
-
-                if data is not None:
-                    self.source_buffer.append(data)
-                else:
-                    time.sleep(self._sleep_time_on_read_none_s)
+                try:
+                    if not self._read_step():
+                        self._stop_event.wait(self._sleep_time_on_read_none_s)
+                except Exception as e:
+                    self._restart_after(e)
         finally:
-            if not self._stop_event.is_set():
-                self._stop_event.set()
+            self._close_source()
+
+    def _restart_after(self, error: Exception):
+        """Close source_reader and reopen it after the backoff time of restart_policy,
+        or raise error if it should stop reading"""
+        while True:
+            delay = self._restart_delay_s(error)
+            if delay is None:
+                raise error
+            self._close_source_reader()
+            if self._stop_event.wait(delay):
+                return
+            try:
+                self._reopen_source()
+                return
+            except Exception as e:
+                error = e
+
+    def _restart_delay_s(self, error: Exception) -> Optional[float]:
+        """Seconds to wait before reopening source_reader after error, None if
+        restart_policy says to stop reading"""
+        policy = self.restart_policy
+        if policy is None or not isinstance(error, policy.exceptions):
+            return None
+        if time.monotonic() - self._last_open_time >= policy.reset_after_s:
+            self._n_consecutive_restarts = 0
+        n = self._n_consecutive_restarts
+        if policy.max_restarts is not None and n >= policy.max_restarts:
+            return None
+        self._n_consecutive_restarts += 1
+        delay = policy.backoff_s(n)
+        logger.warning(f'Restarting source in {delay}s after: {error!r}')
+        return delay
+
+    def _reopen_source(self):
+        self.source_reader.open()
+        self._count_restart()
+
+    def _count_restart(self):
+        """Once source_reader is reopened, refresh source_reader_info and count the restart"""
+        self._source_is_open = True
+        self._last_open_time = time.monotonic()
+        info = self.source_buffer.source_reader_info
+        info.update(self.source_reader.info)
+        info['restart_count'] = info.get('restart_count', 0) + 1
+
+    def _read_step(self) -> bool:
+        """Read from source_reader into buffer once
+
+        :return: True if data was buffered, False if there was none to read or the buffer
+            is full
+        """
+        self._make_room()
+        # sources implementing the optional BatchSource.read_batch are read in batches
+        read_batch = getattr(self.source_reader, 'read_batch', None)
+        if read_batch is not None:
+            max_n = self._read_batch_max_n()
+            batch = read_batch(max_n) if max_n != 0 else None
+            if batch:
+                self.source_buffer.extend(batch)
+                return True
+            return False
+        # check if buffer is full and skip read or append
+        if self.auto_drop is True or len(self.source_buffer) < self._maxlen:
+            data = self.source_reader.read()
+        else:
+            data = None
+        if data is not None:
+            self.source_buffer.append(data)
+            return True
+        return False
+
+    def _make_room(self):
+        """With drop_consumed, drop what all readers have read once the buffer is full"""
+        if self.drop_consumed and len(self.source_buffer) >= self._maxlen:
+            self.source_buffer.drop_consumed()
+
+    def _close_source(self):
+        """Last thing called once reading stops, whatever the reason"""
+        if not self._stop_event.is_set():
+            self._set_stop_event()
+        self._close_source_reader()
+
+    def _close_source_reader(self):
+        if self._source_is_open:
+            self._source_is_open = False
             try:
                 self.source_reader.close()
             except Exception as e:
                 logger.error(e)
 
+    def _set_stop_event(self):
+        """Set the stop event and wake up readers blocked waiting for data"""
+        self._stop_event.set()
+        if self.source_buffer is not None:
+            self.source_buffer.notify_readers()
+
+    def _read_batch_max_n(self) -> Optional[int]:
+        """Number of items a batch read can bring without losing data: the buffer maxlen,
+        or what is left of it when auto_drop is False"""
+        if self.auto_drop is True:
+            return self._maxlen
+        return max(self._maxlen - len(self.source_buffer), 0)
+
     def _set_read_to_buffer_thread_and_source_buffer(self):
         """Initialize source and buffer
         Makes a new run thread, and stop event that is unique to this run session"""
         if self._stop_event and not self._stop_event.is_set():
             self.stop()
         self.source_buffer = None
-        self._read_to_buffer_thread = threading.Thread(target=self._run, daemon=True)
+        self._scheduled = None
+        if self.scheduler is None:
+            self._read_to_buffer_thread = threading.Thread(target=self._run, daemon=True)
         self._stop_event = threading.Event()
 
     def _open(self):
@@ -284,6 +881,18 @@ class StreamBuffer:
         Calls source_reader.open() and then sets up source_buffer with latest
         source_reader.info"""
         self.source_reader.open()
+        self._source_is_open = True
+        self._n_consecutive_restarts = 0
+        self._last_open_time = time.monotonic()
+        self._set_source_buffer()
+
+    def _mk_aggregates(self) -> Optional[AggregatePyramid]:
+        if self.aggregate is None:
+            return None
+        return AggregatePyramid(self.aggregate, self.aggregate_block_sizes)
+
+    def _set_source_buffer(self):
+        """Set up source_buffer with latest source_reader.info, once source is open"""
         self.source_buffer = _SourceBuffer(
             source_reader_info=self.source_reader.info,
             stop_event=self._stop_event,
@@ -292,7 +901,12 @@ class StreamBuffer:
             buffer_reader_class=getattr(
                 self.source_reader, 'buffer_reader_class', BufferReader
             ),
+            lock_policy=self.lock_policy,
+            optimistic_reads=self.optimistic_reads,
+            aggregates=self._mk_aggregates(),
         )
+        if self.restart_policy is not None:
+            self.source_buffer.source_reader_info['restart_count'] = 0
 
     # def _mk_contextualized_iterator(self):
     #     """Return next item (entering the context beforehand, if not running).
@@ -0,0 +1,252 @@
+"""
+A StreamScheduler reads the sources of many StreamBuffers with a bounded pool of worker threads,
+instead of one thread per StreamBuffer sleeping between reads that return None.
+
+A source is polled again right away while it has data, and otherwise after the
+sleep_time_on_read_none_s of its StreamBuffer, so tens of thousands of low-rate sources such as
+IoT devices or polled HTTP endpoints can share a few threads. Sources that know when they have
+data can make the scheduler poll them early with StreamScheduler.notify.
+StreamBuffers and BufferReaders are used exactly as without a scheduler.
+"""
+from __future__ import annotations
+
+__all__ = ['StreamScheduler']
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DFLT_N_WORKERS = 4
+DFLT_MAX_READS_PER_POLL = 100
+
+
+class _Scheduled:
+    """Scheduling state of one run session of a StreamBuffer"""
+
+    __slots__ = (
+        'stream_buffer',
+        'stop_event',
+        'due',
+        'running',
+        'notified',
+        'reopen',
+        'done',
+    )
+
+    def __init__(self, stream_buffer):
+        self.stream_buffer = stream_buffer
+        self.stop_event = stream_buffer._stop_event
+        self.due = None  # monotonic time of the next poll, None if not in the heap
+        self.running = False  # being polled by a worker
+        self.notified = False  # notified while being polled
+        self.reopen = False  # source closed by the restart policy, to reopen when due
+        self.done = threading.Event()  # set once the source is closed
+
+
+class StreamScheduler:
+    """Polls the sources of registered StreamBuffers with a pool of n_workers threads.
+
+    >>> from stream2py import StreamBuffer
+    >>> from stream2py.examples.source_reader import SimpleCounterString
+    >>>
+    >>> with StreamScheduler(n_workers=2) as scheduler:
+    ...     buffers = [
+    ...         StreamBuffer(SimpleCounterString(0, 10), maxlen=10, scheduler=scheduler)
+    ...         for _ in range(20)
+    ...     ]
+    ...     for buffer in buffers:
+    ...         buffer.start()
+    ...     readers = [buffer.mk_reader() for buffer in buffers]
+    ...     print({reader.read(blocking=True) for reader in readers})
+    ...     for buffer in buffers:
+    ...         buffer.stop()
+    {'s0'}
+    """
+
+    def __init__(
+        self,
+        n_workers: int = DFLT_N_WORKERS,
+        *,
+        max_reads_per_poll: int = DFLT_MAX_READS_PER_POLL,
+    ):
+        """
+        :param n_workers: number of worker threads reading the sources
+        :param max_reads_per_poll: number of consecutive reads of a source with data before
+            its worker moves on to the next due source, so a busy source cannot starve
+            the others
+        """
+        self.n_workers = n_workers
+        self.max_reads_per_poll = max_reads_per_poll
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()  # heap tie breaker
+        self._entries = set()
+        self._workers = []
+        self._stopping = False
+
+    def register(self, stream_buffer) -> _Scheduled:
+        """Start polling the open source of a StreamBuffer. Called by StreamBuffer.start.
+
+        :return: the scheduling state of this run session of stream_buffer
+        """
+        entry = _Scheduled(stream_buffer)
+        with self._cond:
+            if not self._workers:
+                self._start_workers()
+            self._entries.add(entry)
+            self._push(entry, time.monotonic())
+        return entry
+
+    def notify(self, stream_buffer):
+        """Poll the source of stream_buffer as soon as a worker is free, i.e. when it is
+        known to have data, or to close it once stream_buffer is stopped"""
+        entry = stream_buffer._scheduled
+        if entry is None:
+            return
+        with self._cond:
+            if entry.reopen and not entry.stop_event.is_set():
+                return  # waiting for the backoff of the restart policy
+            if entry.running:
+                entry.notified = True
+            elif entry in self._entries:
+                self._push(entry, time.monotonic())
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Start the worker threads, which are otherwise started on first register"""
+        with self._cond:
+            if not self._workers:
+                self._start_workers()
+
+    def stop(self):
+        """Stop the worker threads and close the sources that are still registered"""
+        with self._cond:
+            self._stopping = True
+            workers, self._workers = self._workers, []
+            self._cond.notify_all()
+        for worker in workers:
+            worker.join()
+        with self._cond:
+            entries, self._entries = self._entries, set()
+            self._heap.clear()
+            self._stopping = False
+        for entry in entries:
+            self._close(entry)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _start_workers(self):
+        self._workers = [
+            threading.Thread(target=self._work, name=f'StreamScheduler-{i}', daemon=True)
+            for i in range(self.n_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _push(self, entry, due):
+        if entry.due is not None and entry.due <= due:
+            return  # already due earlier
+        entry.due = due
+        heapq.heappush(self._heap, (due, next(self._counter), entry))
+        self._cond.notify()
+
+    def _next_due(self) -> Optional[_Scheduled]:
+        """Wait for the next due entry. Called with self._cond acquired.
+
+        :return: the entry, or None if the scheduler is stopping
+        """
+        while not self._stopping:
+            if not self._heap:
+                self._cond.wait()
+                continue
+            due, _, entry = self._heap[0]
+            if due != entry.due:  # stale, the entry was rescheduled earlier
+                heapq.heappop(self._heap)
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            entry.due = None
+            entry.running = True
+            return entry
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                entry = self._next_due()
+            if entry is None:
+                return
+            self._poll(entry)
+
+    def _poll(self, entry):
+        stream_buffer = entry.stream_buffer
+        has_data = False
+        delay = None  # seconds before reopening the source, if it is restarting
+        try:
+            if entry.reopen and not entry.stop_event.is_set():
+                entry.reopen = False
+                stream_buffer._reopen_source()
+            for _ in range(self.max_reads_per_poll):
+                if entry.stop_event.is_set():
+                    break
+                has_data = stream_buffer._read_step()
+                if not has_data:
+                    break
+        except Exception as e:
+            delay = stream_buffer._restart_delay_s(e)
+            if delay is None:
+                logger.error(e)
+                stream_buffer._set_stop_event()
+            else:
+                # the backoff is waited in the heap rather than in the worker
+                stream_buffer._close_source_reader()
+                entry.reopen = True
+        with self._cond:
+            entry.running = False
+            if entry.stop_event.is_set():
+                if entry not in self._entries:
+                    return  # being closed by stop()
+                self._entries.discard(entry)
+            else:
+                if delay is not None:
+                    due = time.monotonic() + delay
+                elif has_data or entry.notified:
+                    due = time.monotonic()
+                else:
+                    due = time.monotonic() + stream_buffer._sleep_time_on_read_none_s
+                entry.notified = False
+                self._push(entry, due)
+                return
+        self._close(entry)
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry.stream_buffer._close_source()
+        finally:
+            entry.done.set()
+
+    def stream_buffer(self, source_reader, **kwargs):
+        """Make a StreamBuffer whose source_reader is polled by this scheduler
+
+        :param kwargs: keyword arguments of StreamBuffer
+        """
+        from stream2py.stream_buffer import StreamBuffer
+
+        return StreamBuffer(source_reader, scheduler=self, **kwargs)
@@ -41,6 +41,9 @@ class StreamSource(Source, metaclass=ABCMeta):
     The close method will be called when all open readers have been closed().
     This will also stop the StreamBuffer. A closed source can be reopened by opening another reader.
 
+    As with SourceReader, the optional ``read_batch(max_n)`` method of the ``BatchSource``
+    protocol can be defined to feed the StreamBuffer many items per call.
+
     >>> from stream2py.examples.stream_source import SimpleCounterString
     >>> source = SimpleCounterString(start=0, stop=10)
     >>> with source.open_reader() as reader:
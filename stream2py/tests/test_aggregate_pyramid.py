@@ -0,0 +1,93 @@
+"""Tests of AggregatePyramid summaries against summaries of the raw items"""
+import random
+
+import pytest
+
+from stream2py.utility.aggregate_pyramid import AggregatePyramid, summarize
+from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+
+
+def raw_summary(sd, start, stop, value):
+    items = [item for item in sd if start <= sd.key(item) <= stop]
+    return summarize([sd.key(item) for item in items], [value(item) for item in items])
+
+
+def test_summaries_match_raw_items_while_appending_and_evicting():
+    rnd = random.Random(7)
+    sd = CircularSortedDeque(key=lambda x: x[0], maxlen=300)
+    value = lambda x: x[1]
+    pyramid = AggregatePyramid(value, block_sizes=(4, 16, 64))
+    key = 0
+    for step in range(200):
+        n = rnd.randint(1, 40)
+        sd.extend((key + 2 * i, rnd.randint(-100, 100)) for i in range(n))
+        key += 2 * n
+        if step % 7 == 0:
+            sd.drop(rnd.randint(0, 20))
+        if step % 11 == 0:
+            sd.drop_until(sd.key(sd[0]) + rnd.randint(0, 30))
+        pyramid.sync(sd)
+        first_key, last_key = sd.key(sd[0]), sd.key(sd[-1])
+        for _ in range(3):
+            start = rnd.randint(first_key - 10, last_key)
+            stop = rnd.randint(start, last_key + 10)
+            assert pyramid.summary(sd, start, stop) == raw_summary(
+                sd, start, stop, value
+            )
+        blocks = pyramid.summary(sd, first_key, last_key, resolution=16)
+        assert sum(s.count for s in blocks) == len(sd)
+        assert blocks[0].start_key == first_key and blocks[-1].stop_key == last_key
+        assert all(s.count <= 16 for s in blocks)
+
+
+def test_summaries_of_a_stream_buffer():
+    from stream2py import StreamBuffer
+    from stream2py.exceptions import ConfigurationError
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    source = SimpleSourceReader([i % 10 for i in range(5000)])
+    with StreamBuffer(source, maxlen=3000, aggregate=lambda x: x[1]) as buffer:
+        reader = buffer.mk_reader()
+        while reader.read(blocking=True)[0] < 4999:
+            pass
+        s = reader.summary(0, 5000)  # the first 2000 items were evicted
+        assert (s.start_key, s.stop_key, s.count, s.min, s.max) == (2000, 4999, 3000, 0, 9)
+        assert s.mean == 4.5
+        assert len(reader.summary(0, 5000, resolution=64)) == 48
+        with pytest.raises(ValueError):
+            reader.summary(0, 5000, resolution=10)
+    with StreamBuffer(SimpleSourceReader(range(3))) as buffer:
+        with pytest.raises(ConfigurationError):
+            buffer.mk_reader().summary(0, 2)
+
+
+def test_summaries_after_items_dropped_before_they_were_synced():
+    sd = CircularSortedDeque(maxlen=10)
+    pyramid = AggregatePyramid(float, block_sizes=(4,))
+    sd.extend(range(6))
+    pyramid.sync(sd)
+    sd.extend(range(6, 31))  # items 6 to 20 are dropped before being synced
+    pyramid.sync(sd)
+    assert pyramid.summary(sd, 20, 27) == raw_summary(sd, 20, 27, float)
+    assert [s.count for s in pyramid.summary(sd, 0, 30, resolution=4)] == [3, 4, 3]
+
+
+def test_summaries_of_a_stream_buffer_read_in_batches_larger_than_maxlen():
+    from stream2py import StreamBuffer
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    class BigBatchSource(SimpleSourceReader):
+        def read_batch(self, max_n=None):
+            batch = [self.read() for _ in range(25)]  # ignores max_n
+            return [item for item in batch if item is not None]
+
+    source = BigBatchSource(range(100))
+    with StreamBuffer(
+        source, maxlen=10, aggregate=lambda x: x[1], aggregate_block_sizes=(4,)
+    ) as buffer:
+        reader = buffer.mk_reader()
+        while reader.read(blocking=True)[0] < 99:
+            pass
+        s = reader.summary(0, 100)
+        assert (s.start_key, s.stop_key, s.count) == (90, 99, 10)
+        assert s.sum == sum(range(90, 100))
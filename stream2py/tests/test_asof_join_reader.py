@@ -0,0 +1,77 @@
+"""Tests for AsOfJoinReader"""
+import pytest
+
+from stream2py import AsOfJoinReader, StreamBuffer
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+
+class PeriodicSource(SimpleSourceReader):
+    """Reads n_items items keyed every period_us microseconds from offset_us"""
+
+    def __init__(self, n_items, period_us, offset_us=0):
+        super().__init__(range(n_items))
+        self.period_us = period_us
+        self.offset_us = offset_us
+
+    def key(self, data):
+        return self.offset_us + data[0] * self.period_us
+
+
+def expected_match(a_key, b_keys, direction, tolerance_us):
+    before = [k for k in b_keys if k <= a_key]
+    after = [k for k in b_keys if k >= a_key]
+    candidates = {
+        'backward': before[-1:],
+        'forward': after[:1],
+        'nearest': before[-1:] + after[:1],
+    }[direction]
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda k: abs(a_key - k))  # the earlier one on ties
+    if tolerance_us is not None and abs(a_key - best) > tolerance_us:
+        return None
+    return best
+
+
+@pytest.mark.parametrize('direction', ['backward', 'forward', 'nearest'])
+@pytest.mark.parametrize('tolerance', [None, 0.03])
+def test_join_of_a_1khz_and_a_10hz_stream(direction, tolerance):
+    fast = PeriodicSource(2000, period_us=1000, offset_us=50_000)  # 1 kHz
+    slow = PeriodicSource(20, period_us=100_000, offset_us=3000)  # 10 Hz
+    with StreamBuffer(fast, maxlen=2000) as a, StreamBuffer(slow, maxlen=20) as b:
+        joined = AsOfJoinReader(
+            a.mk_reader(), b.mk_reader(), direction=direction, tolerance=tolerance
+        )
+        for buffer, n_items in ((a, 2000), (b, 20)):
+            probe = buffer.mk_reader()
+            [probe.read(blocking=True) for _ in range(n_items)]
+    pairs = list(joined)
+    assert joined.is_stopped
+
+    b_keys = [slow.key((i, None)) for i in range(20)]
+    tolerance_us = None if tolerance is None else 30_000
+    assert [fast.key(a) for a, _ in pairs] == [fast.key((i, None)) for i in range(2000)]
+    assert [None if b is None else slow.key(b) for _, b in pairs] == [
+        expected_match(fast.key(a), b_keys, direction, tolerance_us) for a, _ in pairs
+    ]
+
+
+def test_pairs_wait_for_the_right_stream_to_pass_the_left_key():
+    fast = PeriodicSource(10, period_us=10)
+    slow = PeriodicSource(1, period_us=100)
+    with StreamBuffer(fast) as a, StreamBuffer(slow) as b:
+        joined = AsOfJoinReader(a.mk_reader(), b.mk_reader())
+        probe = a.mk_reader()
+        [probe.read(blocking=True) for _ in range(10)]
+        assert joined.read(blocking=True) == ((0, 0), (0, 0))  # an exact match
+        # the right stream could still read items up to the keys of the left ones
+        assert joined.read_available() == []
+    pairs = list(joined)  # the right stream is stopped: its last item is the match
+    assert [a[0] for a, _ in pairs] == list(range(1, 10))
+    assert all(b == (0, 0) for _, b in pairs)
+
+
+def test_unknown_direction():
+    with StreamBuffer(SimpleSourceReader([])) as buffer:
+        with pytest.raises(ValueError):
+            AsOfJoinReader(buffer.mk_reader(), buffer.mk_reader(), direction='closest')
@@ -0,0 +1,137 @@
+"""Tests for AsyncStreamBuffers sharing an AsyncSourceDriver"""
+import asyncio
+import logging
+import threading
+import time
+
+from stream2py import AsyncSourceDriver, AsyncSourceReader, AsyncStreamBuffer
+
+
+class AsyncRangeSource(AsyncSourceReader):
+    """Reads range(n), waiting delay_s before each item"""
+
+    def __init__(self, n, delay_s=0.001):
+        self.n = n
+        self.delay_s = delay_s
+        self.open_count = 0
+        self._count = None
+
+    async def open(self):
+        self.open_count += 1
+        self._count = 0
+        self._closed = False
+
+    async def read(self):
+        await asyncio.sleep(self.delay_s)
+        if self._count < self.n:
+            self._count += 1
+            return self._count - 1
+
+    async def close(self):
+        self._closed = True
+
+    @property
+    def info(self):
+        return dict(n=self.n, open_count=self.open_count)
+
+    def key(self, data):
+        return data
+
+
+class AsyncRangeBatchSource(AsyncRangeSource):
+    async def read_batch(self, max_n=None):
+        await asyncio.sleep(self.delay_s)
+        start, self._count = self._count, min(self._count + 5, self.n)
+        return list(range(start, self._count))
+
+
+def test_many_sources_share_one_thread():
+    n_sources = 100
+    n_threads = threading.active_count()
+    with AsyncSourceDriver() as driver:
+        sources = [AsyncRangeSource(20) for _ in range(n_sources)]
+        buffers = [driver.stream_buffer(s, maxlen=100) for s in sources]
+        for buffer in buffers:
+            buffer.start()
+        assert threading.active_count() <= n_threads + 1
+        readers = [buffer.mk_reader() for buffer in buffers]
+        assert readers[0].source_reader_info == dict(n=20, open_count=1)
+        for reader in readers:
+            assert [reader.read(blocking=True) for _ in range(20)] == list(range(20))
+        for buffer in buffers:
+            buffer.stop()
+        assert all(s.closed for s in sources)
+        assert all(reader.is_stopped for reader in readers)
+    assert threading.active_count() <= n_threads
+
+
+def test_read_batch_and_restart():
+    with AsyncSourceDriver() as driver:
+        source = AsyncRangeBatchSource(12)
+        buffer = AsyncStreamBuffer(source, maxlen=100, driver=driver)
+        for open_count in (1, 2):
+            with buffer:
+                reader = buffer.mk_reader()
+                assert [reader.read(blocking=True) for _ in range(12)] == list(range(12))
+                assert buffer.source_reader_info['open_count'] == open_count
+            assert source.closed
+
+
+def test_stop_interrupts_pending_read():
+    with AsyncSourceDriver() as driver:
+        source = AsyncRangeSource(10, delay_s=60)
+        buffer = driver.stream_buffer(source)
+        buffer.start()
+        tic = time.perf_counter()
+        buffer.stop()
+        assert time.perf_counter() - tic < 0.5
+        assert source.closed
+        assert not buffer.is_running
+
+
+def test_driver_stop_closes_running_sources():
+    driver = AsyncSourceDriver()
+    sources = [AsyncRangeSource(10, delay_s=60) for _ in range(5)]
+    buffers = [driver.stream_buffer(s) for s in sources]
+    for buffer in buffers:
+        buffer.start()
+    driver.stop()
+    assert all(s.closed for s in sources)
+    assert not any(buffer.is_running for buffer in buffers)
+
+
+def test_restart_policy_reopens_failing_source():
+    class FailingOnceSource(AsyncRangeSource):
+        async def open(self):
+            self.open_count += 1
+            if self._count is None:
+                self._count = 0  # keys keep increasing across reopens
+
+        async def read(self):
+            if self.open_count == 1 and self._count == 3:
+                raise ConnectionError('connection reset')
+            return await super().read()
+
+    with AsyncSourceDriver() as driver:
+        source = FailingOnceSource(5)
+        buffer = driver.stream_buffer(source, restart_policy=True)
+        with buffer:
+            reader = buffer.mk_reader()
+            assert [reader.read(blocking=True) for _ in range(5)] == list(range(5))
+            assert buffer.source_reader_info == dict(n=5, open_count=2, restart_count=1)
+        assert source.closed
+
+
+def test_source_error_is_logged(caplog):
+    class FailingSource(AsyncRangeSource):
+        async def read(self):
+            raise ConnectionError('connection reset')
+
+    with AsyncSourceDriver() as driver:
+        buffer = driver.stream_buffer(FailingSource(5))
+        with caplog.at_level(logging.ERROR, logger='stream2py.async_stream_buffer'):
+            buffer.start()
+            buffer.join(timeout=5)
+        assert not buffer.is_running
+    [record] = caplog.records
+    assert record.exc_info[0] is ConnectionError
@@ -20,3 +20,158 @@ def test_inject_buffer_reader():
         reader = buffer.mk_reader()
         assert isinstance(reader, TestBufferReader)
         assert reader.custom_function() is test_msg
+
+
+def test_sequence_cursor_skips_evicted_items():
+    import threading
+    from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+
+    buffer = RWLockSortedDeque(range(5), maxlen=5)
+    reader = BufferReader(buffer, {}, threading.Event())
+    assert reader.read(n=2) == [0, 1]
+    assert (reader.last_key, reader.last_seq) == (1, 1)
+    with buffer.writer_lock() as writer:
+        for i in range(5, 9):
+            writer.append(i)
+    # items 2 and 3 were evicted before being read: resume after them
+    assert reader.read() == 4
+    assert reader.read(n=3) == [5, 6, 7]
+    assert reader.read(peek=True) == 8
+    assert reader.last_seq == 7
+    assert reader.tail() == 8
+    assert reader.read(ignore_no_item_found=True) is None
+    assert reader.range(5, 6) == [5, 6]
+    assert reader.last_seq == 6
+    assert reader.read() == 7
+
+
+def test_overruns_are_counted_raised_or_reported():
+    import threading
+    import pytest
+    from stream2py.buffer_reader import Overrun
+    from stream2py.exceptions import ReaderOverrunError
+    from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+
+    def append(buffer, keys):
+        with buffer.writer_lock() as writer:
+            for i in keys:
+                writer.append(i)
+
+    buffer = RWLockSortedDeque(range(5), maxlen=5)
+    reported = []
+    counting = BufferReader(buffer, {}, threading.Event())
+    raising = BufferReader(buffer, {}, threading.Event(), on_overrun='raise')
+    reporting = BufferReader(buffer, {}, threading.Event(), on_overrun=reported.append)
+    for reader in (counting, raising, reporting):
+        assert reader.read(n=2) == [0, 1]
+    append(buffer, range(5, 9))  # 2 and 3 are evicted
+    assert counting.read(peek=True) == 4
+    assert counting.n_skipped == 0  # peeking does not consume the gap
+    assert counting.read() == 4
+    assert (counting.n_skipped, list(counting.overruns)) == (2, [Overrun(2, 1, 4)])
+
+    with pytest.raises(ReaderOverrunError) as e:
+        raising.read()
+    assert e.value.overrun == Overrun(2, 1, 4)
+    assert raising.last_key == 1  # last item read, but the next read resumes after the gap
+    assert raising.read(n=2) == [4, 5]
+    assert raising.n_skipped == 2
+
+    assert reporting.range(0, 6, only_new_items=True) == [4, 5, 6]
+    assert reported == [Overrun(2, 1, 4)]
+
+    # items dropped after being read are not counted
+    assert counting.read(n=4) == [5, 6, 7, 8]
+    append(buffer, range(9, 12))
+    assert counting.read(n=3) == [9, 10, 11]
+    assert counting.n_skipped == 2
+
+    with pytest.raises(ValueError):
+        BufferReader(buffer, {}, threading.Event(), on_overrun='warn')
+
+
+def test_read_available_drains_new_items():
+    source = SimpleSourceReader(range(100))
+    with source.stream_buffer(maxlen=100) as buffer:
+        reader = buffer.mk_reader()
+        items = []
+        while len(items) < 100:
+            reader.wait_for_new_data()
+            items.extend(reader.read_available())
+        assert [key for key, _ in items] == list(range(100))
+        assert reader.read_available() == []
+        assert reader.last_key == 99
+        # peek does not move the cursor, max_n bounds the batch
+        del reader.last_item
+        assert len(reader.read_available(peek=True)) == 100
+        assert reader.read_available(max_n=3) == [(0, 0), (1, 1), (2, 2)]
+        assert reader.last_key == 2
+
+
+def test_windows_of_the_last_duration_items_or_since_a_key():
+    import threading
+    from datetime import datetime, timedelta
+    from stream2py.utility.locked_sorted_deque import RWLockSortedDeque
+
+    t0 = datetime(2020, 1, 1)
+    for keys in (
+        [t0 + timedelta(seconds=i / 10) for i in range(50)],  # datetimes
+        [1577836800 + i / 10 for i in range(50)],  # float seconds
+        [1577836800_000_000 + i * 100_000 for i in range(50)],  # int microseconds
+    ):
+        buffer = RWLockSortedDeque(zip(keys, range(50)), key=lambda x: x[0], maxlen=50)
+        reader = BufferReader(buffer, {}, threading.Event())
+        assert [i for _, i in reader.last_duration(1, peek=True)] == list(range(40, 50))
+        assert reader.last_item is None
+        window = reader.last_duration(timedelta(milliseconds=250))
+        assert [i for _, i in window] == [47, 48, 49]
+        assert reader.last_key == keys[-1]
+        assert [i for _, i in reader.last_n(3)] == [47, 48, 49]
+        assert len(reader.last_n(100)) == 50
+        assert [i for _, i in reader.since(keys[45])] == list(range(45, 50))
+        assert reader.since(keys[-1] + (keys[1] - keys[0])) == []
+
+    empty = BufferReader(RWLockSortedDeque(), {}, threading.Event())
+    assert empty.last_duration(1) == empty.last_n(3) == empty.since(0) == []
+
+
+def test_iter_windows_blocks_until_windows_are_complete():
+    from datetime import datetime, timedelta
+
+    t0 = datetime(2020, 1, 1)
+
+    class TimedSource(SimpleSourceReader):
+        """A data item every 10 ms, with a datetime key"""
+
+        @staticmethod
+        def key(data):
+            return t0 + timedelta(milliseconds=10 * data[0])
+
+    with TimedSource(range(100)).stream_buffer(maxlen=100) as buffer:
+        by_count = buffer.mk_reader()
+        by_key = buffer.mk_reader()
+        windows = by_count.iter_windows(20, 15)
+        firsts = [[i for i, _ in window] for _, window in zip(range(6), windows)]
+        assert firsts[-1] == list(range(75, 95))
+        windows = by_key.iter_windows(
+            timedelta(milliseconds=200), timedelta(milliseconds=300), by_key=True
+        )
+        firsts = [[i for i, _ in window] for _, window in zip(range(3), windows)]
+        assert firsts == [list(range(0, 20)), list(range(30, 50)), list(range(60, 80))]
+
+
+def test_iter_windows_updates_one_deque_unless_copied():
+    with SimpleSourceReader(range(10)).stream_buffer(maxlen=10) as buffer:
+        reader, copying_reader = buffer.mk_reader(), buffer.mk_reader()
+        windows = reader.iter_windows(4, 2)
+        first = next(windows)
+        assert [i for i, _ in first] == [0, 1, 2, 3]
+        second = next(windows)
+        assert second is first  # updated in place, no copy of the overlap
+        assert [i for i, _ in second] == [2, 3, 4, 5]
+
+        copies = copying_reader.iter_windows(4, 2, copy=True)
+        first, second = next(copies), next(copies)
+        assert isinstance(first, list) and first is not second
+        assert [i for i, _ in first] == [0, 1, 2, 3]
+        assert [i for i, _ in second] == [2, 3, 4, 5]
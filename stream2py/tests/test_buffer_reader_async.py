@@ -0,0 +1,79 @@
+"""Tests for the asyncio interface of BufferReader"""
+import asyncio
+import threading
+import time
+
+from stream2py import StreamBuffer
+from stream2py.stream_buffer import _SourceBuffer
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+
+def test_async_for_over_stream_buffer():
+    source = SimpleSourceReader(range(50))
+
+    async def consume(reader):
+        return [item async for item in reader]
+
+    with StreamBuffer(source, maxlen=100) as buffer:
+        readers = [buffer.mk_reader() for _ in range(3)]
+        stopper = threading.Timer(0.5, buffer.stop)
+        stopper.start()
+
+        async def consume_all():
+            return await asyncio.gather(*map(consume, readers))
+
+        results = asyncio.run(consume_all())
+    expected = [(i, i) for i in range(50)]
+    assert results == [expected] * 3
+
+
+def test_aread_is_woken_by_writer_thread():
+    stop_event = threading.Event()
+    source_buffer = _SourceBuffer({}, stop_event, maxlen=10)
+    n_readers = 200
+
+    def write():
+        time.sleep(0.05)
+        source_buffer.append(1)
+        source_buffer.extend([2, 3])
+        time.sleep(0.05)
+        stop_event.set()
+        source_buffer.notify_readers()
+
+    async def consume(reader):
+        first = await reader.aread()
+        rest = await reader.aread(2)
+        end = await reader.aread()
+        return first, rest, end
+
+    async def main():
+        readers = [source_buffer.mk_reader() for _ in range(n_readers)]
+        threading.Thread(target=write).start()
+        return await asyncio.wait_for(asyncio.gather(*map(consume, readers)), 2)
+
+    assert asyncio.run(main()) == [(1, [2, 3], None)] * n_readers
+
+
+def test_waiting_reader_lets_other_tasks_run():
+    source_buffer = _SourceBuffer({}, threading.Event(), maxlen=10)
+    reader = source_buffer.mk_reader()
+    reader._has_new_data_or_is_stopped = lambda: True  # every check is a false alarm
+
+    async def main():
+        n_ticks = 0
+
+        async def tick():
+            nonlocal n_ticks
+            while True:
+                n_ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        threading.Timer(0.2, source_buffer.append, [1]).start()
+        item = await reader.aread()
+        ticker.cancel()
+        return item, n_ticks
+
+    item, n_ticks = asyncio.run(main())
+    assert item == 1
+    assert n_ticks > 0
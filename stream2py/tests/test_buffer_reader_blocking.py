@@ -74,3 +74,56 @@ def test_buffer_reader_blocking_stops_on_stop_event():
     # Should have gotten None because buffer stopped
     assert len(results) == 1
     assert results[0] is None, "Blocking read should return None when stopped"
+
+
+def test_blocking_read_is_woken_by_append_and_stop():
+    """Waiting readers wake up on notification, not at the end of their sleep time"""
+    from stream2py.stream_buffer import _SourceBuffer
+
+    stop_event = threading.Event()
+    source_buffer = _SourceBuffer({}, stop_event, maxlen=10)
+    reader = source_buffer.mk_reader()
+    reader.set_sleep_time_on_iter_none(30)  # would hang the test if relied upon
+    results = []
+
+    def consume():
+        results.append(reader.read(blocking=True))
+        results.extend(reader)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    tic = time.time()
+    consumer.start()
+    time.sleep(0.05)
+    source_buffer.append(1)
+    source_buffer.extend([2, 3])
+    time.sleep(0.05)
+    stop_event.set()
+    source_buffer.notify_readers()
+    consumer.join(timeout=2)
+
+    assert not consumer.is_alive()
+    assert results == [1, 2, 3]
+    assert time.time() - tic < 2
+
+
+def test_blocking_read_waits_on_a_buffer_emptied_by_drops():
+    from stream2py.stream_buffer import _SourceBuffer
+
+    source_buffer = _SourceBuffer({}, threading.Event(), maxlen=10)
+    source_buffer.extend([1, 2, 3, 4, 5])
+    reader = source_buffer.mk_reader()
+    assert reader.read() == 1
+    source_buffer.drop(5)  # items 2 to 5 are dropped before being read
+
+    n_checks = 0
+    has_new_data_or_is_stopped = reader._has_new_data_or_is_stopped
+
+    def counting_check():
+        nonlocal n_checks
+        n_checks += 1
+        return has_new_data_or_is_stopped()
+
+    reader._has_new_data_or_is_stopped = counting_check
+    threading.Timer(0.3, source_buffer.append, [6]).start()
+    assert reader.read(blocking=True) == 6
+    assert n_checks < 50  # woken up by the append, not spinning
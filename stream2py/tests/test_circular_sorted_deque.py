@@ -0,0 +1,160 @@
+"""Tests for CircularSortedDeque, checked against the deque based SortedDeque"""
+import operator
+import pickle
+from random import Random
+
+import pytest
+
+from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+from stream2py.utility.sorted_deque import SortedDeque
+
+
+def _same_content(circular, reference):
+    assert len(circular) == len(reference)
+    assert list(circular) == list(reference)
+    assert list(reversed(circular)) == list(reversed(reference))
+    for i in range(-len(reference), len(reference)):
+        assert circular[i] == reference[i]
+
+
+@pytest.mark.parametrize('maxlen', [None, 1, 5, 8, 13, 100])
+def test_append_and_drop_match_sorted_deque(maxlen):
+    key = operator.itemgetter(0)
+    circular = CircularSortedDeque(key=key, maxlen=maxlen)
+    reference = SortedDeque(key=key, maxlen=maxlen)
+    rng = Random(maxlen)
+    for i in range(300):
+        item = (i, f'data_{i}')
+        circular.append(item)
+        reference.append(item)
+        if rng.random() < 0.1 and len(reference) > 2:
+            n = rng.randint(1, len(reference) - 1)
+            circular.drop(n)
+            reference.drop(n)
+        _same_content(circular, reference)
+
+
+@pytest.mark.parametrize('maxlen', [7, 16, None])
+def test_searches_match_sorted_deque_when_wrapped(maxlen):
+    key = operator.itemgetter(0)
+    circular = CircularSortedDeque(key=key, maxlen=maxlen)
+    reference = SortedDeque(key=key, maxlen=maxlen)
+    for i in range(0, 100, 2):  # even keys only, so odd probes fall in between
+        circular.append((i, i))
+        reference.append((i, i))
+        for probe in range(-1, i + 2):
+            for method in ('find', 'find_le', 'find_lt', 'find_ge', 'find_gt'):
+                try:
+                    expected = getattr(reference, method)(probe)
+                except ValueError:
+                    with pytest.raises(ValueError):
+                        getattr(circular, method)(probe)
+                else:
+                    assert getattr(circular, method)(probe) == expected
+        lo, hi = key(reference[0]), key(reference[-1])
+        assert circular.range(lo + 1, hi - 1) == reference.range(lo + 1, hi - 1)
+        assert circular.range(lo, hi, 3) == reference.range(lo, hi, 3)
+        assert circular.range_by_index(1, 4) == reference.range_by_index(1, 4)
+        for item in reference:
+            assert item in circular
+            assert circular.index(item) == reference.index(item)
+            assert circular.count(item) == 1
+        assert (-1, -1) not in circular
+
+
+def test_append_rejects_non_increasing_keys():
+    circular = CircularSortedDeque([1, 2, 3], maxlen=3)
+    with pytest.raises(ValueError):
+        circular.append(3)
+    assert list(circular) == [1, 2, 3]
+
+
+def test_init_keeps_last_maxlen_sorted_items():
+    circular = CircularSortedDeque([5, 3, 1, 4, 2], maxlen=3)
+    assert list(circular) == [3, 4, 5]
+    circular.maxlen = 2
+    assert list(circular) == [4, 5]
+    assert circular[-2:] == [4, 5]
+
+
+def test_insert_remove_and_pickle():
+    circular = CircularSortedDeque(range(0, 10, 2), maxlen=10)
+    circular.insert(3)
+    circular.insert_right(3)
+    circular.remove(4)
+    assert list(circular) == [0, 2, 3, 3, 6, 8]
+    assert circular.count(3) == 2
+    clone = pickle.loads(pickle.dumps(circular))
+    assert list(clone) == list(circular)
+    assert clone.maxlen == 10
+    circular.clear()
+    assert len(circular) == 0
+    with pytest.raises(IndexError):
+        circular[0]
+
+
+@pytest.mark.parametrize('deque_cls', [SortedDeque, CircularSortedDeque])
+def test_sequence_numbers_survive_eviction_and_drop(deque_cls):
+    sd = deque_cls(maxlen=4)
+    for i in range(6):
+        sd.append(i * 10)
+    assert list(sd) == [20, 30, 40, 50]
+    assert sd.head_seq == 2  # items 0 and 10 were evicted
+    sd.drop(1)
+    assert sd.head_seq == 3
+    assert sd.key_at(0) == 30 and sd.key_at(-1) == 50
+    assert sd.seq_le(35) == 3
+    assert sd.seq_le(50) == 5
+    assert sd.seq_le(5) == 2  # no key <= 5: head_seq - 1
+    sd.maxlen = 2
+    assert list(sd) == [40, 50]
+    assert sd.head_seq == 4
+
+
+@pytest.mark.parametrize('maxlen', [None, 0, 1, 5, 8, 13])
+@pytest.mark.parametrize('batch_size', [0, 1, 3, 7, 20])
+def test_extend_matches_repeated_append(maxlen, batch_size):
+    reference = SortedDeque(maxlen=maxlen)
+    extended = [SortedDeque(maxlen=maxlen), CircularSortedDeque(maxlen=maxlen)]
+    for start in range(0, 60, batch_size or 1):
+        batch = list(range(start, start + batch_size))
+        for item in batch:
+            reference.append(item)
+        for sd in extended:
+            sd.extend(batch)
+            _same_content(sd, reference)
+            assert sd.head_seq == reference.head_seq
+
+
+@pytest.mark.parametrize('deque_cls', [SortedDeque, CircularSortedDeque])
+def test_extend_rejects_unordered_batch_atomically(deque_cls):
+    sd = deque_cls([1, 2, 3], maxlen=5)
+    with pytest.raises(ValueError):
+        sd.extend([4, 6, 5])
+    with pytest.raises(ValueError):
+        sd.extend([3, 4])
+    assert list(sd) == [1, 2, 3]
+    assert sd.head_seq == 0
+
+
+@pytest.mark.parametrize('deque_cls', [SortedDeque, CircularSortedDeque])
+def test_bulk_drop_and_drop_until(deque_cls):
+    sd = deque_cls(maxlen=10)
+    reference = []
+    for i in range(25):  # wrap the ring a few times
+        sd.append(i)
+        reference = (reference + [i])[-10:]
+        if i % 4 == 3:
+            sd.drop(3)
+            reference = reference[3:]
+        assert list(sd) == reference
+    assert sd.drop_until(22) == sum(1 for k in reference if k < 22)
+    assert list(sd) == [22, 23, 24]
+    assert sd.head_seq == 22
+    assert sd.drop_until(0) == 0
+    assert sd.drop_until(100) == 3
+    assert len(sd) == 0
+    with pytest.raises(IndexError):
+        sd.drop(1)
+    sd.append(30)
+    assert list(sd) == [30] and sd.head_seq == 25
@@ -33,3 +33,96 @@ def test_rw_lock_sorted_deque(initial_size, maxlen):
     with locked_deque.writer_lock() as writer:
         with pytest.raises(ValueError):
             writer.append(new_item)
+
+
+def test_rw_lock_sorted_deque_extend():
+    locked_deque = RWLockSortedDeque(range(3), maxlen=5)
+    locked_deque.extend(range(3, 7))
+    assert len(locked_deque) == 5
+    with locked_deque.reader_lock() as reader:
+        assert list(reader) == [2, 3, 4, 5, 6]
+        assert reader.head_seq == 2
+    with pytest.raises(ValueError):
+        locked_deque.extend([7, 7])
+
+
+def test_optimistic_reads_are_consistent_under_concurrent_writes():
+    import threading
+
+    locked_deque = RWLockSortedDeque(maxlen=50, optimistic_reads=True)
+    n_items = 20000
+    errors = []
+
+    def write():
+        for i in range(n_items):
+            with locked_deque.writer_lock() as writer:
+                writer.append(i)
+
+    def snapshot(reader):
+        return reader.head_seq, reader.range_by_index(0, len(reader))
+
+    def read():
+        while len(errors) < 1:
+            head_seq, items = locked_deque.consistent_read(snapshot)
+            # a consistent snapshot holds contiguous items starting at head_seq
+            if items != list(range(head_seq, head_seq + len(items))):
+                errors.append((head_seq, items))
+            if items and items[-1] == n_items - 1:
+                return
+
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert not errors
+    assert locked_deque._version == 2 * n_items
+
+
+def test_consistent_read_propagates_exceptions_of_unmodified_deque():
+    locked_deque = RWLockSortedDeque(optimistic_reads=True)
+    with pytest.raises(ValueError):
+        locked_deque.consistent_read(lambda reader: reader.find_gt(0))
+
+
+@pytest.mark.parametrize(
+    'lock_policy', ['writer_priority', 'reader_priority', 'mutex', 'optimistic']
+)
+def test_lock_policies(lock_policy):
+    import threading
+    from stream2py.buffer_reader import BufferReader
+
+    locked_deque = RWLockSortedDeque(maxlen=100, lock_policy=lock_policy)
+    assert locked_deque.optimistic_reads is (lock_policy == 'optimistic')
+    reader = BufferReader(locked_deque, {}, threading.Event())
+
+    def write():
+        for i in range(1000):
+            with locked_deque.writer_lock() as writer:
+                writer.append(i)
+
+    writer_thread = threading.Thread(target=write)
+    writer_thread.start()
+    items = []
+    while writer_thread.is_alive() or items[-1:] != [999]:
+        item = reader.read(ignore_no_item_found=True)
+        if item is not None:
+            items.append(item)
+    writer_thread.join()
+    assert items == sorted(set(items))  # no item read twice nor out of order
+
+
+def test_unknown_lock_policy():
+    with pytest.raises(ValueError):
+        RWLockSortedDeque(lock_policy='no_such_policy')
+
+
+def test_lock_policy_benchmark_runs():
+    from stream2py.examples.lock_policy_benchmark import benchmark_lock_policies
+
+    results = benchmark_lock_policies(
+        ['mutex', 'optimistic'], reader_counts=[2], duration_s=0.05
+    )
+    assert [r['lock_policy'] for r in results] == ['mutex', 'optimistic']
+    assert all(r['reads_per_s'] > 0 and r['p99_read_us'] > 0 for r in results)
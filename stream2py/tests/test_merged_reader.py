@@ -0,0 +1,94 @@
+"""Tests for MergedReader and merge_stream_buffers"""
+import queue
+import random
+import time
+
+from stream2py import MergedReader, StreamBuffer, merge_stream_buffers
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+
+class KeyedSource(SimpleSourceReader):
+    """Reads (index, key) tuples keyed by key"""
+
+    def key(self, data):
+        return data[1]
+
+
+class QueueSource(KeyedSource):
+    """Reads the keys put in a queue"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        super().__init__(())
+
+    def read(self):
+        try:
+            key = self.queue.get_nowait()
+        except queue.Empty:
+            return None
+        self._current_index += 1
+        return self._current_index - 1, key
+
+
+def test_merge_of_streams_of_different_rates():
+    rng = random.Random(7)
+    key_lists = [
+        sorted(rng.sample(range(10_000), n_items)) for n_items in (500, 50, 5, 1)
+    ]
+    buffers = [StreamBuffer(KeyedSource(keys), maxlen=1000) for keys in key_lists]
+    for buffer in buffers:
+        buffer.start()
+    merged = merge_stream_buffers(buffers)
+    reader = merged.mk_reader()
+    for buffer, keys in zip(buffers, key_lists):
+        probe = buffer.mk_reader()
+        [probe.read(blocking=True) for _ in keys]  # every item was read from the source
+        buffer.stop()
+    items = list(reader)
+    assert [merged.source_reader.key(item) for item in items] == sorted(
+        (key, i) for i, keys in enumerate(key_lists) for key in keys
+    )  # every item, ties included, in (key, index) order
+    assert not merged.is_running
+
+
+def test_watermark_holds_back_items_until_every_stream_reached_them():
+    sources = [QueueSource(), QueueSource()]
+    with StreamBuffer(sources[0]) as b0, StreamBuffer(sources[1]) as b1:
+        merged = MergedReader([b0.mk_reader(), b1.mk_reader()])
+        for key in (1, 5, 9):
+            sources[0].queue.put(key)
+        probe = b0.mk_reader()
+        [probe.read(blocking=True) for _ in range(3)]
+        # nothing was read from b1 yet, which could still read keys before those of b0
+        assert merged.read_available() == []
+        sources[1].queue.put(6)
+        keys = [merged.read(blocking=True)[1] for _ in range(3)]
+        assert keys == [1, 5, 6]
+        assert merged.read_available() == []  # b1 could still read a key below 9
+    assert [item[1] for item in merged] == [9]
+    assert merged.is_stopped
+
+
+def test_merge_into_a_small_buffer_loses_nothing():
+    key_lists = [list(range(0, 600, 3)), list(range(1, 600, 3)), list(range(2, 600, 3))]
+    buffers = [StreamBuffer(KeyedSource(keys), maxlen=200) for keys in key_lists]
+    for buffer in buffers:
+        buffer.start()
+    merged = merge_stream_buffers(
+        buffers, maxlen=10, auto_drop=False, drop_consumed=True
+    )
+    reader = merged.mk_reader()
+    for buffer, keys in zip(buffers, key_lists):
+        probe = buffer.mk_reader()
+        [probe.read(blocking=True) for _ in keys]
+        buffer.stop()
+    items, deadline = [], time.monotonic() + 10
+    while len(items) < 600 and time.monotonic() < deadline:
+        item = reader.read(ignore_no_item_found=True)
+        if item is None:
+            time.sleep(0.001)
+        else:
+            items.append(item)
+        assert len(merged.source_buffer) <= 10
+    assert [item[1][1] for item in items] == list(range(600))
+    assert reader.n_skipped == 0
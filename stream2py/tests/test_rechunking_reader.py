@@ -0,0 +1,64 @@
+"""Tests for RechunkingReader"""
+import struct
+
+from stream2py import RechunkingReader, StreamBuffer
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+RATE = 1000  # samples per second
+CHUNK = 10  # samples per chunk
+
+
+class Int16ChunkSource(SimpleSourceReader):
+    """Reads chunks of CHUNK int16 samples, counting from 0, keyed in microseconds"""
+
+    def __init__(self, n_chunks):
+        super().__init__(
+            struct.pack(f'<{CHUNK}h', *range(i * CHUNK, (i + 1) * CHUNK))
+            for i in range(n_chunks)
+        )
+
+    def key(self, data):
+        return data[0] * CHUNK * 1_000_000 // RATE
+
+
+def samples(frame):
+    return list(struct.unpack(f'<{len(frame) // 2}h', frame))
+
+
+def test_frames_of_several_sizes_from_the_same_chunks():
+    n_chunks = 20
+    with StreamBuffer(Int16ChunkSource(n_chunks), maxlen=n_chunks) as buffer:
+        readers = {
+            frame_size: RechunkingReader(buffer.mk_reader(), frame_size, sample_size=2)
+            for frame_size in (3, 10, 16, 64)
+        }
+        for frame_size, reader in readers.items():
+            # a frame is keyed once the chunk after its first sample is read
+            n_frames = ((n_chunks - 1) * CHUNK - 1) // frame_size + 1
+            frames = [reader.read(blocking=True) for _ in range(n_frames)]
+            for i, (key, frame) in enumerate(frames):
+                first_sample = i * frame_size
+                assert key == first_sample * 1_000_000 // RATE
+                assert samples(frame) == list(
+                    range(first_sample, first_sample + frame_size)
+                )
+    # once stopped, the last chunk gets the sample period of the previous one
+    assert [(key, samples(frame)) for key, frame in readers[3]] == [
+        (192_000, [192, 193, 194]),
+        (195_000, [195, 196, 197]),
+    ]
+    assert list(readers[64]) == []  # 8 samples left
+
+
+def test_sample_period_keys_frames_without_waiting_for_the_next_chunk():
+    source = SimpleSourceReader([list(range(10))])  # a single chunk, never stopped
+    with StreamBuffer(source) as buffer:
+        frames = RechunkingReader(buffer.mk_reader(), 4, sample_period=0.5)
+        assert frames.read(blocking=True) == (0, [0, 1, 2, 3])
+        assert frames.read(blocking=True) == (2.0, [4, 5, 6, 7])
+        assert frames.read() is None  # only 2 samples left
+
+        interpolating = RechunkingReader(buffer.mk_reader(), 4)
+        assert interpolating.read(blocking=True) == (0, [0, 1, 2, 3])
+        # the period of the chunk is unknown until the next one is read
+        assert interpolating.read() is None
@@ -0,0 +1,68 @@
+"""Tests of RollingStats against statistics of the raw items"""
+import random
+import statistics
+
+import pytest
+
+from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+from stream2py.utility.rolling_stats import RollingStats
+
+
+@pytest.mark.parametrize('window', [None, 1, 7, 50])
+def test_rolling_stats_match_raw_items(window):
+    rnd = random.Random(window or 0)
+    sd = CircularSortedDeque(key=lambda x: x[0], maxlen=40)
+    rolling = RollingStats(lambda x: x[1], window)
+    key = 0
+    for step in range(300):
+        n = rnd.randint(0, 12)
+        sd.extend((key + i, rnd.uniform(-10, 10)) for i in range(n))
+        key += n
+        if step % 5 == 0:
+            sd.drop(min(rnd.randint(0, 8), len(sd)))
+        rolling.sync(sd)
+        values = [v for _, v in sd][-window if window else 0 :]
+        stats = rolling.stats()
+        assert stats.count == len(values)
+        if values:
+            assert stats.sum == pytest.approx(sum(values))
+            assert stats.mean == pytest.approx(statistics.fmean(values))
+            assert stats.var == pytest.approx(statistics.pvariance(values), abs=1e-9)
+            assert (stats.min, stats.max) == (min(values), max(values))
+        else:
+            assert stats.mean is stats.min is None
+
+
+def test_rounding_errors_of_removals_do_not_accumulate():
+    rnd = random.Random(3)
+    sd = CircularSortedDeque(key=lambda x: x[0], maxlen=1000)
+    rolling = RollingStats(lambda x: x[1], window=100)
+    large = (rnd.uniform(-1e7, 1e7) for _ in range(20_000))
+    small = (1e6 + rnd.uniform(-5e-4, 5e-4) for _ in range(1000))
+    for key, value in enumerate([*large, *small]):
+        sd.append((key, value))
+        rolling.sync(sd)
+    values = [v for _, v in sd][-100:]
+    stats = rolling.stats()
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert stats.var == pytest.approx(statistics.pvariance(values), rel=1e-6)
+
+
+def test_rolling_stats_of_a_stream_buffer_can_be_detached():
+    import gc
+
+    from stream2py import StreamBuffer
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    with StreamBuffer(SimpleSourceReader([]), maxlen=10) as buffer:
+        source_buffer = buffer.source_buffer
+        kept = buffer.rolling_stats(lambda item: item[1])
+        detached = buffer.rolling_stats(lambda item: item[1])
+        buffer.rolling_stats(lambda item: item[1])  # not referred to: dropped
+        gc.collect()
+        assert set(source_buffer.rolling_stats) == {kept, detached}
+        buffer.detach_rolling_stats(detached)
+        assert set(source_buffer.rolling_stats) == {kept}
+        source_buffer.extend([(0, 1), (1, 2)])
+        assert kept.stats().count == 2
+        assert detached.stats().count == 0
@@ -0,0 +1,153 @@
+"""Tests for SharedMemoryStreamBuffer and its readers of other processes"""
+import multiprocessing
+import struct
+
+import pytest
+
+from stream2py import SharedMemoryStreamBuffer, mk_shared_memory_reader
+from stream2py.exceptions import ConfigurationError
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+from stream2py.utility.shared_memory_ring import _VERSION, SharedMemoryRing
+
+RECORD = struct.Struct('<dd')  # fixed size records of two floats
+
+
+class RecordSource(SimpleSourceReader):
+    """Reads (index, bytes of two floats) tuples"""
+
+    def __init__(self, n):
+        super().__init__(RECORD.pack(i, i * 0.5) for i in range(n))
+
+    @property
+    def info(self):
+        return dict(device='sensor', rate=100)
+
+
+def _sum_records(name, attached, results):
+    """Read the stream of another process until it stops"""
+    reader = mk_shared_memory_reader(name, from_bytes=RECORD.unpack)
+    attached.set()
+    keys, total = [], 0.0
+    item = reader.read(blocking=True)
+    while item is not None:
+        key, (i, value) = item
+        keys.append(key)
+        total += value
+        item = reader.read(blocking=True)
+    results.put((reader.source_reader_info, keys, total))
+    reader.close()
+
+
+def test_reader_of_another_process():
+    n = 500
+    ctx = multiprocessing.get_context('spawn')
+    attached, results = ctx.Event(), ctx.Queue()
+    buffer = SharedMemoryStreamBuffer(
+        RecordSource(n), maxlen=n, record_size=RECORD.size, to_bytes=lambda d: d[1]
+    )
+    buffer.start()
+    name = buffer.shared_memory_name
+    consumer = ctx.Process(target=_sum_records, args=(name, attached, results))
+    consumer.start()
+    # the segment is unlinked once stopped: only stop once the consumer attached
+    assert attached.wait(30)
+    reader = buffer.mk_reader()
+    while reader.read(blocking=True)[0] < n - 1:
+        pass
+    buffer.stop()
+    info, keys, total = results.get(timeout=30)
+    consumer.join(30)
+    assert info == dict(device='sensor', rate=100)
+    assert keys == list(range(n))
+    assert total == sum(i * 0.5 for i in range(n))
+
+
+def test_ring_wraps_drops_and_validates():
+    ring = SharedMemoryRing.create(capacity=4, record_size=3, key_format='d')
+    try:
+        for i in range(10):
+            ring.append((i / 2, bytes([i]) * (i % 3 + 1)))
+        records = ring.consistent_read(list)
+        assert records == [(i / 2, bytes([i]) * (i % 3 + 1)) for i in range(6, 10)]
+        assert ring.next_seq == 10 and len(ring) == 4
+        with pytest.raises(ValueError):
+            ring.append((4.5, b'x'))  # key not increasing
+        with pytest.raises(ValueError):
+            ring.extend([(5.0, b'x'), (6.0, b'toolong')])
+        assert ring.next_seq == 10  # the batch was rejected as a whole
+        assert ring.drop_until(4.0) == 2
+        assert ring.consistent_read(lambda reader: reader.range(0, 10)) == records[2:]
+        ring.extend([(float(k), b'') for k in range(10, 20)])
+        assert ring.consistent_read(lambda reader: (reader.head_seq, reader[0])) == (
+            16,
+            (16.0, b''),
+        )
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+@pytest.mark.parametrize('bad_key', [5.5, 2**70, 'x'])
+def test_a_batch_with_a_bad_key_changes_nothing(bad_key):
+    ring = SharedMemoryRing.create(capacity=3, record_size=1, key_format='q')
+    try:
+        ring.extend([(1, b'a'), (2, b'b'), (3, b'c')])
+        with pytest.raises((ValueError, TypeError)):
+            ring.extend([(4, b'd'), (bad_key, b'e')])
+        assert ring.consistent_read(list) == [(1, b'a'), (2, b'b'), (3, b'c')]
+        assert ring.next_seq == 3
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_readers_give_up_on_a_writer_dead_mid_write():
+    ring = SharedMemoryRing.create(capacity=3, record_size=1)
+    reader = SharedMemoryRing.attach(ring.name)
+    reader.max_write_time_s = 0.05
+    try:
+        ring._state[_VERSION] += 1  # the writer dies in the middle of a write
+        with pytest.raises(TimeoutError):
+            reader.consistent_read(list)
+    finally:
+        reader.close()
+        ring.close()
+        ring.unlink()
+
+
+def test_stop_is_seen_through_shared_memory():
+    buffer = SharedMemoryStreamBuffer(
+        RecordSource(3), maxlen=10, record_size=RECORD.size, to_bytes=lambda d: d[1]
+    )
+    with buffer:
+        reader = mk_shared_memory_reader(buffer.shared_memory_name)
+        assert not reader.is_stopped
+    assert reader.is_stopped
+    assert [key for key, _ in reader.range(0, 10)] == [0, 1, 2]
+    reader.close()
+    with pytest.raises(FileNotFoundError):  # unlinked once stopped
+        mk_shared_memory_reader(buffer.shared_memory_name)
+
+
+def test_rolling_stats_are_rejected():
+    buffer = SharedMemoryStreamBuffer(RecordSource(3), record_size=RECORD.size)
+    with pytest.raises(ConfigurationError):
+        buffer.rolling_stats(len)
+
+
+def test_window_queries_bisect_the_ring():
+    ring = SharedMemoryRing.create(capacity=8, record_size=1, key_format='q')
+    try:
+        ring.extend([(i * 500_000, bytes([i])) for i in range(12)])  # every 0.5 s
+        reader = mk_shared_memory_reader(ring.name)
+        assert [key for key, _ in reader.last_duration(1.2)] == [
+            4_500_000,
+            5_000_000,
+            5_500_000,
+        ]
+        assert reader.since(5_000_000) == [(5_000_000, b'\n'), (5_500_000, b'\x0b')]
+        assert len(reader.last_n(100)) == 8
+        reader.close()
+    finally:
+        ring.close()
+        ring.unlink()
@@ -1,7 +1,10 @@
 from stream2py.tests.utils_for_testing import TenthSecondCounterStreamSource
 from stream2py.stream_buffer import StreamBuffer
+import itertools
 import time
 
+import pytest
+
 
 def test_stream_buffer():
     sc = TenthSecondCounterStreamSource()  # source
@@ -107,3 +110,281 @@ def test_stream_buffer():
         assert (
             sc_reader22.last_item != sc_reader21.last_item
         ), 'new readers should now have a different last_item cursor position'
+
+
+def test_stream_buffer_reads_batches_when_source_has_read_batch():
+    from stream2py.protocols import BatchSource
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    class BatchCounterSource(SimpleSourceReader):
+        def __init__(self, data, batch_size):
+            super().__init__(data)
+            self.batch_size = batch_size
+            self.max_n_seen = []
+
+        def read_batch(self, max_n=None):
+            self.max_n_seen.append(max_n)
+            batch = []
+            for _ in range(min(self.batch_size, max_n or self.batch_size)):
+                item = self.read()
+                if item is None:
+                    break
+                batch.append(item)
+            return batch
+
+        def key(self, data):
+            return data[0]
+
+    source = BatchCounterSource(range(100), batch_size=7)
+    assert isinstance(source, BatchSource)
+    with StreamBuffer(source, maxlen=30, auto_drop=False) as buffer:
+        time.sleep(0.2)
+        # buffer stops reading when full, and asks for no more than what it can take
+        assert len(buffer.source_buffer) == 30
+        assert all(max_n <= 30 for max_n in source.max_n_seen)
+        buffer.drop(30)
+        time.sleep(0.5)
+        reader = buffer.mk_reader()
+        assert reader.read(n=3) == [(30, 30), (31, 31), (32, 32)]
+
+
+def test_stop_returns_as_soon_as_source_is_closed():
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    # the read thread is sleeping between reads that return None
+    buffer = StreamBuffer(SimpleSourceReader([]), sleep_time_on_read_none_s=60)
+    buffer.start()
+    tic = time.perf_counter()
+    buffer.stop()
+    assert time.perf_counter() - tic < 0.5
+    assert not buffer._read_to_buffer_thread.is_alive()
+
+
+def test_restart_policy_reopens_failing_source():
+    from stream2py import RestartPolicy
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    class FlakySource(SimpleSourceReader):
+        """Raises after every 5 items, keys keep increasing across reopens"""
+
+        def __init__(self):
+            super().__init__(itertools.count())
+            self.open_count = 0
+
+        def open(self):
+            self.open_count += 1
+
+        def read(self):
+            if self._current_index and self._current_index % 5 == 0:
+                self._current_index += 1  # do not fail twice on the same item
+                raise ConnectionError('connection reset')
+            return super().read()
+
+        @property
+        def info(self):
+            return dict(open_count=self.open_count)
+
+    policy = RestartPolicy(initial_backoff_s=0.01, max_backoff_s=0.05)
+    source = FlakySource()
+    with StreamBuffer(source, maxlen=100, restart_policy=policy) as buffer:
+        reader = buffer.mk_reader()
+        assert buffer.source_reader_info == dict(open_count=1, restart_count=0)
+        items = [reader.read(blocking=True) for _ in range(12)]
+        assert [key for key, _ in items] == [0, 1, 2, 3, 4, 6, 7, 8, 9, 11, 12, 13]
+        assert buffer.is_running
+        assert reader.source_reader_info['restart_count'] >= 2
+        assert reader.source_reader_info['open_count'] >= 3
+
+    # without policy, or past max_restarts, the exception stops the buffer
+    policy = RestartPolicy(initial_backoff_s=0.01, max_restarts=1)
+    with StreamBuffer(FlakySource(), maxlen=100, restart_policy=policy) as buffer:
+        buffer.join(2)
+        assert not buffer.is_running
+        assert buffer.source_reader_info['restart_count'] == 1
+
+
+def test_drop_consumed_waits_for_the_slowest_reader():
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    n = 200
+    buffer = StreamBuffer(
+        SimpleSourceReader(range(n)),
+        maxlen=10,
+        auto_drop=False,
+        drop_consumed=True,
+        sleep_time_on_read_none_s=0.001,
+    )
+    with buffer:
+        fast, slow = buffer.mk_reader(), buffer.mk_reader()
+        fast_keys, slow_keys = [], []
+        while len(slow_keys) < n:
+            for _ in range(5):  # the fast reader is 5 times faster
+                item = fast.read(ignore_no_item_found=True)
+                if item is not None:
+                    fast_keys.append(item[0])
+            slow_keys.append(slow.read(blocking=True)[0])
+            assert len(buffer.source_buffer) <= 10
+        assert slow_keys == list(range(n))
+        while fast.read(ignore_no_item_found=True, peek=True) is not None:
+            fast_keys.append(fast.read()[0])
+        assert fast_keys == list(range(n))
+
+        # a detached reader does not hold data back anymore
+        idle = buffer.mk_reader()
+        buffer.detach_reader(idle)
+        del fast, slow
+        assert buffer.source_buffer.drop_consumed() == 0  # idle was the last reader
+
+
+def test_drop_consumed_pauses_reading_without_readers():
+    from stream2py.exceptions import ConfigurationError
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    with pytest.raises(ConfigurationError):
+        StreamBuffer(SimpleSourceReader([]), drop_consumed=True)
+    source = SimpleSourceReader(range(100))
+    with StreamBuffer(source, maxlen=5, auto_drop=False, drop_consumed=True) as buffer:
+        reader = buffer.mk_reader()
+        time.sleep(0.1)
+        assert len(buffer.source_buffer) == 5  # paused until the reader reads
+        assert reader.read(n=5) == [(i, i) for i in range(5)]
+        assert reader.read(blocking=True) == (5, 5)
+
+
+def test_derived_buffer_applies_fn_once_for_all_readers():
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    calls = []
+
+    def decode(item):
+        calls.append(item)
+        return item[0], item[1] * 10
+
+    with StreamBuffer(SimpleSourceReader(range(100)), maxlen=100) as buffer:
+        derived = buffer.derive(decode, filter=lambda item: item[1] % 3 == 0)
+        readers = [derived.mk_reader() for _ in range(5)]
+        for reader in readers:
+            items = [reader.read(blocking=True) for _ in range(34)]
+            assert items == [(i, i * 10) for i in range(0, 100, 3)]
+    derived.join(1)
+    assert not derived.is_running  # stopped once its parent is stopped and read
+    assert len(calls) == 34
+
+
+@pytest.mark.parametrize('n_workers', [None, 2])
+def test_derive_with_restart_policy_derives_failed_items_again(n_workers):
+    from concurrent.futures import ThreadPoolExecutor
+    from stream2py import RestartPolicy
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    failed = []
+
+    def fail_once(item):
+        if item[0] == 20 and not failed:
+            failed.append(item)
+            raise ConnectionError('decoder reset')
+        return item
+
+    class GatedSource(SimpleSourceReader):
+        """Reads the items before n_open only"""
+
+        n_open = 20
+
+        def read(self):
+            if self._current_index >= self.n_open:
+                return None
+            return super().read()
+
+    source = GatedSource(range(50))
+    executor = ThreadPoolExecutor(n_workers) if n_workers else None
+    policy = RestartPolicy(initial_backoff_s=0.01)
+    with StreamBuffer(source, maxlen=100, sleep_time_on_read_none_s=0.001) as buffer:
+        derived = buffer.derive(
+            fail_once, executor=executor, batch_size=4, restart_policy=policy
+        )
+        reader = derived.mk_reader()
+        keys = [reader.read(blocking=True)[0] for _ in range(20)]
+        source.n_open = 50  # fn fails on the first item after those already derived
+        deadline = time.monotonic() + 10
+        while (not keys or keys[-1] < 49) and time.monotonic() < deadline:
+            item = reader.read(ignore_no_item_found=True)
+            if item is None:
+                time.sleep(0.001)
+            else:
+                keys.append(item[0])
+        assert derived.source_reader_info['restart_count'] == 1
+        assert len(derived.source_buffer) == 50  # every item derived once
+    assert keys == list(range(50))
+    if executor is not None:
+        executor.shutdown()
+
+
+def _square(item):
+    """Picklable fn for process pools"""
+    return item[0], item[1] ** 2
+
+
+def test_derive_with_executor_keeps_key_order_and_bounds_in_flight():
+    import random
+    import threading
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    lock = threading.Lock()
+    running = max_running = 0
+
+    def slow_square(item):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(random.random() / 1000)  # completion order is scrambled
+        with lock:
+            running -= 1
+        return _square(item)
+
+    n = 500
+    with ThreadPoolExecutor(8) as executor:
+        with StreamBuffer(SimpleSourceReader(range(n)), maxlen=n) as buffer:
+            derived = buffer.derive(
+                slow_square, executor=executor, batch_size=4, max_in_flight=3
+            )
+            reader = derived.mk_reader()
+            items = [reader.read(blocking=True) for _ in range(n)]
+        assert items == [(i, i ** 2) for i in range(n)]
+        assert max_running <= 3  # one task per batch in flight
+
+    with ProcessPoolExecutor(2) as executor:
+        with StreamBuffer(SimpleSourceReader(range(100))) as buffer:
+            reader = buffer.derive(_square, executor=executor).mk_reader()
+            items = [reader.read(blocking=True) for _ in range(100)]
+            with pytest.raises(ValueError):
+                buffer.derive(_square, executor=executor, max_in_flight=0)
+        assert items == [(i, i ** 2) for i in range(100)]
+
+
+def test_derive_with_executor_into_a_small_buffer_loses_nothing():
+    from concurrent.futures import ThreadPoolExecutor
+    from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+    n = 500
+    with ThreadPoolExecutor(4) as executor:
+        with StreamBuffer(SimpleSourceReader(range(n)), maxlen=n) as buffer:
+            derived = buffer.derive(
+                _square,
+                executor=executor,
+                maxlen=10,
+                auto_drop=False,
+                drop_consumed=True,
+            )
+            reader = derived.mk_reader()
+            items, deadline = [], time.monotonic() + 10
+            while len(items) < n and time.monotonic() < deadline:
+                item = reader.read(ignore_no_item_found=True)
+                if item is None:
+                    time.sleep(0.001)
+                else:
+                    items.append(item)
+            assert len(derived.source_buffer) <= 10
+    assert items == [(i, i ** 2) for i in range(n)]
+    assert reader.n_skipped == 0
@@ -0,0 +1,136 @@
+"""Tests for StreamBuffers polled by a StreamScheduler"""
+import threading
+import time
+
+from stream2py import RestartPolicy, StreamBuffer, StreamScheduler
+from stream2py.tests.utils_for_testing import SimpleSourceReader
+
+
+class SlowPolledSource(SimpleSourceReader):
+    """Has a new item every period_s, and counts the reads returning None"""
+
+    def __init__(self, n, period_s):
+        super().__init__(range(n))
+        self.period_s = period_s
+        self.n_none_reads = 0
+        self.closed_count = 0
+        self._next_time = None
+
+    def open(self):
+        self._next_time = time.monotonic()
+
+    def read(self):
+        if time.monotonic() < self._next_time:
+            self.n_none_reads += 1
+            return None
+        self._next_time += self.period_s
+        return super().read()
+
+    def close(self):
+        self.closed_count += 1
+
+    @property
+    def sleep_time_on_read_none_s(self):
+        return self.period_s / 2
+
+
+def test_many_sources_share_the_worker_pool():
+    n_threads = threading.active_count()
+    with StreamScheduler(n_workers=3) as scheduler:
+        sources = [SimpleSourceReader(range(30)) for _ in range(200)]
+        buffers = [scheduler.stream_buffer(s, maxlen=50) for s in sources]
+        for buffer in buffers:
+            buffer.start()
+        assert threading.active_count() <= n_threads + 3
+        readers = [buffer.mk_reader() for buffer in buffers]
+        for reader in readers:
+            items = [reader.read(blocking=True) for _ in range(30)]
+            assert items == [(i, i) for i in range(30)]
+        for buffer in buffers:
+            buffer.stop()
+        assert not any(buffer.is_running for buffer in buffers)
+        assert all(reader.is_stopped for reader in readers)
+    assert threading.active_count() <= n_threads
+
+
+def test_idle_source_is_polled_by_its_sleep_time():
+    with StreamScheduler(n_workers=1) as scheduler:
+        source = SlowPolledSource(5, period_s=0.1)
+        with StreamBuffer(source, scheduler=scheduler) as buffer:
+            reader = buffer.mk_reader()
+            items = [reader.read(blocking=True) for _ in range(5)]
+        assert items == [(i, i) for i in range(5)]
+        # about one poll returning None per half period, not a busy loop
+        assert source.n_none_reads < 30
+        assert source.closed_count == 1
+
+
+def test_stop_closes_source_and_restart_registers_again():
+    with StreamScheduler(n_workers=2) as scheduler:
+        source = SlowPolledSource(100, period_s=10)
+        buffer = StreamBuffer(source, scheduler=scheduler)
+        for closed_count in (1, 2):
+            buffer.start()
+            assert buffer.mk_reader().read(blocking=True) == (closed_count - 1,) * 2
+            tic = time.perf_counter()
+            buffer.stop()
+            assert time.perf_counter() - tic < 0.5
+            assert source.closed_count == closed_count
+
+
+def test_scheduler_stop_closes_registered_sources():
+    scheduler = StreamScheduler(n_workers=1)
+    sources = [SlowPolledSource(10, period_s=10) for _ in range(5)]
+    buffers = [StreamBuffer(s, scheduler=scheduler) for s in sources]
+    for buffer in buffers:
+        buffer.start()
+    scheduler.stop()
+    assert [s.closed_count for s in sources] == [1] * 5
+    assert not any(buffer.is_running for buffer in buffers)
+
+
+def test_read_exception_stops_buffer():
+    class FailingSource(SimpleSourceReader):
+        def read(self):
+            raise RuntimeError('device unplugged')
+
+    with StreamScheduler(n_workers=1) as scheduler:
+        buffer = StreamBuffer(FailingSource([]), scheduler=scheduler)
+        buffer.start()
+        reader = buffer.mk_reader()
+        assert reader.read(blocking=True) is None  # woken up by the stop
+        buffer.join(1)
+        assert not buffer.is_running
+
+
+def test_restart_policy_backoff_is_waited_in_the_scheduler():
+    class OneFailureSource(SimpleSourceReader):
+        def __init__(self, data):
+            super().__init__(data)
+            self.open_count = 0
+
+        def open(self):
+            self.open_count += 1
+
+        def read(self):
+            if self.open_count == 1 and self._current_index == 3:
+                raise ConnectionError('connection reset')
+            return super().read()
+
+    policy = RestartPolicy(initial_backoff_s=0.5)
+    with StreamScheduler(n_workers=1) as scheduler:
+        source = OneFailureSource(range(6))
+        other = SimpleSourceReader(range(6))
+        buffer = StreamBuffer(source, restart_policy=policy, scheduler=scheduler)
+        other_buffer = StreamBuffer(other, scheduler=scheduler)
+        with buffer, other_buffer:
+            reader = buffer.mk_reader()
+            # the single worker is free for other sources during the backoff
+            other_reader = other_buffer.mk_reader()
+            assert [other_reader.read(blocking=True)[0] for _ in range(6)] == list(
+                range(6)
+            )
+            assert source.open_count == 1
+            assert [reader.read(blocking=True)[0] for _ in range(6)] == list(range(6))
+            assert source.open_count == 2
+            assert buffer.source_reader_info['restart_count'] == 1
@@ -0,0 +1,212 @@
+"""Summaries (count, sum, min, max) of the values of the items of a buffer at several
+resolutions, kept up to date as items are appended and dropped, so long range overview queries
+combine a few block summaries instead of every item.
+
+Items are identified by their buffer sequence numbers (see SortedDeque.head_seq): the block b of
+size block_size summarizes the items of sequence numbers b * block_size to
+(b + 1) * block_size - 1.
+"""
+from collections import deque
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Sequence
+
+DFLT_BLOCK_SIZES = (64, 4096)
+
+
+class Summary(NamedTuple):
+    """Summary of the values of the items with keys from start_key to stop_key"""
+
+    start_key: Any
+    stop_key: Any
+    count: int
+    sum: float
+    min: Optional[float]
+    max: Optional[float]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+EMPTY_SUMMARY = Summary(None, None, 0, 0, None, None)
+
+
+def combine_summaries(summaries: Iterable[Summary]) -> Summary:
+    """Summary of consecutive summaries
+
+    >>> combine_summaries([Summary(0, 1, 2, 3, 1, 2), Summary(2, 3, 2, 7, 3, 4)])
+    Summary(start_key=0, stop_key=3, count=4, sum=10, min=1, max=4)
+    """
+    start_key = stop_key = None
+    count, total, lo, hi = 0, 0, None, None
+    for s in summaries:
+        if not s.count:
+            continue
+        if not count:
+            start_key, lo, hi = s.start_key, s.min, s.max
+        else:
+            lo, hi = min(lo, s.min), max(hi, s.max)
+        stop_key = s.stop_key
+        count += s.count
+        total += s.sum
+    return Summary(start_key, stop_key, count, total, lo, hi)
+
+
+def summarize(keys: Sequence, values: Sequence) -> Summary:
+    """Summary of raw values"""
+    if not values:
+        return EMPTY_SUMMARY
+    return Summary(keys[0], keys[-1], len(values), sum(values), min(values), max(values))
+
+
+class _Level:
+    """Block summaries of one block size: lists of
+    [start_key, stop_key, count, sum, min, max], updated in place"""
+
+    __slots__ = ('block_size', 'blocks', 'first_block')
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.blocks = deque()
+        self.first_block = 0  # block number of blocks[0]
+
+    def add(self, seq, key, value):
+        b = seq // self.block_size
+        if not self.blocks or b >= self.first_block + len(self.blocks):
+            if not self.blocks:
+                self.first_block = b
+            self.blocks.append([key, key, 1, value, value, value])
+        else:
+            block = self.blocks[-1]
+            block[1] = key
+            block[2] += 1
+            block[3] += value
+            if value < block[4]:
+                block[4] = value
+            if value > block[5]:
+                block[5] = value
+
+    def evict(self, head_seq):
+        """Drop the blocks whose items all have a sequence number below head_seq"""
+        n_evicted = head_seq // self.block_size - self.first_block
+        if n_evicted <= 0:
+            return
+        for _ in range(min(n_evicted, len(self.blocks))):
+            self.blocks.popleft()
+        self.first_block += n_evicted
+
+    def summary(self, b):
+        return Summary(*self.blocks[b - self.first_block])
+
+
+class AggregatePyramid:
+    """Block summaries of value(item) at several resolutions, of the items of a sorted
+    deque with sequence numbers.
+
+    sync is to be called by the writer of the deque after each modification, and
+    summary by its readers, under the same lock, or in a consistent read.
+
+    >>> from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+    >>> sd = CircularSortedDeque(maxlen=100)
+    >>> pyramid = AggregatePyramid(float, block_sizes=(4, 16))
+    >>> sd.extend(range(200))
+    >>> pyramid.sync(sd)
+    >>> pyramid.summary(sd, 110, 150)
+    Summary(start_key=110, stop_key=150, count=41, sum=5330.0, min=110.0, max=150.0)
+    >>> [s.count for s in pyramid.summary(sd, 110, 150, resolution=16)]
+    [2, 16, 16, 7]
+    """
+
+    def __init__(
+        self,
+        value: Callable[[Any], float],
+        block_sizes: Sequence[int] = DFLT_BLOCK_SIZES,
+    ):
+        """
+        :param value: function returning the number to summarize of an item
+        :param block_sizes: increasing numbers of items of the blocks of each level,
+            each a multiple of the previous one
+        """
+        block_sizes = tuple(block_sizes)
+        if any(
+            small < 1 or large % small
+            for small, large in zip((1,) + block_sizes, block_sizes)
+        ):
+            raise ValueError(
+                f'block_sizes must be increasing multiples of each other: {block_sizes}'
+            )
+        self.value = value
+        self.levels = [_Level(block_size) for block_size in block_sizes]
+        self.next_seq = None  # sequence number of the next item to add
+
+    @property
+    def resolutions(self):
+        """Numbers of items a summary can be broken down by"""
+        return (1,) + tuple(level.block_size for level in self.levels)
+
+    def sync(self, sd):
+        """Add the items appended to the sorted deque sd and evict those dropped from it
+        since the last call"""
+        head_seq, size = sd.head_seq, len(sd)
+        if self.next_seq is None:
+            self.next_seq = head_seq
+        elif head_seq > self.next_seq:
+            # items were dropped before they were added, i.e. by an extend of more than
+            # maxlen items: evict every block before them so blocks stay at their number
+            for level in self.levels:
+                level.evict(head_seq)
+            self.next_seq = head_seq
+        i = max(self.next_seq - head_seq, 0)
+        if i < size:
+            key, value = sd.key, self.value
+            for seq, item in enumerate(sd.range_by_index(i, size), head_seq + i):
+                k, v = key(item), value(item)
+                for level in self.levels:
+                    level.add(seq, k, v)
+        self.next_seq = head_seq + size
+        for level in self.levels:
+            level.evict(head_seq)
+
+    def summary(self, sd, start, stop, resolution=None):
+        """Summary of the items of sd with keys from start to stop, inclusive.
+
+        :param sd: the sorted deque kept in sync with sync
+        :param start: key of the first item
+        :param stop: key of the last item
+        :param resolution: None for a single Summary, or one of resolutions for a list of
+            the summaries of the blocks of that many items in the key range
+        """
+        lo = sd.head_seq + sd.index_ge(start)
+        hi = sd.head_seq + sd.index_gt(stop)
+        if resolution is None:
+            return self._summary(sd, lo, hi, len(self.levels))
+        if resolution not in self.resolutions:
+            raise ValueError(
+                f'resolution must be None or one of {self.resolutions}: {resolution}'
+            )
+        n_levels = self.resolutions.index(resolution)
+        summaries = []
+        for b in range(lo // resolution, -(-hi // resolution)):
+            b_lo, b_hi = max(lo, b * resolution), min(hi, (b + 1) * resolution)
+            summaries.append(self._summary(sd, b_lo, b_hi, n_levels))
+        return summaries
+
+    def _summary(self, sd, lo, hi, n_levels):
+        """Summary of the items of sequence numbers lo to hi - 1, from the blocks of the
+        first n_levels levels and items of sd"""
+        if lo >= hi:
+            return EMPTY_SUMMARY
+        if n_levels == 0:
+            items = sd.range_by_index(lo - sd.head_seq, hi - sd.head_seq)
+            return summarize(list(map(sd.key, items)), list(map(self.value, items)))
+        level = self.levels[n_levels - 1]
+        size = level.block_size
+        b_lo, b_hi = -(-lo // size), hi // size  # the blocks inside lo to hi
+        if b_lo >= b_hi:
+            return self._summary(sd, lo, hi, n_levels - 1)
+        return combine_summaries(
+            [
+                self._summary(sd, lo, b_lo * size, n_levels - 1),
+                *map(level.summary, range(b_lo, b_hi)),
+                self._summary(sd, b_hi * size, hi, n_levels - 1),
+            ]
+        )
@@ -0,0 +1,459 @@
+"""Array-backed circular deque sorted by a key function."""
+from bisect import bisect_left, bisect_right
+
+from stream2py.utility.sorted_deque import (
+    _NO_KEY,
+    SortedDeque,
+    _validate_extension_keys,
+)
+
+_MIN_CAPACITY = 8
+
+
+class CircularSortedDeque(SortedDeque):
+    """Drop-in replacement of SortedDeque backed by a ring buffer.
+
+    Keys and items are kept in two fixed capacity lists with a logical head offset, so
+    positional access is O(1) and key searches are true O(log n) bisections, whereas
+    indexing a ``collections.deque`` costs O(n/64). When the ring wraps around, the
+    logical sequence is made of two sorted segments of the underlying lists and a
+    bisection only needs to pick which segment to search.
+
+    The capacity grows by doubling up to maxlen. Once maxlen is reached, appending
+    overwrites the oldest item.
+
+    >>> from operator import itemgetter
+    >>> sd = CircularSortedDeque(((i, f'data_{i}') for i in range(5)),
+    ...     key=itemgetter(0), maxlen=5)
+    >>> for i in range(5, 8):
+    ...     sd.append((i, f'data_{i}'))
+    >>> list(sd)
+    [(3, 'data_3'), (4, 'data_4'), (5, 'data_5'), (6, 'data_6'), (7, 'data_7')]
+    >>> sd[0], sd[-1]
+    ((3, 'data_3'), (7, 'data_7'))
+    >>> sd.find_gt(4)
+    (5, 'data_5')
+    >>> sd.range(4, 6)
+    [(4, 'data_4'), (5, 'data_5'), (6, 'data_6')]
+    >>> sd.index((6, 'data_6'))
+    3
+    >>> sd.drop(2)
+    >>> list(sd)
+    [(5, 'data_5'), (6, 'data_6'), (7, 'data_7')]
+    """
+
+    def __init__(self, iterable=(), key=None, maxlen=None):
+        self._given_key = key
+        key = (lambda x: x) if key is None else key
+        decorated = sorted((key(item), item) for item in iterable)
+        if maxlen is not None:
+            decorated = decorated[max(len(decorated) - maxlen, 0) :] if maxlen else []
+        self._key = key
+        self._maxlen = maxlen
+        self._size = len(decorated)
+        self._head = 0
+        self._head_seq = 0
+        self._capacity = self._initial_capacity(self._size, maxlen)
+        padding = [None] * (self._capacity - self._size)
+        self._key_ring = [k for k, item in decorated] + padding
+        self._item_ring = [item for k, item in decorated] + padding
+
+    @staticmethod
+    def _initial_capacity(size, maxlen):
+        capacity = max(size, _MIN_CAPACITY)
+        if maxlen is not None:
+            capacity = min(capacity, maxlen)
+        return capacity
+
+    # ---------------------------  ring helpers  -----------------------------------
+
+    def _linear(self, ring, start=0, stop=None):
+        """Return the list of ring values between logical indices start and stop.
+        Indices are expected to be already clipped to 0 <= start <= stop <= len(self)"""
+        if stop is None:
+            stop = self._size
+        cap = self._capacity
+        phys_start = self._head + start
+        phys_stop = self._head + stop
+        if phys_stop <= cap:
+            return ring[phys_start:phys_stop]
+        if phys_start >= cap:
+            return ring[phys_start - cap : phys_stop - cap]
+        return ring[phys_start:] + ring[: phys_stop - cap]
+
+    def _grow(self):
+        """Double the capacity (bounded by maxlen), unwrapping the ring at index 0"""
+        new_capacity = self._capacity * 2 if self._capacity else _MIN_CAPACITY
+        if self._maxlen is not None:
+            new_capacity = min(new_capacity, self._maxlen)
+        padding = [None] * (new_capacity - self._size)
+        self._key_ring = self._linear(self._key_ring) + padding
+        self._item_ring = self._linear(self._item_ring) + padding
+        self._head = 0
+        self._capacity = new_capacity
+
+    def _bisect_left(self, k):
+        """Logical index of the first key >= k"""
+        keys, head, cap = self._key_ring, self._head, self._capacity
+        end = head + self._size
+        if end <= cap:
+            return bisect_left(keys, k, head, end) - head
+        if keys[cap - 1] >= k:
+            return bisect_left(keys, k, head, cap) - head
+        return cap - head + bisect_left(keys, k, 0, end - cap)
+
+    def _bisect_right(self, k):
+        """Logical index of the first key > k"""
+        keys, head, cap = self._key_ring, self._head, self._capacity
+        end = head + self._size
+        if end <= cap:
+            return bisect_right(keys, k, head, end) - head
+        if keys[cap - 1] > k:
+            return bisect_right(keys, k, head, cap) - head
+        return cap - head + bisect_right(keys, k, 0, end - cap)
+
+    def _item_at(self, i):
+        """Item at logical index i, assuming 0 <= i < len(self)"""
+        i += self._head
+        if i >= self._capacity:
+            i -= self._capacity
+        return self._item_ring[i]
+
+    def _key_at(self, i):
+        """Key at logical index i, assuming 0 <= i < len(self)"""
+        i += self._head
+        if i >= self._capacity:
+            i -= self._capacity
+        return self._key_ring[i]
+
+    # ---------------------------  SortedDeque interface  --------------------------
+
+    def to_jdict(self):
+        """The arguments to make a copy of the deque with from_jdict. The items and key
+        are returned as they are: they are only JSON serializable if they already are.
+
+        >>> sd = CircularSortedDeque([3, 1, 2], maxlen=4)
+        >>> sd.to_jdict()
+        {'iterable': [1, 2, 3], 'key': None, 'maxlen': 4}
+        >>> CircularSortedDeque.from_jdict(sd.to_jdict())
+        CircularSortedDeque([1, 2, 3], key=None, maxlen=4)
+        """
+        return {
+            'iterable': self._linear(self._item_ring),
+            'key': self._given_key,
+            'maxlen': self._maxlen,
+        }
+
+    def _getkey(self):
+        return self._key
+
+    def _setkey(self, key):
+        if key is not self._key:
+            self.__init__(self._linear(self._item_ring), key=key, maxlen=self._maxlen)
+
+    def _delkey(self):
+        self._setkey(None)
+
+    key = property(_getkey, _setkey, _delkey, 'key function')
+
+    def _getmaxlen(self):
+        return self._maxlen
+
+    def _setmaxlen(self, maxlen):
+        if maxlen is not self._maxlen:
+            head_seq, n = self._head_seq, self._size
+            self.__init__(self._linear(self._item_ring), key=self._key, maxlen=maxlen)
+            self._head_seq = head_seq + n - self._size
+
+    def _delmaxlen(self):
+        self._setmaxlen(None)
+
+    maxlen = property(_getmaxlen, _setmaxlen, _delmaxlen, 'maxlen function')
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._size)
+            if step == 1:
+                return self._linear(self._item_ring, start, max(start, stop))
+            return [self._item_at(j) for j in range(start, stop, step)]
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('deque index out of range')
+        return self._item_at(i)
+
+    def __iter__(self):
+        return iter(self._linear(self._item_ring))
+
+    def __reversed__(self):
+        return reversed(self._linear(self._item_ring))
+
+    def __repr__(self):
+        return '%s(%r, key=%s, maxlen=%s)' % (
+            self.__class__.__name__,
+            self._linear(self._item_ring),
+            getattr(self._given_key, '__name__', repr(self._given_key)),
+            getattr(self._maxlen, '__name__', repr(self._maxlen)),
+        )
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self._linear(self._item_ring), self._given_key, self._maxlen),
+        )
+
+    def __contains__(self, item):
+        k = self._key(item)
+        i = self._bisect_left(k)
+        j = self._bisect_right(k)
+        return item in self._linear(self._item_ring, i, j)
+
+    def index(self, item):
+        """Find the position of an item.  Raise ValueError if not found."""
+        k = self._key(item)
+        i = self._bisect_left(k)
+        j = self._bisect_right(k)
+        for idx in range(i, j):
+            if self._item_at(idx) == item:
+                return idx
+        raise ValueError('%r is not in deque' % (item,))
+
+    def count(self, item):
+        """Return number of occurrences of item"""
+        k = self._key(item)
+        i = self._bisect_left(k)
+        j = self._bisect_right(k)
+        return self._linear(self._item_ring, i, j).count(item)
+
+    def _insert_at(self, i, k, item):
+        if self._maxlen is not None and self._size >= self._maxlen:
+            raise IndexError('deque already at its maximum size')
+        keys = self._linear(self._key_ring)
+        items = self._linear(self._item_ring)
+        keys.insert(i, k)
+        items.insert(i, item)
+        self._reset_rings(keys, items)
+
+    def _reset_rings(self, keys, items):
+        self._size = len(items)
+        self._head = 0
+        self._capacity = self._initial_capacity(self._size, self._maxlen)
+        padding = [None] * (self._capacity - self._size)
+        self._key_ring = keys + padding
+        self._item_ring = items + padding
+
+    def insert(self, item):
+        """Insert a new item.  If equal keys are found, add to the left.
+        O(n): prefer append when the item is known to be the last."""
+        k = self._key(item)
+        self._insert_at(self._bisect_left(k), k, item)
+
+    def insert_right(self, item):
+        """Insert a new item.  If equal keys are found, add to the right.
+        O(n): prefer append when the item is known to be the last."""
+        k = self._key(item)
+        self._insert_at(self._bisect_right(k), k, item)
+
+    def remove(self, item):
+        """Remove first occurence of item.  Raise ValueError if not found"""
+        i = self.index(item)
+        keys = self._linear(self._key_ring)
+        items = self._linear(self._item_ring)
+        del keys[i]
+        del items[i]
+        self._reset_rings(keys, items)
+
+    def find(self, k):
+        """Return first item with a key == k.  Raise ValueError if not found."""
+        i = self._bisect_left(k)
+        if i != self._size and self._key_at(i) == k:
+            return self._item_at(i)
+        raise ValueError('No item found with key equal to: %r' % (k,))
+
+    def find_le(self, k):
+        """Return last item with a key <= k.  Raise ValueError if not found."""
+        i = self._bisect_right(k)
+        if i:
+            return self._item_at(i - 1)
+        raise ValueError('No item found with key at or below: %r' % (k,))
+
+    def find_lt(self, k):
+        """Return last item with a key < k.  Raise ValueError if not found."""
+        i = self._bisect_left(k)
+        if i:
+            return self._item_at(i - 1)
+        raise ValueError('No item found with key below: %r' % (k,))
+
+    def find_ge(self, k):
+        """Return first item with a key >= equal to k.  Raise ValueError if not found"""
+        i = self._bisect_left(k)
+        if i != self._size:
+            return self._item_at(i)
+        raise ValueError('No item found with key at or above: %r' % (k,))
+
+    def find_gt(self, k):
+        """Return first item with a key > k.  Raise ValueError if not found"""
+        i = self._bisect_right(k)
+        if i != self._size:
+            return self._item_at(i)
+        raise ValueError('No item found with key above: %r' % (k,))
+
+    def append(self, item):
+        """Append item to the end and maintain key indexing.
+        Raise ValueError if item key is not greater than last item key.
+
+        :param item: item to append
+        :return: None
+        """
+        k = self._key(item)
+        if self._size and not k > self._key_at(self._size - 1):
+            raise ValueError(
+                'Item key must be greater than last item key to append: %r' % (k,)
+            )
+        if self._maxlen == 0:
+            self._head_seq += 1
+            return
+        if self._size == self._capacity:
+            if self._maxlen is None or self._capacity < self._maxlen:
+                self._grow()
+            else:  # full: overwrite the oldest item
+                self._key_ring[self._head] = k
+                self._item_ring[self._head] = item
+                self._head += 1
+                if self._head == self._capacity:
+                    self._head = 0
+                self._head_seq += 1
+                return
+        i = self._head + self._size
+        if i >= self._capacity:
+            i -= self._capacity
+        self._key_ring[i] = k
+        self._item_ring[i] = item
+        self._size += 1
+
+    def extend(self, items):
+        """Append items to the end and maintain key indexing.
+        Raise ValueError, leaving the deque unchanged, if item keys are not strictly
+        increasing and greater than last item key.
+
+        Keys are validated in one pass and written to the ring with at most two slice
+        assignments per list.
+
+        :param items: iterable of items to append
+        :return: None
+        """
+        items = list(items)
+        keys = list(map(self._key, items))
+        last_key = self._key_at(self._size - 1) if self._size else _NO_KEY
+        _validate_extension_keys(last_key, keys)
+        m, maxlen = len(items), self._maxlen
+        if maxlen is not None and m >= maxlen:
+            dropped = self._size + m - maxlen
+            self._reset_rings(keys[m - maxlen :], items[m - maxlen :])
+            self._head_seq += dropped
+            return
+        needed = self._size + m
+        while needed > self._capacity and (maxlen is None or self._capacity < maxlen):
+            self._grow()
+        cap = self._capacity
+        start = self._head + self._size
+        if start >= cap:
+            start -= cap
+        first = min(m, cap - start)
+        self._key_ring[start : start + first] = keys[:first]
+        self._item_ring[start : start + first] = items[:first]
+        self._key_ring[: m - first] = keys[first:]
+        self._item_ring[: m - first] = items[first:]
+        overflow = max(needed - cap, 0)  # oldest items that were overwritten
+        self._head = (self._head + overflow) % cap
+        self._size = needed - overflow
+        self._head_seq += overflow
+
+    def range(self, start, stop, step=None):
+        """Return list of items within start and stop key range.
+
+        :param start: starting key
+        :param stop: stopping key
+        :param step:
+        :return: list with items in range
+        """
+        i = self._bisect_left(start)
+        j = self._bisect_right(stop)
+        return self.range_by_index(i, j, step)
+
+    def range_by_index(self, start_index, stop_index, step=None):
+        """Return list of items within start and stop index range.
+
+        :param start_index: starting index
+        :param stop_index: stopping index
+        :param step:
+        :return: list with items in range
+        """
+        return self[start_index:stop_index:step]
+
+    def find_last_gt(self, k):
+        """Return last item with a key > k.  Raise ValueError if not found.
+        Basically a tail function with a greater than check"""
+        if self._size and self._key_at(self._size - 1) > k:
+            return self._item_at(self._size - 1)
+        raise ValueError('No item found with key above: %r' % (k,))
+
+    def drop(self, n=1):
+        """Remove n items from the left
+
+        The head offset is moved in O(1). Dropped slots are only cleared, to release
+        their references, by at most two slice assignments per ring.
+
+        :param n:
+        :return:
+        """
+        if n > self._size:
+            raise IndexError('drop from an empty deque')
+        if n <= 0:
+            return
+        cap = self._capacity
+        start, stop = self._head, self._head + n
+        if stop <= cap:
+            self._key_ring[start:stop] = self._item_ring[start:stop] = [None] * n
+        else:
+            self._key_ring[start:] = self._item_ring[start:] = [None] * (cap - start)
+            stop -= cap
+            self._key_ring[:stop] = self._item_ring[:stop] = [None] * stop
+        self._head = stop if stop < cap else 0
+        self._size -= n
+        self._head_seq += n
+
+    def drop_until(self, k):
+        """Remove all items with a key < k from the left, i.e. keep items from key k on.
+        Only one bisection is needed to find how many items to drop.
+
+        :param k: key of the first item to keep
+        :return: number of items dropped
+        """
+        n = self._bisect_left(k)
+        self.drop(n)
+        return n
+
+    def key_at(self, i):
+        """Return the key of the item at index i.  Raise IndexError if out of range."""
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('deque index out of range')
+        return self._key_at(i)
+
+    def seq_le(self, k):
+        """Return the sequence number of the last item with a key <= k,
+        or head_seq - 1 if there is no such item."""
+        return self._head_seq + self._bisect_right(k) - 1
+
+    def index_ge(self, k):
+        """Return the index of the first item with a key >= k, len(self) if none."""
+        return self._bisect_left(k)
+
+    def index_gt(self, k):
+        """Return the index of the first item with a key > k, len(self) if none."""
+        return self._bisect_right(k)
@@ -0,0 +1,94 @@
+"""Locks with the reader-writer interface of RWLock, selectable by policy name.
+
+All locks have the ``reader_acquire``, ``reader_release``, ``writer_acquire`` and
+``writer_release`` methods of ``RWLock``, so they can be used interchangeably by
+``RWLockSortedDeque``.
+
+>>> sorted(LOCK_POLICIES)
+['mutex', 'optimistic', 'reader_priority', 'writer_priority']
+>>> lock, optimistic_reads = mk_lock('reader_priority')
+>>> type(lock).__name__, optimistic_reads
+('ReaderPriorityRWLock', False)
+"""
+import threading
+from typing import Callable, Tuple, Union
+
+from stream2py.utility.reader_writer_lock import RWLock, _LightSwitch
+
+
+class ReaderPriorityRWLock:
+    """Solution of the first readers-writers problem: readers never wait for each
+    other, nor for a waiting writer, as long as some reader is inside. Readers are not
+    serialized by a queue lock as with RWLock, but writers can starve under constant
+    reading.
+
+    See [1, sec. 4.2.2] in RWLock sources.
+    """
+
+    def __init__(self):
+        self.__read_switch = _LightSwitch()
+        self.__room_empty = threading.Lock()
+
+    def reader_acquire(self):
+        self.__read_switch.acquire(self.__room_empty)
+
+    def reader_release(self):
+        self.__read_switch.release(self.__room_empty)
+
+    def writer_acquire(self):
+        self.__room_empty.acquire()
+
+    def writer_release(self):
+        self.__room_empty.release()
+
+
+class MutexRWLock:
+    """A plain mutex behind the reader-writer interface: readers exclude each other
+    too, but acquiring is a single lock operation."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+
+    def reader_acquire(self):
+        self.__lock.acquire()
+
+    def reader_release(self):
+        self.__lock.release()
+
+    def writer_acquire(self):
+        self.__lock.acquire()
+
+    def writer_release(self):
+        self.__lock.release()
+
+
+# policy name -> (lock factory, whether reads are optimistic by default)
+LOCK_POLICIES = {
+    'writer_priority': (RWLock, False),
+    'reader_priority': (ReaderPriorityRWLock, False),
+    'mutex': (MutexRWLock, False),
+    # readers do not lock, unless they fail to get a consistent read a few times
+    'optimistic': (RWLock, True),
+}
+DFLT_LOCK_POLICY = 'writer_priority'
+
+LockPolicy = Union[str, Callable[[], RWLock]]
+
+
+def mk_lock(lock_policy: LockPolicy = DFLT_LOCK_POLICY) -> Tuple[RWLock, bool]:
+    """Return a lock and whether reads should be optimistic for a lock policy.
+
+    :param lock_policy: a key of LOCK_POLICIES, or a factory of objects with the
+        reader-writer interface of RWLock
+    :return: (lock, optimistic_reads) tuple
+    """
+    if callable(lock_policy):
+        return lock_policy(), False
+    try:
+        lock_factory, optimistic_reads = LOCK_POLICIES[lock_policy]
+    except KeyError:
+        raise ValueError(
+            f'Unknown lock_policy: {lock_policy!r}. Should be one of '
+            f'{sorted(LOCK_POLICIES)} or a lock factory'
+        )
+    return lock_factory(), optimistic_reads
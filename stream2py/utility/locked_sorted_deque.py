@@ -1,12 +1,16 @@
 """Sorted Deque that handles Reader-Writer Priority"""
-from contextlib import contextmanager
-from typing import Generator
+import threading
+from contextlib import contextmanager, suppress
+from typing import Callable, Generator, Optional, TypeVar
 
-from stream2py.utility.reader_writer_lock import RWLock
+from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+from stream2py.utility.lock_policies import DFLT_LOCK_POLICY, LockPolicy, mk_lock
 from stream2py.utility.sorted_deque import SortedDeque
 
+T = TypeVar('T')
 
-class RWLockSortedDeque(RWLock):
+
+class RWLockSortedDeque:
     """
     >>> import operator
     >>> locked_deque = RWLockSortedDeque(
@@ -24,19 +28,138 @@ class RWLockSortedDeque(RWLock):
     ...     print(reader.find_gt(('plc', 90, 99)))
     ...
     (('plc', 100000, 100000), 'new data')
+
+    With ``optimistic_reads=True``, ``consistent_read`` does not take the reader lock.
+    Like a seqlock, it snapshots a version counter that writers bump when they take and
+    release the writer lock. It then reads, and retries if the version changed meanwhile.
+
+    >>> locked_deque = RWLockSortedDeque(range(5), maxlen=5, optimistic_reads=True)
+    >>> locked_deque.consistent_read(lambda reader: reader.find_gt(2))
+    3
+
+    The lock itself is chosen with ``lock_policy``, one of the keys of
+    ``stream2py.utility.lock_policies.LOCK_POLICIES``: 'writer_priority' (default),
+    'reader_priority', 'mutex' or 'optimistic' (writer priority with optimistic reads).
+
+    >>> locked_deque = RWLockSortedDeque(range(5), lock_policy='optimistic')
+    >>> locked_deque.lock_policy, locked_deque.optimistic_reads
+    ('optimistic', True)
     """
 
-    def __init__(self, iterable=(), *, key=None, maxlen=None):
-        RWLock.__init__(self)
-        self._sorted_deque = SortedDeque(iterable, key, maxlen)
+    sorted_deque_cls = CircularSortedDeque
+    optimistic_read_retries = 3  # before falling back to the reader lock
+
+    def __init__(
+        self,
+        iterable=(),
+        *,
+        key=None,
+        maxlen=None,
+        lock_policy: LockPolicy = DFLT_LOCK_POLICY,
+        optimistic_reads: Optional[bool] = None,
+    ):
+        """
+        :param iterable: initial items
+        :param key: sort key function
+        :param maxlen: max number of items, None for unbounded
+        :param lock_policy: name of a lock policy or factory of RWLock-like objects
+        :param optimistic_reads: whether consistent_read avoids the reader lock.
+            None to use the default of the lock policy.
+        """
+        self.lock_policy = lock_policy
+        self._lock, policy_optimistic_reads = mk_lock(lock_policy)
+        self._sorted_deque = self.sorted_deque_cls(iterable, key, maxlen)
+        self._data_condition = threading.Condition(threading.Lock())
+        self._async_waiters = {}  # event loop -> futures to resolve on notification
+        self._version = 0  # odd while a writer holds the lock
+        if optimistic_reads is None:
+            optimistic_reads = policy_optimistic_reads
+        self.optimistic_reads = optimistic_reads
 
     def __len__(self):
         return len(self._sorted_deque)
 
+    def reader_acquire(self):
+        self._lock.reader_acquire()
+
+    def reader_release(self):
+        self._lock.reader_release()
+
+    def writer_acquire(self):
+        self._lock.writer_acquire()
+
+    def writer_release(self):
+        self._lock.writer_release()
+
     @property
     def key(self):
         return self._sorted_deque.key
 
+    @property
+    def next_seq(self):
+        """Sequence number the next appended item will get. Read without locking, so
+        only meant as a hint of whether new data arrived"""
+        return self._sorted_deque.next_seq
+
+    def notify_readers(self):
+        """Wake up every thread waiting in wait_for and resolve every future added with
+        add_async_waiter. Futures are resolved in their own event loop, with one
+        call_soon_threadsafe per loop whatever the number of futures."""
+        with self._data_condition:
+            self._data_condition.notify_all()
+            if not self._async_waiters:
+                return
+            async_waiters, self._async_waiters = self._async_waiters, {}
+        for loop, futures in async_waiters.items():
+            with suppress(RuntimeError):  # RuntimeError: Event loop is closed
+                loop.call_soon_threadsafe(_resolve_futures, futures)
+
+    def add_async_waiter(self, loop, future):
+        """Have future, of event loop, resolved at the next notify_readers call"""
+        with self._data_condition:
+            self._async_waiters.setdefault(loop, []).append(future)
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: Optional[float] = None):
+        """Block until predicate() is true, re-checking it whenever notify_readers is
+        called, or until timeout seconds have passed.
+
+        :return: the last value of predicate()
+        """
+        with self._data_condition:
+            return self._data_condition.wait_for(predicate, timeout)
+
+    def extend(self, items):
+        """Append a batch of items, taking the writer lock only once"""
+        with self.writer_lock() as writer:
+            writer.extend(items)
+
+    def consistent_read(self, func: Callable[[SortedDeque], T]) -> T:
+        """Return func(sorted_deque) computed on a state of the deque no writer modified.
+
+        func must not have side effects: with optimistic_reads, it may be called on a
+        deque being modified, in which case its result, or exception, is discarded and
+        it is called again. After optimistic_read_retries failed attempts, or without
+        optimistic_reads, func is called under the reader lock.
+
+        Optimistic reads rely on a single writer at a time, which the writer lock
+        guarantees, and on the interpreter lock making each attribute read atomic.
+        """
+        if self.optimistic_reads:
+            for _ in range(self.optimistic_read_retries):
+                version = self._version
+                if version & 1:  # a writer is in the middle of a write
+                    continue
+                try:
+                    result = func(self._sorted_deque)
+                except Exception:
+                    if self._version == version:
+                        raise
+                    continue
+                if self._version == version:
+                    return result
+        with self.reader_lock() as reader:
+            return func(reader)
+
     @contextmanager
     def reader_lock(self) -> Generator[SortedDeque, None, None]:
         try:
@@ -47,8 +170,16 @@ class RWLockSortedDeque(RWLock):
 
     @contextmanager
     def writer_lock(self):
+        self.writer_acquire()
+        self._version += 1
         try:
-            self.writer_acquire()
             yield self._sorted_deque
         finally:
+            self._version += 1
             self.writer_release()
+
+
+def _resolve_futures(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
@@ -0,0 +1,144 @@
+"""Rolling statistics (count, sum, mean, variance, min, max) of the values of the last items of a
+buffer, updated in O(1) amortized time as items are appended and dropped, whatever the size of the
+window, so that consumers checking thresholds do not reduce a range of items on every tick.
+
+Removing a value from the running sum and variance accumulates rounding errors, which are
+unbounded over a long stream whose values change of scale. They are reset by recomputing the sum
+and variance from the values of the window once as many values were removed as it holds.
+"""
+from collections import deque
+from typing import Any, Callable, NamedTuple, Optional
+
+
+class Stats(NamedTuple):
+    """Statistics of the values of the items of a window. var is the population variance."""
+
+    count: int
+    sum: float
+    mean: Optional[float]
+    var: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+
+
+class RollingStats:
+    """Statistics of value(item) of the last window items of a sorted deque with sequence
+    numbers, or of all its items if window is None. Items dropped from the deque leave
+    the window too.
+
+    sync is to be called by the writer of the deque after each modification, and stats by
+    its readers, under the same lock, or in a consistent read. RollingStats made by
+    StreamBuffer.rolling_stats do both.
+
+    >>> from stream2py.utility.circular_sorted_deque import CircularSortedDeque
+    >>> sd = CircularSortedDeque(key=lambda x: x[0], maxlen=100)
+    >>> rolling = RollingStats(lambda x: x[1], window=4)
+    >>> sd.extend(enumerate([5, 1, 3, 8, 6, 2]))
+    >>> rolling.sync(sd)
+    >>> rolling.stats()
+    Stats(count=4, sum=19, mean=4.75, var=5.6875, min=2, max=8)
+    """
+
+    def __init__(
+        self, value: Callable[[Any], float], window: Optional[int] = None, *, lock=None
+    ):
+        """
+        :param value: function returning the number of an item
+        :param window: number of last items, None for every item of the deque
+        :param lock: an RWLockSortedDeque whose consistent_read makes stats consistent
+            with the writes of the deque
+        """
+        if window is not None and window < 1:
+            raise ValueError(f'window must be None or positive: {window}')
+        self.value = value
+        self.window = window
+        self._lock = lock
+        self._clear(first_seq=None)
+
+    def _clear(self, first_seq):
+        self._values = deque()  # values of the window, oldest first
+        self._first_seq = first_seq  # sequence number of _values[0]
+        self._sum = 0
+        self._mean = 0.0  # Welford's running mean and sum of squared deviations
+        self._m2 = 0.0
+        self._n_removed = 0  # values removed since the sum and variance were computed
+        self._mins = deque()  # (seq, value) with increasing values: min is _mins[0]
+        self._maxs = deque()  # (seq, value) with decreasing values: max is _maxs[0]
+
+    @property
+    def _next_seq(self):
+        return self._first_seq + len(self._values)
+
+    def _add(self, seq, x):
+        self._values.append(x)
+        self._sum += x
+        delta = x - self._mean
+        self._mean += delta / len(self._values)
+        self._m2 += delta * (x - self._mean)
+        while self._mins and self._mins[-1][1] >= x:
+            self._mins.pop()
+        self._mins.append((seq, x))
+        while self._maxs and self._maxs[-1][1] <= x:
+            self._maxs.pop()
+        self._maxs.append((seq, x))
+
+    def _remove_first(self):
+        x = self._values.popleft()
+        seq = self._first_seq
+        self._first_seq += 1
+        self._sum -= x
+        n = len(self._values)
+        if n == 0:
+            self._mean = self._m2 = 0.0
+        else:
+            delta = x - self._mean
+            self._mean -= delta / n
+            self._m2 -= delta * (x - self._mean)
+        if self._mins[0][0] == seq:
+            self._mins.popleft()
+        if self._maxs[0][0] == seq:
+            self._maxs.popleft()
+        self._n_removed += 1
+        if self._n_removed >= n:
+            self._recompute()
+
+    def _recompute(self):
+        """Compute the sum and variance from the values of the window, without the
+        rounding errors of the removals"""
+        values, n = self._values, len(self._values)
+        self._sum = sum(values)
+        self._mean = self._sum / n if n else 0.0
+        self._m2 = sum((x - self._mean) ** 2 for x in values)
+        self._n_removed = 0
+
+    def sync(self, sd):
+        """Add the items appended to the sorted deque sd and remove those dropped from it,
+        or out of the window, since the last call"""
+        head_seq, next_seq = sd.head_seq, sd.head_seq + len(sd)
+        first_seq = head_seq
+        if self.window is not None:
+            first_seq = max(first_seq, next_seq - self.window)
+        if self._first_seq is None or first_seq >= self._next_seq:
+            self._clear(first_seq)  # no value of the window is left
+        else:
+            while self._first_seq < first_seq:
+                self._remove_first()
+        start = self._next_seq
+        if start < next_seq:
+            items = sd.range_by_index(start - head_seq, next_seq - head_seq)
+            for seq, item in enumerate(items, start):
+                self._add(seq, self.value(item))
+
+    def _stats(self) -> Stats:
+        n = len(self._values)
+        if not n:
+            return Stats(0, 0, None, None, None, None)
+        var = max(self._m2, 0.0) / n
+        return Stats(n, self._sum, self._mean, var, self._mins[0][1], self._maxs[0][1])
+
+    def stats(self) -> Stats:
+        """Statistics of the values of the window, consistent with the writes of the
+        deque if a lock was given"""
+        if self._lock is None:
+            return self._stats()
+        return self._lock.consistent_read(lambda _: self._stats())
@@ -0,0 +1,518 @@
+"""A ring buffer of keyed byte records in ``multiprocessing.shared_memory``.
+
+One process creates the ring and writes (key, payload) records to it. Any process can
+attach to it by name and read them with a BufferReader, which slices the payload bytes
+out of the shared memory instead of unpickling them.
+
+>>> ring = SharedMemoryRing.create(capacity=3, record_size=8)
+>>> ring.extend([(10, b'a'), (20, b'bb'), (30, b'ccc'), (40, b'dddd')])
+>>> other = SharedMemoryRing.attach(ring.name)  # i.e. in another process
+>>> other.consistent_read(lambda reader: list(reader))
+[(20, b'bb'), (30, b'ccc'), (40, b'dddd')]
+>>> other.consistent_read(lambda reader: (reader.head_seq, reader.find_le(35)))
+(1, (30, b'ccc'))
+>>> other.close()
+>>> ring.close()
+>>> ring.unlink()
+
+The layout is a header, the info of the source as JSON, and three rings of capacity
+slots: keys, payload lengths and payloads of at most record_size bytes. The record of
+sequence number s is in slot ``s % capacity``, so the header only has to hold the
+sequence numbers of the first and next records.
+
+Like ``RWLockSortedDeque.consistent_read`` with optimistic reads, readers snapshot a
+version counter that the writer makes odd while writing, read, and retry if the
+version changed. Readers never lock, so they cannot slow the writer down, but there
+must be a single writing process. A reader waiting longer than max_write_time_s for a
+write to end raises a TimeoutError, since the writer may have died in the middle of it.
+"""
+import json
+import operator
+import struct
+import threading
+import time
+from array import array
+from contextlib import contextmanager, suppress
+from multiprocessing import shared_memory
+from typing import Any, Callable, Iterable, Optional, Tuple, TypeVar
+
+from stream2py.utility.locked_sorted_deque import _resolve_futures
+from stream2py.utility.sorted_deque import _NO_KEY, _validate_extension_keys
+
+T = TypeVar('T')
+
+_MAGIC = b'S2PY'
+_LAYOUT = struct.Struct('<4sqqcxxxq')  # magic, capacity, record_size, key_format, info_size
+_STATE_OFFSET = 64
+# int64 fields of the state
+_VERSION, _HEAD_SEQ, _NEXT_SEQ, _STOPPED, _INFO_LEN = range(5)
+_N_STATE_FIELDS = 5
+_INFO_OFFSET = 128
+DFLT_INFO_SIZE = 4096
+
+record_key = operator.itemgetter(0)
+
+# names of the segments created by this process, which its resource tracker unlinks
+_created_names = set()
+
+
+def _align(n, alignment=8):
+    return -(-n // alignment) * alignment
+
+
+def _offsets(capacity, record_size, info_size):
+    """Offsets of the keys, lengths and data rings, and total size of the segment"""
+    keys_offset = _INFO_OFFSET + _align(info_size)
+    lengths_offset = keys_offset + 8 * capacity
+    data_offset = lengths_offset + 8 * capacity
+    return keys_offset, lengths_offset, data_offset, data_offset + capacity * record_size
+
+
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _created_names:
+            # the resource tracker would unlink the segment when this process exits
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedStopEvent(threading.Event):
+    """The stop flag of a SharedMemoryRing, with the interface of threading.Event so that
+    BufferReaders of any process can check it"""
+
+    def __init__(self, state, name):
+        self._state_view = state
+        self.name = name
+
+    def is_set(self) -> bool:
+        return bool(self._state_view[_STOPPED])
+
+    isSet = is_set
+
+    def set(self):
+        self._state_view[_STOPPED] = 1
+
+    def clear(self):
+        self._state_view[_STOPPED] = 0
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return _poll_until(self.is_set, timeout, SharedMemoryRing.poll_interval_s)
+
+    def __eq__(self, other):
+        return isinstance(other, SharedStopEvent) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.name!r}: {"set" if self.is_set() else "unset"}>'
+
+
+def _poll_until(predicate: Callable[[], bool], timeout, poll_interval_s) -> bool:
+    """Call predicate every poll_interval_s seconds until it is true or timeout seconds
+    passed, and return its last value"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        result = predicate()
+        if result:
+            return result
+        if deadline is None:
+            time.sleep(poll_interval_s)
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return result
+            time.sleep(min(poll_interval_s, remaining))
+
+
+class SharedMemoryRing:
+    """Ring buffer of (key, payload bytes) records in shared memory, with the reading
+    interface of RWLockSortedDeque used by BufferReader.
+
+    Make one with SharedMemoryRing.create or SharedMemoryRing.attach.
+    """
+
+    poll_interval_s = 0.001  # readers of other processes cannot be notified
+    max_write_time_s = 5.0  # time after which readers give up on a write in progress
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        *,
+        from_bytes: Optional[Callable[[bytes], Any]] = None,
+    ):
+        """
+        :param shm: the shared memory segment, laid out by SharedMemoryRing.create
+        :param from_bytes: function applied to payload bytes when reading records
+        """
+        magic, capacity, record_size, key_format, info_size = _LAYOUT.unpack_from(
+            shm.buf
+        )
+        if magic != _MAGIC:
+            raise ValueError(f'{shm.name!r} is not a SharedMemoryRing segment')
+        self._shm = shm
+        self.capacity = capacity
+        self.record_size = record_size
+        self.key_format = key_format.decode()
+        self.info_size = info_size
+        self.from_bytes = from_bytes
+        keys_offset, lengths_offset, data_offset, size = _offsets(
+            capacity, record_size, info_size
+        )
+        buf = shm.buf
+        self._state = buf[_STATE_OFFSET : _STATE_OFFSET + 8 * _N_STATE_FIELDS].cast('q')
+        self._info = buf[_INFO_OFFSET : _INFO_OFFSET + info_size]
+        self._keys = buf[keys_offset:lengths_offset].cast(self.key_format)
+        self._lengths = buf[lengths_offset:data_offset].cast('q')
+        self._data = buf[data_offset:size]
+        self._write_lock = threading.Lock()  # between writing threads of the process
+        self.stop_event = SharedStopEvent(self._state, shm.name)
+
+    @classmethod
+    def create(
+        cls,
+        capacity: int,
+        record_size: int,
+        *,
+        key_format: str = 'q',
+        info_size: int = DFLT_INFO_SIZE,
+        name: Optional[str] = None,
+        from_bytes: Optional[Callable[[bytes], Any]] = None,
+    ) -> 'SharedMemoryRing':
+        """Create a ring in a new shared memory segment
+
+        :param capacity: max number of records, older ones are overwritten
+        :param record_size: max number of bytes of a record payload
+        :param key_format: 'q' for int keys, i.e. timestamps in microseconds, or 'd' for
+            float keys
+        :param info_size: max number of bytes of the JSON source info
+        :param name: name of the segment, None for a random one
+        :param from_bytes: function applied to payload bytes when reading records
+        """
+        if key_format not in ('q', 'd'):
+            raise ValueError(f"key_format should be 'q' or 'd', not {key_format!r}")
+        if capacity < 1 or record_size < 1:
+            raise ValueError('capacity and record_size must be positive')
+        size = _offsets(capacity, record_size, info_size)[-1]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_names.add(shm.name)
+        shm.buf[: _INFO_OFFSET + info_size] = bytes(_INFO_OFFSET + info_size)
+        _LAYOUT.pack_into(
+            shm.buf, 0, _MAGIC, capacity, record_size, key_format.encode(), info_size
+        )
+        return cls(shm, from_bytes=from_bytes)
+
+    @classmethod
+    def attach(
+        cls, name: str, *, from_bytes: Optional[Callable[[bytes], Any]] = None
+    ) -> 'SharedMemoryRing':
+        """Attach to the ring created with SharedMemoryRing.create under name"""
+        return cls(_attach_shared_memory(name), from_bytes=from_bytes)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self):
+        """Release the memory of the segment for this instance"""
+        if self._shm.buf is None:
+            return  # already closed
+        for view in (self._state, self._info, self._keys, self._lengths, self._data):
+            view.release()
+        self._shm.close()
+
+    def __del__(self):
+        with suppress(Exception):
+            self.close()
+
+    def unlink(self):
+        """Destroy the segment once every process closed it. Called by its creator."""
+        self._shm.unlink()
+        _created_names.discard(self._shm.name)
+
+    # reading -----------------------------------------------------------------------
+
+    def __len__(self):
+        return self._state[_NEXT_SEQ] - self._state[_HEAD_SEQ]
+
+    @property
+    def key(self) -> Callable:
+        return record_key
+
+    @property
+    def next_seq(self) -> int:
+        return self._state[_NEXT_SEQ]
+
+    @property
+    def info(self) -> dict:
+        """The source info set with set_info"""
+
+        def _info(reader):
+            return json.loads(bytes(self._info[: self._state[_INFO_LEN]]) or b'{}')
+
+        return self.consistent_read(_info)
+
+    def consistent_read(self, func: Callable[['_RingView'], T]) -> T:
+        """Return func(view) computed on a state of the ring the writer did not modify.
+
+        func must not have side effects: it may be called on a ring being modified, in
+        which case its result, or exception, is discarded and it is called again.
+
+        :raises TimeoutError: if a write lasted more than max_write_time_s seconds
+        """
+        state = self._state
+        write_deadline = None
+        while True:
+            version = state[_VERSION]
+            if version & 1:  # the writer is in the middle of a write
+                now = time.monotonic()
+                if write_deadline is None:
+                    write_deadline = now + self.max_write_time_s
+                elif now > write_deadline:
+                    raise TimeoutError(
+                        f'A write of {self.name!r} lasted more than '
+                        f'{self.max_write_time_s} s: its writer may have died'
+                    )
+                time.sleep(0)
+                continue
+            write_deadline = None
+            view = _RingView(self, state[_HEAD_SEQ], state[_NEXT_SEQ])
+            try:
+                result = func(view)
+            except Exception:
+                if state[_VERSION] == version:
+                    raise
+                continue
+            if state[_VERSION] == version:
+                return result
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: Optional[float] = None):
+        """Block until predicate() is true, polling it every poll_interval_s seconds, or
+        until timeout seconds have passed.
+
+        :return: the last value of predicate()
+        """
+        return _poll_until(predicate, timeout, self.poll_interval_s)
+
+    def add_async_waiter(self, loop, future):
+        """Have future, of event loop, resolved after poll_interval_s seconds"""
+        loop.call_soon_threadsafe(
+            loop.call_later, self.poll_interval_s, _resolve_futures, [future]
+        )
+
+    def notify_readers(self):
+        """Readers poll the ring: nothing to notify"""
+
+    # writing -----------------------------------------------------------------------
+
+    @contextmanager
+    def _writing(self):
+        """Make the version odd while writing. To use with the write lock acquired."""
+        self._state[_VERSION] += 1
+        try:
+            yield
+        finally:
+            self._state[_VERSION] += 1
+
+    def append(self, record: Tuple[Any, bytes]):
+        self.extend([record])
+
+    def extend(self, records: Iterable[Tuple[Any, bytes]]):
+        """Append (key, payload) records with increasing keys. Payloads are bytes-like
+        objects of at most record_size bytes. The batch is rejected as a whole if a key or
+        a payload is invalid: keys are converted to key_format before anything is written.
+        """
+        keys, payloads = [], []
+        for key, payload in records:
+            payload = memoryview(payload).cast('B')
+            if len(payload) > self.record_size:
+                raise ValueError(
+                    f'Payload of {len(payload)} bytes is larger than '
+                    f'record_size={self.record_size}'
+                )
+            keys.append(key)
+            payloads.append(payload)
+        if not keys:
+            return
+        try:
+            keys = array(self.key_format, keys)
+        except (TypeError, OverflowError) as e:
+            raise ValueError(
+                f'Keys must fit key_format={self.key_format!r}: {e}'
+            ) from e
+        capacity, record_size, state = self.capacity, self.record_size, self._state
+        with self._write_lock:
+            head_seq, next_seq = state[_HEAD_SEQ], state[_NEXT_SEQ]
+            if next_seq > head_seq:
+                last_key = self._keys[(next_seq - 1) % capacity]
+            else:
+                last_key = _NO_KEY
+            _validate_extension_keys(last_key, keys)
+            self._write(keys, payloads, head_seq, next_seq)
+
+    def _write(self, keys, payloads, head_seq, next_seq):
+        capacity, record_size, state = self.capacity, self.record_size, self._state
+        with self._writing():
+            n = len(keys)
+            skip = max(n - capacity, 0)  # records overwritten by the same batch
+            for i in range(skip, n):
+                slot = (next_seq + i) % capacity
+                payload = payloads[i]
+                start = slot * record_size
+                self._keys[slot] = keys[i]
+                self._lengths[slot] = len(payload)
+                self._data[start : start + len(payload)] = payload
+            state[_NEXT_SEQ] = next_seq + n
+            state[_HEAD_SEQ] = max(head_seq, next_seq + n - capacity)
+
+    def drop(self, n=1):
+        """Remove the n oldest records"""
+        with self._write_lock:
+            if n > len(self):
+                raise IndexError('drop from an empty deque')
+            if n > 0:
+                with self._writing():
+                    self._state[_HEAD_SEQ] += n
+
+    def drop_until(self, k) -> int:
+        """Remove the records with a key lower than k
+
+        :return: number of records removed
+        """
+        with self._write_lock:
+            state = self._state
+            n = _RingView(self, state[_HEAD_SEQ], state[_NEXT_SEQ])._bisect_left(k)
+            with self._writing():
+                state[_HEAD_SEQ] += n
+            return n
+
+    def set_info(self, info: dict):
+        """Share the source info with readers, as JSON: non-serializable values are
+        converted to strings"""
+        data = json.dumps(info, default=str).encode()
+        if len(data) > self.info_size:
+            raise ValueError(
+                f'Source info of {len(data)} bytes is larger than info_size={self.info_size}'
+            )
+        with self._write_lock, self._writing():
+            self._info[: len(data)] = data
+            self._state[_INFO_LEN] = len(data)
+
+
+class _RingView:
+    """Read only sorted deque view of the records of a SharedMemoryRing between two
+    sequence numbers, which consistent_read passes to BufferReaders"""
+
+    __slots__ = ('_ring', 'head_seq', '_size', '_capacity')
+
+    key = staticmethod(record_key)
+
+    def __init__(self, ring: SharedMemoryRing, head_seq: int, next_seq: int):
+        self._ring = ring
+        self.head_seq = head_seq
+        self._size = max(min(next_seq - head_seq, ring.capacity), 0)
+        self._capacity = ring.capacity
+
+    def __len__(self):
+        return self._size
+
+    def _slot(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('deque index out of range')
+        return (self.head_seq + i) % self._capacity
+
+    def _record(self, slot):
+        ring = self._ring
+        start = slot * ring.record_size
+        payload = bytes(ring._data[start : start + ring._lengths[slot]])
+        if ring.from_bytes is not None:
+            payload = ring.from_bytes(payload)
+        return ring._keys[slot], payload
+
+    def key_at(self, i):
+        return self._ring._keys[self._slot(i)]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.range_by_index(i.start, i.stop, i.step)
+        return self._record(self._slot(i))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._record(self._slot(i))
+
+    def range_by_index(self, start_index, stop_index, step=None):
+        """Return list of records within start and stop index range"""
+        indices = range(*slice(start_index, stop_index, step).indices(self._size))
+        return [self._record(self._slot(i)) for i in indices]
+
+    def _bisect_left(self, k):
+        keys, lo, hi = self._ring._keys, 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[(self.head_seq + mid) % self._capacity] < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _bisect_right(self, k):
+        keys, lo, hi = self._ring._keys, 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if k < keys[(self.head_seq + mid) % self._capacity]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def seq_le(self, k):
+        """Sequence number of the last record with a key <= k, head_seq - 1 if none"""
+        return self.head_seq + self._bisect_right(k) - 1
+
+    def index_ge(self, k):
+        """Index of the first record with a key >= k, len(self) if none"""
+        return self._bisect_left(k)
+
+    def index_gt(self, k):
+        """Index of the first record with a key > k, len(self) if none"""
+        return self._bisect_right(k)
+
+    def find_le(self, k):
+        """Return last record with a key <= k.  Raise ValueError if not found."""
+        i = self._bisect_right(k)
+        if i:
+            return self[i - 1]
+        raise ValueError('No item found with key at or below: %r' % (k,))
+
+    def find_lt(self, k):
+        """Return last record with a key < k.  Raise ValueError if not found."""
+        i = self._bisect_left(k)
+        if i:
+            return self[i - 1]
+        raise ValueError('No item found with key below: %r' % (k,))
+
+    def find_ge(self, k):
+        """Return first record with a key >= k.  Raise ValueError if not found"""
+        i = self._bisect_left(k)
+        if i != self._size:
+            return self[i]
+        raise ValueError('No item found with key at or above: %r' % (k,))
+
+    def find_gt(self, k):
+        """Return first record with a key > k.  Raise ValueError if not found"""
+        i = self._bisect_right(k)
+        if i != self._size:
+            return self[i]
+        raise ValueError('No item found with key above: %r' % (k,))
+
+    def range(self, start, stop, step=None):
+        """Return list of records within start and stop key range"""
+        return self.range_by_index(self._bisect_left(start), self._bisect_right(stop), step)
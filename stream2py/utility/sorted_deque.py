@@ -5,6 +5,22 @@ from itertools import islice
 
 from stream2py.utility.sorted_collection import SortedCollection
 
+_NO_KEY = object()
+
+
+def _validate_extension_keys(last_key, keys):
+    """Raise ValueError if keys are not strictly increasing and greater than last_key.
+    last_key is _NO_KEY when the sequence being extended is empty."""
+    if keys and last_key is not _NO_KEY and not keys[0] > last_key:
+        raise ValueError(
+            'Item key must be greater than last item key to append: %r' % (keys[0],)
+        )
+    for k0, k1 in zip(keys, islice(keys, 1, None)):
+        if not k1 > k0:
+            raise ValueError(
+                'Item key must be greater than last item key to append: %r' % (k1,)
+            )
+
 
 class SortedDeque(SortedCollection):
     """Deque sorted by a key function.
@@ -23,6 +39,7 @@ class SortedDeque(SortedCollection):
         self._keys = deque(self._keys, maxlen=maxlen)
         self._items = deque(self._items, maxlen=maxlen)
         self._maxlen = maxlen
+        self._head_seq = 0
 
     def to_jdict(self):
         """TODO: WIP. Need to convert key function and iterable items to json friendly format"""
@@ -41,7 +58,9 @@ class SortedDeque(SortedCollection):
 
     def _setmaxlen(self, maxlen):
         if maxlen is not self._maxlen:
+            head_seq, n = self._head_seq, len(self)
             self.__init__(self._items, key=self._key, maxlen=maxlen)
+            self._head_seq = head_seq + n - len(self)
 
     def _delmaxlen(self):
         self._setmaxlen(None)
@@ -105,9 +124,30 @@ class SortedDeque(SortedCollection):
         except IndexError as e:
             if len(self._keys) != 0:
                 raise e
+        if len(self._keys) == self._maxlen:  # the deque will drop its first item
+            self._head_seq += 1
         self._keys.append(k)
         self._items.append(item)
 
+    def extend(self, items):
+        """Append items to the end and maintain key indexing.
+        Raise ValueError, leaving the deque unchanged, if item keys are not strictly
+        increasing and greater than last item key.
+
+        Keys are validated in one pass and keys and items are each added with a single
+        deque extend.
+
+        :param items: iterable of items to append
+        :return: None
+        """
+        items = list(items)
+        keys = list(map(self._key, items))
+        _validate_extension_keys(self._keys[-1] if self._keys else _NO_KEY, keys)
+        if self._maxlen is not None:
+            self._head_seq += max(len(self._keys) + len(keys) - self._maxlen, 0)
+        self._keys.extend(keys)
+        self._items.extend(items)
+
     def range(self, start, stop, step=None):
         """Return list of items within start and stop key range.
 
@@ -147,9 +187,57 @@ class SortedDeque(SortedCollection):
         :param n:
         :return:
         """
-        for _ in range(n):
-            del self._keys[0]
-            del self._items[0]
+        if n > len(self._keys):
+            raise IndexError('drop from an empty deque')
+        if n * 2 > len(self._keys):  # cheaper to rebuild from the items kept
+            self._keys = deque(islice(self._keys, n, None), maxlen=self._maxlen)
+            self._items = deque(islice(self._items, n, None), maxlen=self._maxlen)
+        else:
+            for _ in range(n):
+                self._keys.popleft()
+                self._items.popleft()
+        self._head_seq += n
+
+    def drop_until(self, k):
+        """Remove all items with a key < k from the left, i.e. keep items from key k on.
+
+        :param k: key of the first item to keep
+        :return: number of items dropped
+        """
+        n = bisect_left(self._keys, k)
+        self.drop(n)
+        return n
+
+    @property
+    def head_seq(self):
+        """Sequence number of the first item.
+
+        Every appended item gets the next integer of a monotonically increasing sequence,
+        so the item at index i has sequence number head_seq + i, whatever was dropped.
+        """
+        return self._head_seq
+
+    @property
+    def next_seq(self):
+        """Sequence number the next appended item will get"""
+        return self._head_seq + len(self)
+
+    def key_at(self, i):
+        """Return the key of the item at index i.  Raise IndexError if out of range."""
+        return self._keys[i]
+
+    def seq_le(self, k):
+        """Return the sequence number of the last item with a key <= k,
+        or head_seq - 1 if there is no such item."""
+        return self._head_seq + bisect_right(self._keys, k) - 1
+
+    def index_ge(self, k):
+        """Return the index of the first item with a key >= k, len(self) if none."""
+        return bisect_left(self._keys, k)
+
+    def index_gt(self, k):
+        """Return the index of the first item with a key > k, len(self) if none."""
+        return bisect_right(self._keys, k)
 
 
 # ---------------------------  Simple demo and tests  -------------------------